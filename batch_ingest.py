@@ -0,0 +1,186 @@
+# batch_ingest.py
+"""
+Headless batch processing of machine .dat exports.
+
+Reads a manifest CSV with one row per specimen (name, length, width, thickness, weight and the
+hysteresis_file / general_file paths), processes every specimen on a process pool and writes the
+properties table. Passing a directory uses the manifest.csv inside it. The processed specimens can
+also be saved as archives and added to the specimen catalog, see query_catalog.py.
+
+Usage:
+    python batch_ingest.py <manifest.csv | directory> [-o properties.csv] [-j workers] [--din] [--auto-elastic] [--no-cache]
+                           [--archive-dir DIR] [--catalog [PATH]] [--lot LOT] [--tested-on YYYY-MM-DD]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from core.data_handler import read_dat_file
+from dataset.db_connection import DEFAULT_CATALOG_PATH, SpecimenCatalog
+from specimens.archive import archive_path_for, write_specimen_archive
+from specimens.parse_cache import set_parse_cache_enabled
+from specimens.properties import collect_specimen_properties
+from specimens.specimen import Specimen
+
+MANIFEST_NAME = 'manifest.csv'
+DIMENSION_COLUMNS = ['length', 'width', 'thickness', 'weight']
+FILE_COLUMNS = ['hysteresis_file', 'general_file']
+
+
+def load_manifest(source):
+    """
+    Read the manifest and resolve the data file paths relative to it.
+
+    Args:
+        source (str or Path): Manifest CSV, or a directory that contains manifest.csv.
+
+    Returns:
+        list[dict]: One job per specimen.
+    """
+    source = Path(source)
+    manifest_path = source / MANIFEST_NAME if source.is_dir() else source
+    manifest = pd.read_csv(manifest_path, dtype={'name': str})
+    manifest.columns = [column.strip().lower() for column in manifest.columns]
+
+    missing = [column for column in ['name', *DIMENSION_COLUMNS, 'general_file'] if column not in manifest.columns]
+    if missing:
+        raise ValueError(f"Manifest {manifest_path} is missing columns: {', '.join(missing)}")
+
+    jobs = []
+    for row in manifest.to_dict('records'):
+        files = []
+        for column in FILE_COLUMNS:
+            value = row.get(column)
+            if isinstance(value, str) and value.strip():
+                files.append(str(manifest_path.parent / value.strip()))
+        jobs.append({
+            'name': str(row['name']),
+            **{column: row[column] for column in DIMENSION_COLUMNS},
+            'files': files,  # hysteresis file first, like DataHandler.import_specimen_data
+        })
+    return jobs
+
+
+def process_specimen(job, din_mode=False, verbose=False, auto_elastic=False, use_cache=True, archive_dir=None, catalog=None):
+    """
+    Import, process and align one specimen. Runs in a worker process.
+
+    Args:
+        archive_dir (str): Save the processed specimen as an archive in this directory.
+        catalog (dict): Lot and test date of the specimen, see `SpecimenCatalog.row_for_specimen`; None skips its catalog row.
+
+    Returns:
+        tuple[dict, dict]: The properties of the specimen, and its catalog row or None.
+    """
+    set_parse_cache_enabled(use_cache)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    catalog_row = None
+    try:
+        with output:
+            raw_data_list = [read_dat_file(file_path) for file_path in job['files']]
+            specimen = Specimen(job['name'], raw_data_list, job['length'], job['width'], job['thickness'], job['weight'])
+            specimen.graph_manager.auto_elastic_window = auto_elastic
+            specimen.data_manager.parse_verbose = verbose
+            specimen.process_data()  # also runs find_IYS_align
+            if din_mode:
+                specimen.set_analyzer()
+            properties = collect_specimen_properties(specimen, din_mode=din_mode)
+            properties['parse_rows_per_second'] = specimen.data_manager.parse_rows_per_second
+            if auto_elastic:
+                properties['elastic_window_confidence'] = specimen.graph_manager.elastic_window_confidence
+            archive_path = None
+            if archive_dir is not None:
+                archive_path = os.path.abspath(write_specimen_archive(specimen, archive_path_for(specimen.name, archive_dir)))
+                properties['archive'] = archive_path
+            if catalog is not None:
+                catalog_row = SpecimenCatalog.row_for_specimen(specimen, archive_path, din_mode=din_mode, **catalog)
+        properties['status'] = 'ok'
+    except Exception as e:
+        properties = {'name': job['name'], 'status': f"error: {e}"}
+    properties['files'] = ';'.join(Path(file_path).name for file_path in job['files'])
+    return properties, catalog_row
+
+
+def run_batch(jobs, max_workers=None, din_mode=False, verbose=False, auto_elastic=False, use_cache=True,
+              archive_dir=None, catalog_path=None, lot='', tested_on=None):
+    """
+    Process all jobs on a process pool and return the properties table in manifest order.
+
+    With `catalog_path`, the processed specimens are added to that catalog in one transaction once
+    all are done; the workers only build the rows, so the catalog has a single writer.
+    """
+    results = [None] * len(jobs)
+    catalog_rows = []
+    catalog = {'lot': lot, 'tested_on': tested_on} if catalog_path is not None else None
+    if archive_dir is not None:
+        Path(archive_dir).mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_specimen, job, din_mode, verbose, auto_elastic, use_cache, archive_dir, catalog): index
+                   for index, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            results[index], catalog_row = future.result()
+            if catalog_row is not None:
+                catalog_rows.append(catalog_row)
+            rows_per_second = results[index].get('parse_rows_per_second')
+            parsed = f" ({rows_per_second:,.0f} rows/s parsed)" if rows_per_second else ""
+            print(f"[{done}/{len(jobs)}] {jobs[index]['name']}: {results[index]['status']}{parsed}")
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {len(jobs)} specimens in {elapsed:.1f} s")
+    if catalog_rows:
+        with SpecimenCatalog(catalog_path) as specimen_catalog:
+            specimen_catalog.add_rows(catalog_rows)
+        print(f"Cataloged {len(catalog_rows)} specimens in {catalog_path}")
+    return pd.DataFrame(results).set_index('name')
+
+
+def write_properties_table(properties_df, output_path):
+    output_path = Path(output_path)
+    if output_path.suffix.lower() == '.xlsx':
+        properties_df.to_excel(output_path)
+    else:
+        properties_df.to_csv(output_path)
+    print(f"Properties written to {output_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process a lot of stress-strain .dat files without the GUI.")
+    parser.add_argument('source', help="Manifest CSV, or a directory containing manifest.csv")
+    parser.add_argument('-o', '--output', help="Properties table to write (.csv or .xlsx). Defaults to specimen_properties.csv next to the manifest")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--din', action='store_true', help="Include the DIN analysis properties")
+    parser.add_argument('--auto-elastic', action='store_true', help="Find the elastic region by sliding-window regression instead of the threshold search")
+    parser.add_argument('--no-cache', action='store_true', help="Parse every .dat file, without reading or writing the parse cache")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the per-specimen processing output, including the rows/s of every parsed file")
+    parser.add_argument('--archive-dir', help="Save every processed specimen as an archive in this directory")
+    parser.add_argument('--catalog', nargs='?', const=str(DEFAULT_CATALOG_PATH),
+                        help=f"Add the processed specimens to this specimen catalog (default {DEFAULT_CATALOG_PATH})")
+    parser.add_argument('--lot', default='', help="Lot of the specimens in the catalog")
+    parser.add_argument('--tested-on', help="Test date of the specimens in the catalog, YYYY-MM-DD. Defaults to today")
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.source)
+    if not jobs:
+        print("Manifest has no specimens")
+        return 1
+
+    source = Path(args.source)
+    output = args.output or (source if source.is_dir() else source.parent) / 'specimen_properties.csv'
+    properties_df = run_batch(jobs, max_workers=args.workers, din_mode=args.din, verbose=args.verbose,
+                                auto_elastic=args.auto_elastic, use_cache=not args.no_cache, archive_dir=args.archive_dir,
+                                catalog_path=args.catalog, lot=args.lot, tested_on=args.tested_on)
+    write_properties_table(properties_df, output)
+    return 0 if (properties_df['status'] == 'ok').all() else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# bench_excel_formatting.py
+"""
+Compare the column-level formatting of the Excel export with the per-cell loop it replaced.
+
+Writes the data tables of a growing number of synthetic specimens side by side, like the Selected
+Specimens sheet, and prints the export time with the per-cell formatting, with the column-level
+formatting and through the streaming constant_memory workbook, plus the formatting time alone.
+
+On one CPU with openpyxl 3.1, xlsxwriter 3.2 and 5000 points per specimen, 20 specimens (800k cells)
+took 19.3 s with the per-cell formatting, 17.0 s with the column-level formatting and 6.6 s streamed
+with the number formats set per column; the openpyxl formatting alone took 6.4 s per cell and 2.2 s
+per column. The column-level openpyxl formatting still copies a style into every cell, so it grows
+with the cells; only the streamed export formats in O(columns).
+
+Usage:
+    python benchmarks/bench_excel_formatting.py [--points N] [--repeat N]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ms_file_handling.excel_exporter import ExcelExporter, format_columns  # noqa: E402
+from ms_file_handling.excel_stream import Block, StreamingWorkbook  # noqa: E402
+
+SPECIMEN_COUNTS = [1, 5, 20]
+SHEET_NAME = 'Selected Specimens'
+
+
+def legacy_apply_formatting(worksheet, apply_pattern_fill=False):
+    """The per-cell apply_formatting of ExcelExporter.export_data_to_excel."""
+    column_widths = {}
+    for i, row in enumerate(worksheet.iter_rows(), start=1):
+        for cell in row:
+            column_widths[cell.column] = max(column_widths.get(cell.column, 0), len(str(cell.value)))
+            if i == 1:
+                cell.style = 'header_font'
+            elif apply_pattern_fill and i % 2 == 0:
+                cell.style = 'fill'
+            elif isinstance(cell.value, (int, float)):
+                cell.style = 'number_format'
+    for column, width in column_widths.items():
+        worksheet.column_dimensions[worksheet.cell(row=1, column=column).column_letter].width = width + 2
+
+
+def make_specimen_data(points, seed):
+    """A frame with the columns of Specimen.shifted_data."""
+    rng = np.random.default_rng(seed)
+    strain = np.linspace(0, 0.6, points)
+    stress = np.minimum(15 * strain, 2.5 + strain) + rng.normal(0, 0.01, points)
+    return pd.DataFrame({
+        'Time': np.linspace(0, 600, points),
+        'Force': stress * 1500,
+        'Displacement': strain * 50,
+        'stress': stress,
+        'strain': strain,
+        'shiftd strain': strain - 0.01,
+        'Shifted Strain': strain - 0.01,
+        'Shifted Displacement (mm)': (strain - 0.01) * 50,
+    })
+
+
+def blocks_for(data_dfs):
+    stride = len(data_dfs[0].columns) + 1
+    return [Block(idx * stride, df) for idx, df in enumerate(data_dfs)]
+
+
+def export_in_memory(data_dfs, file_path, formatting):
+    """Write the frames with pandas, format them and save; returns the formatting time."""
+    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+        ExcelExporter(None).set_workbook_style(writer.book)
+        for block in blocks_for(data_dfs):
+            block.frame.to_excel(writer, sheet_name=SHEET_NAME, index=False, startcol=block.start_col)
+        start = time.perf_counter()
+        formatting(writer.sheets[SHEET_NAME], data_dfs)
+        return time.perf_counter() - start
+
+
+def export_streaming(data_dfs, file_path):
+    """Write the frames like ExcelExporter.stream_selected_specimens, number formats set per column."""
+    workbook = StreamingWorkbook(file_path)
+    sheet = workbook.create_sheet(SHEET_NAME)
+    blocks = blocks_for(data_dfs)
+    sheet.fit_columns(blocks, workbook.formats['number'])
+    sheet.write_blocks(blocks)
+    workbook.save()
+
+
+def time_call(function, repeat, *args):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--points', type=int, default=5_000, help="Points per specimen")
+    parser.add_argument('--repeat', type=int, default=3, help="Exports per measurement")
+    args = parser.parse_args(argv)
+
+    def cell_formatting(worksheet, _):
+        legacy_apply_formatting(worksheet)
+
+    def column_formatting(worksheet, data_dfs):
+        format_columns(worksheet, [(1, block) for block in blocks_for(data_dfs)])
+
+    print(f"{'specimens':>10} {'cells':>10} {'per cell [s]':>13} {'per column [s]':>15} {'streaming [s]':>14} "
+          f"{'format cell/column [s]':>23}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = Path(temp_dir) / 'export.xlsx'
+        for count in SPECIMEN_COUNTS:
+            data_dfs = [make_specimen_data(args.points, seed) for seed in range(count)]
+            cells = sum(df.size for df in data_dfs)
+            cell_time, cell_format_time = time_call(export_in_memory, args.repeat, data_dfs, file_path, cell_formatting)
+            column_time, column_format_time = time_call(export_in_memory, args.repeat, data_dfs, file_path, column_formatting)
+            streaming_time, _ = time_call(export_streaming, args.repeat, data_dfs, file_path)
+            print(f"{count:>10} {cells:>10} {cell_time:>13.2f} {column_time:>15.2f} {streaming_time:>14.2f} "
+                  f"{cell_format_time:>11.2f}/{column_format_time:<11.2f}")
+
+
+if __name__ == "__main__":
+    main()
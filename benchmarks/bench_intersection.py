@@ -0,0 +1,98 @@
+# bench_intersection.py
+"""
+Compare the vectorized crossing search with the shapely implementation it replaced.
+
+Builds synthetic stress-strain curves of increasing length, intersects each with a 0.2% offset line
+and prints the time per call of both implementations and the largest difference between their results.
+shapely is only needed for the comparison.
+
+Usage:
+    python benchmarks/bench_intersection.py [--repeat N]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from specimens.intersection import find_first_crossing  # noqa: E402
+
+CURVE_SIZES = [1_000, 10_000, 100_000, 500_000]
+YOUNGS_MODULUS = 1500.0
+OFFSET = 0.2
+
+
+def legacy_find_interaction_point(plot1, plot2, min_dist_from_origin=0.001, max_attempts=3):
+    """The shapely based SpecimenGraphManager.find_interaction_point, without the debug output."""
+    from shapely.geometry import LineString, MultiPoint, Point
+
+    x1, y1 = plot1
+    x2, y2 = plot2
+    line1 = LineString(zip(x1, y1))
+    line2 = LineString(zip(x2, y2))
+    shift_step = 0.001
+
+    for _ in range(max_attempts):
+        intersection = line1.intersection(line2)
+        if not intersection.is_empty:
+            points = intersection.geoms if isinstance(intersection, MultiPoint) else [intersection]
+            for point in points:
+                if point.distance(Point(0, 0)) >= min_dist_from_origin:
+                    x_int, y_int = point.coords[0]
+                    return x_int, y_int
+        line2 = LineString([(x, y + shift_step) for x, y in line2.coords])
+    return None, None
+
+
+def make_curve(size, seed=0):
+    """Elastic ramp, plateau and densification with measurement noise."""
+    rng = np.random.default_rng(seed)
+    strain = np.linspace(0, 60, size)
+    stress = np.minimum(YOUNGS_MODULUS * strain / 100, 2.5 + 0.01 * strain) + np.exp(strain / 12) * 0.01
+    stress += rng.normal(0, 0.002, size)
+    return strain, stress
+
+
+def offset_line(strain):
+    line_strain = np.array([OFFSET, strain.max()])
+    return line_strain, YOUNGS_MODULUS / 100 * (line_strain - OFFSET)
+
+
+def time_call(function, repeat, *args):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5, help="Calls per measurement")
+    args = parser.parse_args(argv)
+
+    try:
+        import shapely  # noqa: F401
+        has_shapely = True
+    except ImportError:
+        has_shapely = False
+        print("shapely is not installed, timing the vectorized search only")
+
+    print(f"{'points':>10} {'numpy [ms]':>12} {'shapely [ms]':>13} {'speedup':>8} {'max diff':>10}")
+    for size in CURVE_SIZES:
+        curve = make_curve(size)
+        line = offset_line(curve[0])
+        numpy_time, numpy_point = time_call(find_first_crossing, args.repeat, curve, line)
+        if not has_shapely:
+            print(f"{size:>10} {numpy_time * 1e3:>12.3f}")
+            continue
+        shapely_time, shapely_point = time_call(legacy_find_interaction_point, args.repeat, curve, line)
+        difference = np.max(np.abs(np.subtract(numpy_point, shapely_point)))
+        print(f"{size:>10} {numpy_time * 1e3:>12.3f} {shapely_time * 1e3:>13.3f} "
+              f"{shapely_time / numpy_time:>7.1f}x {difference:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench_selection_average.py
+"""
+Compare the incremental selection average with the from-scratch average it replaced.
+
+Averages selections of synthetic specimens A, B and C the way the analyzer does while the user
+clicks through the specimen list, and prints the time per selection of both implementations. It also
+checks that the average of A+B does not depend on the session: the same grid and values whether C
+was never loaded, or was loaded, averaged with A and B and removed again.
+
+Usage:
+    python benchmarks/bench_selection_average.py [--points N] [--repeat N]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.averaging import SelectionAverages  # noqa: E402
+
+# Largest strain and length of every specimen relative to --points; C is the longest, A the shortest
+SPECIMENS = {'A': (0.5, 0.8), 'B': (0.6, 1.0), 'C': (0.8, 3.0)}
+TOLERANCE = 1e-9
+
+
+def make_specimen(name, max_strain, points, seed):
+    rng = np.random.default_rng(seed)
+    strain = np.linspace(-0.01, max_strain, points)
+    stress = np.minimum(15 * np.maximum(strain, 0), 2.5 + strain) + rng.normal(0, 0.01, points)
+    return SimpleNamespace(name=name, shifted_strain=strain, stress=stress, shifted_displacement=strain * 50, force=stress * 1500)
+
+
+def legacy_average(specimens):
+    """Stress mean and std of the baseline DataHandler.average_of_selected_specimens, on get_common_strain."""
+    max_strain = max(specimen.shifted_strain.max() for specimen in specimens)
+    common_strain = np.linspace(-0.05, max_strain, num=max(len(specimen.shifted_strain) for specimen in specimens))
+    stresses = [np.interp(common_strain, specimen.shifted_strain, specimen.stress) for specimen in specimens]
+    return common_strain, np.mean(stresses, axis=0), np.std(stresses, axis=0)
+
+
+def incremental_average(averages, specimens, loaded):
+    average = averages.for_selection(specimens, loaded)
+    statistics = average.select(specimens)
+    return average.strain_grid, statistics['mean'], statistics['std']
+
+
+def difference(result, reference):
+    """Largest difference between two (grid, mean, std), inf when the grids differ in length."""
+    if len(result[0]) != len(reference[0]):
+        return np.inf
+    return max(np.max(np.abs(a - b)) for a, b in zip(result, reference))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--points', type=int, default=1_000, help="Points of specimen B")
+    parser.add_argument('--repeat', type=int, default=20, help="Passes over the selections")
+    args = parser.parse_args(argv)
+
+    specimens = {name: make_specimen(name, max_strain, int(args.points * length), seed)
+                 for seed, (name, (max_strain, length)) in enumerate(SPECIMENS.items())}
+    a, b, c = specimens['A'], specimens['B'], specimens['C']
+
+    # A+B with C never loaded, and after C was loaded, averaged and removed
+    fresh = incremental_average(SelectionAverages(), [a, b], [a, b])
+    averages = SelectionAverages()
+    incremental_average(averages, [a, b], [a, b, c])
+    incremental_average(averages, [a, b, c], [a, b, c])
+    incremental_average(averages, [a, c], [a, b, c])
+    after_c = incremental_average(averages, [a, b], [a, b])
+    legacy = legacy_average([a, b])
+    print(f"A+B grid: {len(fresh[0])} points to strain {fresh[0][-1]:.3f} without C, "
+          f"{len(after_c[0])} points to {after_c[0][-1]:.3f} after C")
+    print(f"A+B difference, after C vs without C: {difference(after_c, fresh):.2e}, vs legacy: {difference(fresh, legacy):.2e}")
+    same = difference(after_c, fresh) <= TOLERANCE and difference(fresh, legacy) <= TOLERANCE
+    print(f"A+B independent of C: {same}")
+
+    selections = [[a, b], [a, b, c], [b, c], [a, b], [a, c], [a, b, c]]
+    loaded = [a, b, c]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for selection in selections:
+            legacy_average(selection)
+    legacy_time = (time.perf_counter() - start) / (args.repeat * len(selections))
+    averages = SelectionAverages()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for selection in selections:
+            incremental_average(averages, selection, loaded)
+    incremental_time = (time.perf_counter() - start) / (args.repeat * len(selections))
+    print(f"per selection: legacy {legacy_time * 1e3:.2f} ms, incremental {incremental_time * 1e3:.2f} ms")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# bench_table_names.py
+"""
+Compare table creation through the table name registry with the workbook scan it replaced.
+
+Creates a properties table and a data table per specimen on the Selected Specimens sheet, as the
+Excel export does, and prints the time of both implementations for a growing number of specimens.
+
+On one CPU, 200 specimens (400 tables) took 25 ms through the registry and 210 ms with the scan, 8.3x
+faster with identical names; at 10 specimens both take a few milliseconds and the scan can win.
+
+Usage:
+    python benchmarks/bench_table_names.py [--repeat N]
+"""
+import argparse
+import sys
+import time
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.table import Table, TableStyleInfo
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ms_file_handling.excel_exporter import SELECTED_SPECIMEN, ExcelExporter  # noqa: E402
+from ms_file_handling.excel_stream import TableNameRegistry  # noqa: E402
+
+SPECIMEN_COUNTS = [10, 50, 100, 200]
+PROPERTIES_COLUMNS = 7
+DATA_COLUMNS = 8
+DATA_ROWS = 5_000
+
+
+def legacy_create_table(writer, sheet_name, start_row, start_col, row_count, col_count):
+    """The ExcelExporter.create_table that scanned every table of the workbook for each new one."""
+    def get_used_table_names(workbook):
+        return [t.displayName for sheet in workbook for t in sheet._tables.values()]
+
+    worksheet = writer.sheets[sheet_name]
+    data_range = f"{get_column_letter(start_col + 1)}{start_row + 1}:{get_column_letter(start_col + col_count)}{start_row + row_count + 1}"
+    base_table_name = f"{sheet_name.replace(' ', '_')}_Table"
+    table_name = base_table_name
+    idx = 1
+    used_table_names = get_used_table_names(writer.book)
+    while table_name in used_table_names:
+        table_name = f"{base_table_name}_{idx}"
+        idx += 1
+
+    table = Table(displayName=table_name, ref=data_range)
+    table.tableStyleInfo = TableStyleInfo(name="TableStyleLight11", showFirstColumn=False, showLastColumn=False,
+                                          showRowStripes=True, showColumnStripes=False)
+    worksheet.add_table(table)
+
+
+def create_tables(create_table, specimen_count):
+    """The tables of the Selected Specimens sheet; returns their names."""
+    book = Workbook()
+    writer = SimpleNamespace(book=book, sheets={SELECTED_SPECIMEN: book.create_sheet(SELECTED_SPECIMEN)})
+    stride = max(PROPERTIES_COLUMNS, DATA_COLUMNS) + 1
+    for idx in range(specimen_count):
+        create_table(writer, SELECTED_SPECIMEN, 0, idx * stride, 1, PROPERTIES_COLUMNS)
+    for idx in range(specimen_count):
+        create_table(writer, SELECTED_SPECIMEN, 3, idx * stride, DATA_ROWS, DATA_COLUMNS)
+    return list(writer.sheets[SELECTED_SPECIMEN]._tables.keys())
+
+
+def registry_create_table():
+    """ExcelExporter.create_table with the registry of one export."""
+    return partial(ExcelExporter(None).create_table, table_names=TableNameRegistry())
+
+
+def time_call(function, repeat, *args):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement")
+    args = parser.parse_args(argv)
+
+    print(f"{'specimens':>10} {'tables':>7} {'registry [ms]':>14} {'scan [ms]':>10} {'speedup':>8} {'same names':>11}")
+    for count in SPECIMEN_COUNTS:
+        registry_time, registry_names = time_call(lambda n: create_tables(registry_create_table(), n), args.repeat, count)
+        scan_time, scan_names = time_call(create_tables, args.repeat, legacy_create_table, count)
+        print(f"{count:>10} {2 * count:>7} {registry_time * 1e3:>14.2f} {scan_time * 1e3:>10.2f} "
+              f"{scan_time / registry_time:>7.1f}x {str(registry_names == scan_names):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Averaging grid
+STRAIN_GRID_START = -0.05
+MAX_GRID_POINTS = 10_000  # default grid follows the longest specimen up to this many points
+CONTROL_LIMIT_L = 3
+
+# Incremental averaging
+AVERAGE_CACHE_SIZE = 16  # selections whose statistics are kept
+GRID_CACHE_SIZE = 4  # grids whose resampled rows are kept, see SelectionAverages
+RESUM_INTERVAL = 64  # incremental updates before the running sums are recomputed exactly
+
+
+def common_grid(start, stop, num_points=None, step=None):
+    """
+    Evenly spaced grid from `start` to `stop`.
+
+    Args:
+        start, stop (float): Grid bounds.
+        num_points (int): Number of grid points.
+        step (float): Grid spacing. Takes precedence over `num_points`; the grid then ends at the
+            last step that does not pass `stop`.
+
+    Returns:
+        np.ndarray: The grid.
+    """
+    if step is not None:
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return start + step * np.arange(max(count, 1))
+    return np.linspace(start, stop, num=num_points)
+
+
+def default_grid_points(curve_lengths, num_points=None):
+    """Grid size: `num_points` if given, else the longest curve capped at MAX_GRID_POINTS."""
+    if num_points is not None:
+        return int(num_points)
+    return min(max(curve_lengths), MAX_GRID_POINTS)
+
+
+class CurveStatistics:
+    """
+    Point-wise mean, standard deviation, minimum and maximum of curves sampled on one grid.
+
+    Curves are added one at a time with Welford's update, so the statistics take a single pass over
+    the curves and their memory only depends on the grid size.
+
+    Attributes:
+        count (int): Number of curves added.
+        mean, minimum, maximum (np.ndarray): Running statistics per grid point.
+    """
+    def __init__(self, grid_size):
+        self.count = 0
+        self.mean = np.zeros(grid_size)
+        self._m2 = np.zeros(grid_size)  # sum of squared deviations from the mean
+        self.minimum = np.full(grid_size, np.inf)
+        self.maximum = np.full(grid_size, -np.inf)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (values - self.mean)
+        np.minimum(self.minimum, values, out=self.minimum)
+        np.maximum(self.maximum, values, out=self.maximum)
+
+    @property
+    def std(self):
+        """Population standard deviation, like np.std."""
+        if self.count == 0:
+            return np.full_like(self.mean, np.nan)
+        return np.sqrt(np.maximum(self._m2 / self.count, 0.0))
+
+    def summary(self, control_limit_L=CONTROL_LIMIT_L):
+        return stress_summary(self.mean, self.std, self.minimum, self.maximum, control_limit_L)
+
+
+def stress_summary(mean, std, minimum, maximum, control_limit_L=CONTROL_LIMIT_L):
+    """Mean, std, max, min and the control limits mean +/- L*std, keyed like the average columns."""
+    return {
+        "Stress": mean,
+        "std Stress": std,
+        "max Stress": maximum,
+        "min Stress": minimum,
+        "UCL Stress": mean + control_limit_L * std,
+        "LCL Stress": mean - control_limit_L * std,
+    }
+
+
+class StreamingAverage:
+    """
+    Average curve of any number of specimens, added one at a time.
+
+    Every specimen is resampled onto fixed strain and displacement grids and folded into running
+    Welford statistics, then dropped, so memory depends on the grid size only. Use it with a generator
+    such as `iter_specimen_archives` to average whole historical lots. The grids have to be known
+    up front: stresses beyond a specimen's last strain hold its last value, as in the in-memory average.
+
+    Attributes:
+        strain_grid, displacement_grid (np.ndarray): Common grids.
+        stress, force (CurveStatistics): Running statistics of the resampled curves.
+        names (list[str]): Names of the specimens added so far.
+    """
+    def __init__(self, strain_grid, displacement_grid):
+        self.strain_grid = np.asarray(strain_grid, dtype=np.float64)
+        self.displacement_grid = np.asarray(displacement_grid, dtype=np.float64)
+        self.stress = CurveStatistics(len(self.strain_grid))
+        self.force = CurveStatistics(len(self.displacement_grid))
+        self.names = []
+
+    @classmethod
+    def with_range(cls, max_strain, max_displacement, num_points=MAX_GRID_POINTS, step=None):
+        """Grids from STRAIN_GRID_START to `max_strain` and from 0 to `max_displacement`, of equal length."""
+        strain_grid = common_grid(STRAIN_GRID_START, max_strain, num_points, step)
+        return cls(strain_grid, common_grid(0.0, max_displacement, len(strain_grid)))
+
+    def add(self, specimen):
+        self.stress.add(np.interp(self.strain_grid, np.asarray(specimen.shifted_strain), np.asarray(specimen.stress)))
+        self.force.add(np.interp(self.displacement_grid, np.asarray(specimen.shifted_displacement), np.asarray(specimen.force)))
+        self.names.append(specimen.name)
+
+    def add_all(self, specimens, progress_every=100):
+        for specimen in specimens:
+            self.add(specimen)
+            if progress_every and self.stress.count % progress_every == 0:
+                print(f"Averaged {self.stress.count} specimens")
+        return self
+
+    def to_dataframe(self, control_limit_L=CONTROL_LIMIT_L):
+        return average_dataframe(self.displacement_grid, self.force.mean, self.strain_grid, self.stress.summary(control_limit_L))
+
+
+def stream_average_of_specimens(specimens, max_strain, max_displacement, num_points=MAX_GRID_POINTS, step=None,
+                                control_limit_L=CONTROL_LIMIT_L):
+    """
+    Average any number of specimens in constant memory, e.g. `iter_specimen_archives(paths)` or
+    `SpecimenCatalog.iter_specimens(rows)`.
+
+    Produces the same table as the average of selected specimens in the analyzer, but the grid bounds
+    have to be given because the specimens are only seen one at a time. The hysteresis averaging is
+    not part of the streaming mode.
+
+    Args:
+        specimens (iterable[Specimen]): Specimens to average, consumed once.
+        max_strain (float): End of the strain grid.
+        max_displacement (float): End of the displacement grid (mm).
+        num_points (int): Grid size.
+        step (float): Fixed strain spacing instead of a point count.
+        control_limit_L (float): Width of the control limits in standard deviations.
+
+    Returns:
+        tuple[pd.DataFrame, list[str]]: The average, None when no specimen was read, and the names of
+        the averaged specimens.
+    """
+    average = StreamingAverage.with_range(max_strain, max_displacement, num_points, step).add_all(specimens)
+    if not average.names:
+        return None, []
+    return average.to_dataframe(control_limit_L), average.names
+
+
+def average_dataframe(displacement_grid, average_force, strain_grid, summary):
+    """The average_of_specimens table, from the grids and the point-wise statistics."""
+    return pd.DataFrame({
+        "Displacement": displacement_grid,
+        "Force": average_force,
+        "Strain": strain_grid,
+        "Stress": summary["Stress"],
+        "std Stress": summary["std Stress"],
+        "std Strain": np.std(strain_grid),
+        "max Stress": summary["max Stress"],
+        "min Stress": summary["min Stress"],
+        "UCL Stress": summary["UCL Stress"],
+        "LCL Stress": summary["LCL Stress"],
+    })
+
+
+class ResampledRows:
+    """Stress and force of one specimen on the grids of an `IncrementalAverage`, with the series they came from."""
+    def __init__(self, specimen, strain_grid, displacement_grid):
+        self.specimen = specimen
+        self.shifted_strain = specimen.shifted_strain
+        self.shifted_displacement = specimen.shifted_displacement
+        self.stress = np.interp(strain_grid, np.asarray(self.shifted_strain), np.asarray(specimen.stress))
+        self.force = np.interp(displacement_grid, np.asarray(self.shifted_displacement), np.asarray(specimen.force))
+
+    def is_current(self):
+        # The specimen rebuilds its shifted series whenever its shift changes
+        return (self.specimen.shifted_strain is self.shifted_strain
+                and self.specimen.shifted_displacement is self.shifted_displacement)
+
+
+class IncrementalAverage:
+    """
+    Average of a changing selection of specimens on fixed grids.
+
+    Every specimen is resampled once and its rows are kept. Running sums of the stress deviations
+    from a reference row, their squares and the force are updated per specimen added to or removed
+    from the selection, so the mean and std of a new selection cost O(grid size) per changed specimen.
+    The statistics of recent selections are kept in an LRU cache keyed by the frozen set of specimen
+    ids, so switching back to one of them is a lookup. Minimum and maximum cannot be maintained under
+    removal and are reduced over the selected rows.
+
+    Attributes:
+        strain_grid, displacement_grid (np.ndarray): Common grids.
+        cache_size (int): Number of selections kept in the cache.
+    """
+    def __init__(self, strain_grid, displacement_grid, cache_size=AVERAGE_CACHE_SIZE):
+        self.strain_grid = np.asarray(strain_grid, dtype=np.float64)
+        self.displacement_grid = np.asarray(displacement_grid, dtype=np.float64)
+        self.cache_size = cache_size
+        self._rows = {}  # id(specimen) -> ResampledRows
+        self._members = {}  # id(specimen) -> ResampledRows added to the running sums
+        self._reference = None
+        self._stress_sum = np.zeros(len(self.strain_grid))
+        self._stress_square_sum = np.zeros(len(self.strain_grid))
+        self._force_sum = np.zeros(len(self.displacement_grid))
+        self._updates = 0
+        self._cache = OrderedDict()  # frozenset of ids -> (rows used, statistics)
+
+    @classmethod
+    def with_range(cls, max_strain, max_displacement, num_points=MAX_GRID_POINTS, step=None, cache_size=AVERAGE_CACHE_SIZE):
+        """Grids from STRAIN_GRID_START to `max_strain` and from 0 to `max_displacement`, of equal length."""
+        strain_grid = common_grid(STRAIN_GRID_START, max_strain, num_points, step)
+        return cls(strain_grid, common_grid(0.0, max_displacement, len(strain_grid)), cache_size)
+
+    def rows(self, specimen):
+        """Resampled rows of `specimen`, rebuilt if its shifted series changed."""
+        rows = self._rows.get(id(specimen))
+        if rows is None or rows.specimen is not specimen or not rows.is_current():
+            rows = ResampledRows(specimen, self.strain_grid, self.displacement_grid)
+            self._rows[id(specimen)] = rows
+        return rows
+
+    def retain(self, specimens):
+        """Forget the rows of specimens that are no longer loaded."""
+        keep = {id(specimen) for specimen in specimens}
+        for key in [key for key in self._rows if key not in keep]:
+            del self._rows[key]
+        for key in [key for key in self._members if key not in keep]:
+            self._subtract(key)
+        for selection in [selection for selection in self._cache if not selection <= keep]:
+            del self._cache[selection]
+
+    def select(self, specimens):
+        """
+        Statistics of the selected specimens.
+
+        Returns:
+            dict: 'mean', 'std', 'min', 'max' of the stress and 'force' mean, as arrays on the grids.
+            Treat them as read-only, they are shared with the cache.
+        """
+        rows = {id(specimen): self.rows(specimen) for specimen in specimens}
+        selection = frozenset(rows)
+        cached = self._cache.get(selection)
+        if cached is not None and all(rows[key] is cached[0][key] for key in selection):
+            self._cache.move_to_end(selection)
+            return cached[1]
+
+        for key in [key for key in self._members if key not in rows or self._members[key] is not rows[key]]:
+            self._subtract(key)
+        for key in rows:
+            if key not in self._members:
+                self._add(key, rows[key])
+        if self._updates >= RESUM_INTERVAL:
+            self._resum()
+
+        statistics = self._statistics(list(rows.values()))
+        self._cache[selection] = (rows, statistics)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return statistics
+
+    def _add(self, key, rows):
+        if self._reference is None:
+            self._reference = rows.stress.copy()
+        deviation = rows.stress - self._reference
+        self._stress_sum += deviation
+        self._stress_square_sum += deviation * deviation
+        self._force_sum += rows.force
+        self._members[key] = rows
+        self._updates += 1
+
+    def _subtract(self, key):
+        rows = self._members.pop(key)
+        deviation = rows.stress - self._reference
+        self._stress_sum -= deviation
+        self._stress_square_sum -= deviation * deviation
+        self._force_sum -= rows.force
+        self._updates += 1
+
+    def _resum(self):
+        """Recompute the running sums from the member rows, so rounding errors cannot build up."""
+        members = list(self._members.values())
+        self._reference = members[0].stress.copy() if members else None
+        self._stress_sum[:] = 0.0
+        self._stress_square_sum[:] = 0.0
+        self._force_sum[:] = 0.0
+        self._members = {}
+        for rows in members:
+            self._add(id(rows.specimen), rows)
+        self._updates = 0
+
+    def _statistics(self, rows):
+        count = len(rows)
+        mean_deviation = self._stress_sum / count
+        variance = np.maximum(self._stress_square_sum / count - mean_deviation * mean_deviation, 0.0)
+        return {
+            'mean': self._reference + mean_deviation,
+            'std': np.sqrt(variance),
+            'min': np.minimum.reduce([row.stress for row in rows]),
+            'max': np.maximum.reduce([row.stress for row in rows]),
+            'force': self._force_sum / count,
+        }
+
+    def stress_matrix(self, specimens):
+        """The selected stress rows as a `ResampledSpecimenMatrix`, for percentile or outlier queries."""
+        return ResampledSpecimenMatrix.from_rows(self.strain_grid, [self.rows(specimen).stress for specimen in specimens],
+                                                 names=[specimen.name for specimen in specimens])
+
+    def force_matrix(self, specimens):
+        """The selected force rows as a `ResampledSpecimenMatrix`."""
+        return ResampledSpecimenMatrix.from_rows(self.displacement_grid, [self.rows(specimen).force for specimen in specimens],
+                                                 names=[specimen.name for specimen in specimens])
+
+
+class SelectionAverages:
+    """
+    `IncrementalAverage`s on the grids of recent selections.
+
+    A selection is averaged on its own grids: the strain grid runs to the largest strain of the
+    selected specimens with `default_grid_points` of their lengths, like the in-memory average, so the
+    result only depends on the selection and never on which other specimens are or were loaded. One
+    IncrementalAverage is kept per grid in an LRU of `grid_cache_size`, so selections that share their
+    grid, and switching back to a grid used recently, reuse the resampled rows.
+    """
+    def __init__(self, grid_cache_size=GRID_CACHE_SIZE, cache_size=AVERAGE_CACHE_SIZE):
+        self.grid_cache_size = grid_cache_size
+        self.cache_size = cache_size
+        self._averages = OrderedDict()  # (max strain, max displacement, points, step) -> IncrementalAverage
+
+    def for_selection(self, specimens, loaded_specimens=None, num_points=None, step=None):
+        """
+        The IncrementalAverage on the grids of `specimens`.
+
+        Args:
+            specimens (list[Specimen]): The selection.
+            loaded_specimens (list[Specimen]): Every loaded specimen; the rows of the others are dropped.
+            num_points (int): Grid size, None for the longest selected specimen capped at MAX_GRID_POINTS.
+            step (float): Fixed strain spacing instead of a point count.
+        """
+        strain = [np.asarray(specimen.shifted_strain) for specimen in specimens]
+        grid = (max(x.max() for x in strain), max(np.asarray(specimen.shifted_displacement).max() for specimen in specimens),
+                default_grid_points([len(x) for x in strain], num_points), step)
+        average = self._averages.get(grid)
+        if average is None:
+            average = self._averages[grid] = IncrementalAverage.with_range(*grid, cache_size=self.cache_size)
+            if len(self._averages) > self.grid_cache_size:
+                self._averages.popitem(last=False)
+        else:
+            self._averages.move_to_end(grid)
+        if loaded_specimens is not None:
+            for cached in self._averages.values():
+                cached.retain(loaded_specimens)
+        return average
+
+
+class ResampledSpecimenMatrix:
+    """
+    Curves of several specimens resampled onto one common grid, one row per specimen.
+
+    The rows live in a single preallocated float matrix, so the statistics are one pass over it and
+    the matrix stays available for later queries such as percentiles or outlier checks.
+
+    Attributes:
+        grid (np.ndarray): Common x values.
+        names (list): Row labels, usually specimen names.
+        values (np.ndarray): (specimens x grid points) matrix of y values.
+    """
+    def __init__(self, grid, curves, names=None):
+        self.grid = np.asarray(grid, dtype=np.float64)
+        curves = list(curves)
+        self.names = list(names) if names is not None else list(range(len(curves)))
+        self.values = np.empty((len(curves), len(self.grid)))
+        for row, (x, y) in enumerate(curves):
+            self.values[row] = np.interp(self.grid, np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+
+    @classmethod
+    def from_rows(cls, grid, rows, names=None):
+        """Matrix of rows that are already on `grid`."""
+        matrix = cls(grid, [], names=[])
+        matrix.values = np.array(rows, dtype=np.float64).reshape(len(rows), len(matrix.grid))
+        matrix.names = list(names) if names is not None else list(range(len(rows)))
+        return matrix
+
+    @classmethod
+    def from_specimens(cls, specimens, x_attribute, y_attribute, start=0.0, num_points=None, step=None):
+        """
+        Resample one curve of every specimen.
+
+        Args:
+            specimens (list[Specimen]): Specimens to resample.
+            x_attribute, y_attribute (str): Specimen attributes of the curve, e.g. 'shifted_strain' and 'stress'.
+            start (float): First grid value. The grid ends at the largest x of all specimens.
+            num_points (int): Grid size, see `default_grid_points`.
+            step (float): Fixed grid spacing instead of a point count.
+        """
+        curves = [(np.asarray(getattr(specimen, x_attribute)), np.asarray(getattr(specimen, y_attribute))) for specimen in specimens]
+        stop = max(x.max() for x, _ in curves)
+        grid = common_grid(start, stop, default_grid_points([len(x) for x, _ in curves], num_points), step)
+        return cls(grid, curves, names=[specimen.name for specimen in specimens])
+
+    def statistics(self):
+        statistics = CurveStatistics(len(self.grid))
+        for row in self.values:
+            statistics.add(row)
+        return statistics
+
+    def row(self, name):
+        return self.values[self.names.index(name)]
+
+    def percentile(self, q):
+        """Point-wise percentile(s) across the specimens."""
+        return np.percentile(self.values, q, axis=0)
+
+    def outliers(self, control_limit_L=CONTROL_LIMIT_L, max_fraction=0.05):
+        """
+        Specimens outside the control limits at more than `max_fraction` of the grid points.
+
+        Returns:
+            pd.Series: Fraction of the grid outside the limits, for the outlying specimens only.
+        """
+        summary = self.statistics().summary(control_limit_L)
+        outside = (self.values > summary["UCL Stress"]) | (self.values < summary["LCL Stress"])
+        fraction = pd.Series(outside.mean(axis=1), index=self.names)
+        return fraction[fraction > max_fraction]
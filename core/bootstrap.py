@@ -0,0 +1,123 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BOOTSTRAP_RESAMPLES = 1000
+CONFIDENCE_LEVEL = 0.95
+RESAMPLES_PER_TASK = 100  # resamples drawn per worker task
+# Workers are started fresh instead of forked: the pool is created on an export-queue thread, and a
+# fork copies only that thread, with any lock another thread held at that moment stuck held
+POOL_START_METHOD = 'spawn'
+BOOTSTRAP_KPIS = ['Rplt', 'E20_kJ_m3', 'E50_kJ_m3', 'E20_kJ_kg', 'E50_kJ_kg', 'compressive_proof_strength']
+
+_worker_values = None
+
+
+def _set_worker_values(values):
+    global _worker_values
+    _worker_values = values
+
+
+def resampled_means(values, count, seed):
+    """
+    Means of `count` bootstrap resamples of the rows of `values`, ignoring NaNs.
+
+    The row indices of all resamples are drawn at once and turned into a (count x rows) matrix of how
+    often each row was drawn, so the means are one matrix product instead of a loop over resamples.
+
+    Returns:
+        np.ndarray: (count x columns) matrix of resample means.
+    """
+    rng = np.random.default_rng(seed)
+    rows = len(values)
+    indices = rng.integers(0, rows, size=(count, rows))
+    weights = np.zeros((count, rows))
+    np.add.at(weights, (np.arange(count)[:, None], indices), 1.0)
+    present = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (weights @ np.where(present, values, 0.0)) / (weights @ present)
+
+
+def _resampled_means_in_worker(count, seed):
+    return resampled_means(_worker_values, count, seed)
+
+
+def bootstrap_means(values, resamples=BOOTSTRAP_RESAMPLES, seed=None, max_workers=None):
+    """
+    Bootstrap distribution of the column means of `values`, computed on a process pool.
+
+    The resamples are split into tasks of RESAMPLES_PER_TASK, each with its own child of
+    `np.random.SeedSequence(seed)`, so a given seed gives the same result for any number of workers.
+
+    Args:
+        values (np.ndarray): (specimens x points) matrix, e.g. `ResampledSpecimenMatrix.values`.
+        resamples (int): Number of bootstrap resamples B.
+        seed (int): Seed of the random generator, None for a fresh one.
+        max_workers (int): Number of worker processes, 1 runs in this process.
+
+    Returns:
+        np.ndarray: (resamples x points) matrix of resample means.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    counts = [min(RESAMPLES_PER_TASK, resamples - start) for start in range(0, resamples, RESAMPLES_PER_TASK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    if max_workers == 1:
+        return np.concatenate([resampled_means(values, count, task_seed) for count, task_seed in zip(counts, seeds)])
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(POOL_START_METHOD),
+                             initializer=_set_worker_values, initargs=(values,)) as executor:
+        return np.concatenate(list(executor.map(_resampled_means_in_worker, counts, seeds)))
+
+
+def percentile_interval(samples, confidence=CONFIDENCE_LEVEL):
+    """Lower and upper percentile bounds of `samples` along axis 0."""
+    tail = (1 - confidence) / 2 * 100
+    lower, upper = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+    return lower, upper
+
+
+class ConfidenceBand:
+    """
+    Bootstrap percentile band of the mean curve.
+
+    Attributes:
+        grid (np.ndarray): x values of the band.
+        lower, upper (np.ndarray): Band limits; draw with
+            `draw_error_band_y_modified(ax, band.grid, band.upper, band.lower)`.
+        confidence (float): Confidence level of the band.
+        resamples (int): Number of bootstrap resamples.
+    """
+    def __init__(self, grid, lower, upper, confidence, resamples):
+        self.grid = grid
+        self.lower = lower
+        self.upper = upper
+        self.confidence = confidence
+        self.resamples = resamples
+
+    @classmethod
+    def from_matrix(cls, matrix, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE_LEVEL, seed=None, max_workers=None):
+        """Band of the mean of the rows of a `ResampledSpecimenMatrix`."""
+        lower, upper = percentile_interval(bootstrap_means(matrix.values, resamples, seed, max_workers), confidence)
+        return cls(matrix.grid, lower, upper, confidence, resamples)
+
+
+def bootstrap_kpi_intervals(properties_df, kpis=BOOTSTRAP_KPIS, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE_LEVEL,
+                            seed=None, max_workers=1):
+    """
+    Bootstrap confidence intervals of the mean of scalar KPIs.
+
+    Args:
+        properties_df (pd.DataFrame): One row per specimen, as `DataHandler.properties_df`.
+        kpis (list[str]): Columns to bootstrap, missing or empty ones are skipped.
+
+    Returns:
+        pd.DataFrame: 'mean', 'lower' and 'upper' per KPI.
+    """
+    columns = [kpi for kpi in kpis if kpi in properties_df.columns]
+    values = properties_df[columns].apply(pd.to_numeric, errors='coerce').dropna(axis=1, how='all')
+    if values.empty:
+        return pd.DataFrame(columns=['mean', 'lower', 'upper'])
+    lower, upper = percentile_interval(bootstrap_means(values.to_numpy(), resamples, seed, max_workers), confidence)
+    return pd.DataFrame({'mean': values.mean().to_numpy(), 'lower': lower, 'upper': upper}, index=values.columns)
@@ -4,11 +4,18 @@ from typing import Any
 
 import tkinter as tk
 from tkinter import filedialog
+from tkinter import simpledialog
 from pathlib import Path
 import os
+from core.bootstrap import BOOTSTRAP_RESAMPLES
 from core.plot_manager import draw_error_band_xy, draw_error_band_y, draw_error_band_y_modified
+from specimens.archive import archive_summaries
 from tabulate import tabulate
 
+APP_TITLE = "Cymat Stress-Strain Analyzer"
+IMPORT_SUMMARY_COLUMNS = ['name', 'density', 'youngs_modulus']  # listed before importing several archives
+IMPORT_LISTING_ROWS = 20
+
 
 class ButtonActions:
     def __init__(self, app: Any, data_handler: Any) -> None:
@@ -43,9 +50,6 @@ class ButtonActions:
         self.data_handler.export_data()
 
     def export_average_to_excel(self) -> None:
-        if self.app.variables.export_in_progress == True:
-            tk.messagebox.showerror("Error", "Export is already in progress, ignore the button click.")
-            return
         selected_indices = self.app.widget_manager.specimen_listbox.curselection()
         if not selected_indices:
             tk.messagebox.showerror("Error", "No specimens selected for averaging.")
@@ -63,9 +67,53 @@ class ButtonActions:
         if not file_path:
             return
         
-        self.data_handler.export_average_to_excel(selected_indices, file_path)   
+        try:
+            self.data_handler.export_average_to_excel(selected_indices, file_path, on_progress=self.show_export_progress,
+                                                      on_done=self.export_finished)
+        except ValueError as e:
+            tk.messagebox.showerror("Error", str(e))
+            return
   
-        tk.messagebox.showinfo("Data Export", "Data is getting exported to Excel, please wait...")
+        tk.messagebox.showinfo("Data Export", "Data is getting exported to Excel in the background.")
+
+    def export_columnar(self) -> None:
+        selected_indices = self.app.widget_manager.specimen_listbox.curselection()
+        if not selected_indices:
+            tk.messagebox.showerror("Error", "No specimens selected for export.")
+            return
+        output_dir = filedialog.askdirectory(title="Select the Parquet export directory")
+        if not output_dir:
+            return
+        try:
+            self.data_handler.export_columnar(selected_indices, output_dir, on_progress=self.show_export_progress,
+                                              on_done=self.export_finished)
+        except (ImportError, ValueError) as e:
+            tk.messagebox.showerror("Export Error", str(e))
+
+    def show_export_progress(self, job) -> None:
+        """Show the progress of the running exports in the window title."""
+        running = [pending for pending in self.data_handler.export_queue.pending if pending.status == "running"]
+        progress = ", ".join(f"{pending.name}: {pending.progress:.0%}" for pending in running)
+        self.app.master.title(f"{APP_TITLE} - {progress}" if progress else APP_TITLE)
+
+    def export_finished(self, job) -> None:
+        self.show_export_progress(job)
+        if job.status == 'done':
+            tk.messagebox.showinfo("Export Successful", f"{job.name} finished.")
+        elif job.status == 'failed':
+            tk.messagebox.showerror("Export Error", f"{job.name} failed.\n\nError: {job.error}")
+        else:
+            # Cancelled on request, so no dialog; the title says so until the next export reports progress
+            self.app.master.title(f"{self.app.master.title()} - {job.name} cancelled")
+
+    def cancel_exports(self) -> None:
+        pending = self.data_handler.export_queue.pending
+        if not pending:
+            tk.messagebox.showinfo("Exports", "No export is running.")
+            return
+        names = "\n".join(job.name for job in pending)
+        if tk.messagebox.askyesno("Cancel Exports", f"Cancel these exports?\n\n{names}"):
+            self.data_handler.export_queue.cancel_all()
 
     def submit(self, event=None) -> None:
         #enter work on submit
@@ -76,9 +124,8 @@ class ButtonActions:
             return
 
         self.data_handler.import_specimen_data()
-        for i in range(1, len(self.widget_manager.data_analysis_buttons)):
-            self.widget_manager.data_analysis_buttons[i].config(state='normal')
-            self.widget_manager.data_management_buttons[i].config(state='normal')
+        for button in self.widget_manager.data_analysis_buttons[1:] + self.widget_manager.data_management_buttons[1:]:
+            button.config(state='normal')
 
     def save_selected_specimens(self) -> None:
         selected_specimens = self.data_handler.get_selected_specimens()
@@ -92,28 +139,45 @@ class ButtonActions:
             if not zip_dir.startswith(os.path.abspath('exported_data')):
                 break
             tk.messagebox.showerror("Invalid Directory", "Please select a directory other than 'exported_data'")
+        if not zip_dir:
+            return
         try:
-            if  len(selected_specimens) == 1:
-                self.data_handler.save_specimen_data(selected_specimens[0], zip_dir)
-            else:    
-                for specimen in selected_specimens:
-                    self.data_handler.save_specimen_data(specimen, zip_dir)   
-            
-            if zip_dir:   
-                tk.messagebox.showinfo("Save Successful", f"Saved selected specimens.")
-        except Exception as e:
+            self.data_handler.save_specimens_in_background(selected_specimens, zip_dir, on_progress=self.show_export_progress,
+                                                           on_done=self.export_finished)
+        except ValueError as e:
             tk.messagebox.showerror("Save Error", f"Failed to save selected specimens.\n\nError: {e}")
 
     def import_data(self) -> None:
-        DAT_FILE_TYPE = (("Data files", "*.zip"), ("All files", "*.*"))
-        file_path = filedialog.askopenfilename(title="Select a data file", filetypes=(DAT_FILE_TYPE))
-        if file_path:
+        DAT_FILE_TYPE = (("Data files", "*.npz *.zip"), ("All files", "*.*"))
+        file_paths = filedialog.askopenfilenames(title="Select data files", filetypes=(DAT_FILE_TYPE))
+        if not file_paths:
+            return
+        if len(file_paths) > 1:
+            file_paths = self.confirm_import(file_paths)
+        for file_path in file_paths:
             filename = Path(file_path).name
             try:
                 self.data_handler.load_specimen_data(file_path)
             except Exception as e:
                 tk.messagebox.showerror("Import Error", f"Failed to import data from {filename}\n\nError: {e}")
 
+    def confirm_import(self, file_paths):
+        """List the specimens of several archives from their metadata and ask before loading them."""
+        summaries = archive_summaries(file_paths)
+        if summaries.empty:
+            tk.messagebox.showerror("Import Error", "None of the selected files is a specimen archive.")
+            return []
+        columns = [column for column in IMPORT_SUMMARY_COLUMNS if column in summaries.columns]
+        listing = tabulate(summaries[columns].head(IMPORT_LISTING_ROWS), headers="keys", tablefmt="plain", showindex=False, floatfmt=".4g")
+        if len(summaries) > IMPORT_LISTING_ROWS:
+            listing += f"\n... and {len(summaries) - IMPORT_LISTING_ROWS} more"
+        skipped = len(file_paths) - len(summaries)
+        if skipped:
+            listing += f"\n\n{skipped} file(s) could not be read and will be skipped."
+        if not tk.messagebox.askyesno("Import Specimens", f"Import {len(summaries)} specimen(s)?\n\n{listing}"):
+            return []
+        return summaries['file'].tolist()
+
     def export_ms_data(self):
         FILE_TYPE = ( ("All files", "*.*"))
         file_path = filedialog.asksaveasfilename(defaultextension=".docx", filetypes=[("Word Document", "*.docx"), ("All files", "*.*")])
@@ -123,8 +187,8 @@ class ButtonActions:
                 tk.messagebox.showerror("Error", "No specimens selected.")
                 return
             try:
-                self.data_handler.export_DIN_to_word(selected_indices, file_path)
-                tk.messagebox.showinfo("Export Successful", f"Data successfully exported to {file_path}")
+                self.data_handler.export_DIN_to_word(selected_indices, file_path, on_progress=self.show_export_progress,
+                                                     on_done=self.export_finished)
             except Exception as e:
                 tk.messagebox.showerror("Export Error", f"Failed to export data to {file_path}\n\nError: {e}")
             return
@@ -186,7 +250,11 @@ class ButtonActions:
         
         self.data_handler.average_of_selected_specimens(selected_indices)
         self.data_handler.update_properties_df(selected_indices)
+        self.draw_average()
+        if self.app.variables.bootstrap_resamples:
+            self.queue_bootstrap()
 
+    def draw_average(self) -> None:
         tab, _ = self.get_current_tab()
         self.app.plot_manager.master = tab
 
@@ -204,6 +272,52 @@ class ButtonActions:
             _
         )
     
+    def configure_bootstrap(self) -> None:
+        """Ask for the number of bootstrap resamples and, with an average plotted, bootstrap it now."""
+        resamples = simpledialog.askinteger("Bootstrap Confidence Bands",
+                                            "Bootstrap resamples of the average curve and KPIs (0 turns the band off):",
+                                            initialvalue=self.app.variables.bootstrap_resamples or BOOTSTRAP_RESAMPLES, minvalue=0)
+        if resamples is None:
+            return
+        self.app.variables.bootstrap_resamples = resamples or None
+        if not resamples:
+            self.data_handler.confidence_band, self.data_handler.kpi_intervals = None, None
+        elif self.data_handler.stress_matrix is not None:
+            self.queue_bootstrap()
+
+    def queue_bootstrap(self) -> None:
+        try:
+            self.data_handler.bootstrap_confidence_bands(self.app.variables.bootstrap_resamples, seed=self.app.variables.bootstrap_seed,
+                                                         on_progress=self.show_export_progress, on_done=self.bootstrap_finished)
+        except ValueError as e:
+            tk.messagebox.showerror("Error", str(e))
+
+    def bootstrap_finished(self, job) -> None:
+        if job.status != 'done':
+            self.export_finished(job)
+            return
+        self.show_export_progress(job)
+        if self.data_handler.confidence_band is not job.result[0]:
+            return  # another selection was averaged meanwhile
+        self.draw_average()
+        band, intervals = job.result
+        message = f"The average curve now shows the {band.confidence:.0%} bootstrap band of {band.resamples} resamples."
+        if intervals is not None and not intervals.empty:
+            message += f"\n\n{intervals.to_string(float_format='{:.3f}'.format)}"
+        tk.messagebox.showinfo("Bootstrap Confidence Bands", message)
+
+    def sweep_hysteresis_smoothing(self) -> None:
+        selected_indices = self.widget_manager.specimen_listbox.curselection()
+        try:
+            report = self.data_handler.sweep_hysteresis_smoothing(selected_indices)
+        except ValueError as e:
+            tk.messagebox.showerror("Error", str(e))
+            return
+
+        best = report.iloc[0]
+        ranking = report.head(5).to_string(columns=["filter", "parameter", "score"], float_format="{:.4f}".format)
+        tk.messagebox.showinfo("Smoothing Sweep", f"The hysteresis average is now smoothed with {best['filter']} ({best['parameter']}).\n\n{ranking}")
+
     def plot_average_and_error_band(self, ax, test = True):
         strain = self.average_of_specimens["Strain"].to_numpy()  
         stress = self.average_of_specimens["Stress"].to_numpy()
@@ -222,6 +336,11 @@ class ButtonActions:
             min_stress = self.average_of_specimens["min Stress"].to_numpy()
             
             draw_error_band_y_modified(ax, strain, max_stress, min_stress, facecolor="C3", edgecolor="none", alpha=.3)
+
+            band = self.data_handler.confidence_band
+            if band is not None:
+                draw_error_band_y_modified(ax, band.grid, band.upper, band.lower, facecolor="C2", edgecolor="none", alpha=.5,
+                                           label=f"{band.confidence:.0%} bootstrap CI of the mean")
             ucl = self.average_of_specimens["UCL Stress"].to_numpy()
             lcl = self.average_of_specimens["LCL Stress"].to_numpy()
 
@@ -1,10 +1,6 @@
-import glob
-import json
 import os
-import string
-import tempfile
-import threading
-import zipfile
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
 from tkinter import filedialog
 from typing import Optional
@@ -13,24 +9,44 @@ import matplotlib.pyplot as plt
 
 import numpy as np
 import pandas as pd
-from scipy.integrate import trapz
 from tabulate import tabulate
 from scipy.signal import medfilt
 from scipy.ndimage import gaussian_filter1d
 
+from core.export_queue import ExportQueue
+from core.bootstrap import BOOTSTRAP_RESAMPLES, CONFIDENCE_LEVEL, ConfidenceBand, bootstrap_kpi_intervals
+from core.smoothing_sweep import smooth_columns, sweep_smoothing
+from core.averaging import AVERAGE_CACHE_SIZE, SelectionAverages, average_dataframe, stress_summary
 from ms_file_handling.excel_exporter import ExcelExporter
 from ms_file_handling.ms_word_exporter import WordExporter
-from specimens.specimen import Specimen, SpecimenDataManager, SpecimenGraphManager
+from specimens.specimen import Specimen, SpecimenGraphManager
 from scipy.interpolate import interp1d
-from scipy.optimize import curve_fit
-
-DIN_PROPERTIES = [
-        'Rplt', 'Rplt_E', 'ReH', 'Ev', 'Eff', 'ReH_Rplt_ratio', 'Aplt_E', 'AeH', 'Rp1', 'm'
-    ]
+from dataset.data_exporter import PARQUET, ColumnarExporter, specimen_curves
+from dataset.db_connection import SpecimenCatalog
+from specimens.archive import (archive_path_for, encode_specimen_archive, read_specimen_archive, specimen_file_name,
+                               write_archive_arrays, write_specimen_archive)
+from specimens.energy import EnergyCurve
+from specimens.nearest import SortedIndex, nearest_point
+from specimens.parse_cache import set_parse_cache_enabled
+from specimens.properties import (DATA_MANAGER_PROPERTIES, DIN_PROPERTIES, GENERAL_PROPERTIES, HYSTERESIS_DATA_MANAGER_PROPERTIES,
+                                  collect_specimen_properties)
+from specimens.regression import fit_line
+
+# Machine exports at least this large are memory-mapped instead of read into a list of lines
+MEMORY_MAP_THRESHOLD_BYTES = 256 * 1024**2
+
+HYSTERESIS_AVERAGE_COLUMNS = ['Displacement', 'Time', 'Stress', 'Strain']
 
 def is_float(value: str) -> bool:
     return value.replace('.', '', 1).isdigit()
 
+def read_dat_file(file_path):
+    """Read a machine export as a list of lines, or return its Path when it is large enough to be memory-mapped."""
+    if os.path.getsize(file_path) >= MEMORY_MAP_THRESHOLD_BYTES:
+        return Path(file_path)  # parsed later through a memory map
+    with open(file_path, 'r') as file:
+        return file.readlines()
+
 def moving_average(data, window_size):
     return data.rolling(window_size, min_periods=1).mean()
 
@@ -56,13 +72,22 @@ class DataHandler:
         self.app = app
         self.excel_exporter = ExcelExporter(self.app)
         self.word_exporter = WordExporter(self.app)
-        self.general_properties = ['name', 'length', 'width', 'thickness', 'weight', 'density', 'youngs_modulus', 'E20_kJ_m3', 'E50_kJ_m3', 'E80_kJ_m3', 'E20_kJ_kg', 'E50_kJ_kg','E80_kJ_kg']
-        self.data_manager_properties = ['toughness','ductility','resilience']
-        self.hysteresis_data_manager_properties = ['modulus','compressive_proof_strength']
+        self.export_queue = ExportQueue(self.app.master, on_change=self._export_queue_changed)
+        self.general_properties = GENERAL_PROPERTIES
+        self.data_manager_properties = DATA_MANAGER_PROPERTIES
+        self.hysteresis_data_manager_properties = HYSTERESIS_DATA_MANAGER_PROPERTIES
         self.din_properties = DIN_PROPERTIES
         self.properties_df =  pd.DataFrame()
         self.avg_20_pt = None
         self.avg_70_pt = None
+        self.stress_matrix = None
+        self.force_matrix = None
+        self.selection_averages = SelectionAverages()
+        self._hysteresis_averages = OrderedDict()  # (frozenset of specimen ids, smoothing) -> (hysteresis data used, averages)
+        self.smoothing_report = None
+        self.confidence_band = None
+        self.kpi_intervals = None
+        self._stress_index = None  # (average DataFrame, SortedIndex of its stress)
 
         self.data_analysis_buttons = []  # First group
         self.data_management_buttons = []  # Second group
@@ -89,14 +114,10 @@ class DataHandler:
 
 
     def import_specimen_data(self):
-        def read_raw_data(file_path):
-            with open(file_path, 'r') as file:
-                return file.readlines()
-
         def process_file(file_path):
             if file_path:
                 # Display file name above the 'Import Data' button
-                raw_data = read_raw_data(file_path)
+                raw_data = read_dat_file(file_path)
                 return raw_data
 
         DAT_FILE_TYPE = (("Data files", "*.dat"), ("All files", "*.*"))
@@ -122,17 +143,13 @@ class DataHandler:
             specimen.calculate_properties()
 
             filename = Path(file_path).name
-            self.widget_manager.update_ui_elements(filename, specimen)
+            set_parse_cache_enabled(self.app.variables.use_parse_cache)
             specimen.process_data()
+            # After processing, so the import message can report the parse throughput
+            self.widget_manager.update_ui_elements(filename, specimen)
             tab_id = self.widget_manager.create_new_tab(name)
             self.app.variables.add_specimen(tab_id, specimen)
             self.button_actions.clear_entries()
-            # Run specimen.find_IYS_align() in a separate thread
-            find_IYS_align_thread = threading.Thread(target=specimen.find_IYS_align)
-            # Start the new thread
-            find_IYS_align_thread.start()
-            # Wait for the find_IYS_align_thread to finish
-            find_IYS_align_thread.join()
             if len(self.app.variables.specimens) > 1:
                 self.button_actions.plot_all_specimens()
 
@@ -252,7 +269,34 @@ class DataHandler:
         
         return pd.DataFrame({"Force": common_force, "Displacement": interpolated_displacement, "Time": interpolated_time, "Stress": stress, "Strain": interpolated_shiftd_strain})
     
-    def process_hysteresis_data(self, selected_specimens = None, testing=False, smoothing=False,window_size=31, denoise_strength = 21, sigma=6 , all_plots=False):
+    def resample_hysteresis_branch(self, data, common_force, cross_sectional_area):
+        """
+        Displacement, time, stress and shifted strain of one hysteresis branch at the forces of `common_force`.
+
+        Same values as `interpolate_data`, as a (points x 4) array in the order of HYSTERESIS_AVERAGE_COLUMNS.
+        Forces outside the branch take the value at its nearest end.
+        """
+        force = np.abs(data["Force"].to_numpy(dtype=np.float64))
+        order = np.argsort(force, kind='stable')
+        force = force[order]
+        resampled = np.empty((len(common_force), len(HYSTERESIS_AVERAGE_COLUMNS)))
+        resampled[:, 0] = np.interp(common_force, force, data["Displacement"].to_numpy(dtype=np.float64)[order])
+        resampled[:, 1] = np.interp(common_force, force, data["Time"].to_numpy(dtype=np.float64)[order])
+        resampled[:, 2] = np.clip(common_force, force[0], force[-1]) / cross_sectional_area
+        resampled[:, 3] = np.interp(common_force, force, data["shiftd strain"].to_numpy(dtype=np.float64)[order])
+        return resampled
+
+    def average_hysteresis_branch(self, selected_specimens, branches, common_force):
+        """Point-wise mean of the branches of all specimens on `common_force`, one stacked array reduced along the specimens."""
+        stacked = np.empty((len(branches), len(common_force), len(HYSTERESIS_AVERAGE_COLUMNS)))
+        for row, (specimen, data) in enumerate(zip(selected_specimens, branches)):
+            stacked[row] = self.resample_hysteresis_branch(data, common_force, specimen.cross_sectional_area)
+        average = pd.DataFrame(stacked.mean(axis=0), columns=HYSTERESIS_AVERAGE_COLUMNS)
+        average.insert(0, "Force", common_force)
+        return average
+
+    def process_hysteresis_data(self, selected_specimens = None, testing=False, smoothing=False,window_size=31, denoise_strength = 21, sigma=6 , all_plots=False, sweep=False):
+        """Average the hysteresis curves of the selection; with `sweep`, rank the smoothing filters first and return the ranking."""
         if selected_specimens is None:
             selected_indices = self.widget_manager.specimen_listbox.curselection()
             selected_specimens= self.get_selected_specimens(selected_indices)
@@ -268,19 +312,22 @@ class DataHandler:
 
             common_force_1, common_force_2 = self.get_common_force(split_data_1, split_data_2)
 
-            interpolated_data_1 = [self.interpolate_data(data, common_force_1, specimen.cross_sectional_area, specimen.original_length) for specimen, data in zip(selected_specimens, split_data_1)]
-            interpolated_data_2 = [self.interpolate_data(data, common_force_2, specimen.cross_sectional_area, specimen.original_length) for specimen, data in zip(selected_specimens, split_data_2)]
-
-            average_data_1 = pd.concat(interpolated_data_1).groupby("Force").mean()
-            average_data_2 = pd.concat(interpolated_data_2).groupby("Force").mean()
+            average_data_1 = self.average_hysteresis_branch(selected_specimens, split_data_1, common_force_1)
+            average_data_2 = self.average_hysteresis_branch(selected_specimens, split_data_2, common_force_2)
 
-            average_data = pd.concat([average_data_1, average_data_2.iloc[::-1]]).reset_index()
+            average_data = pd.concat([average_data_1, average_data_2.iloc[::-1]], ignore_index=True)
             average_data["Time"] = average_data["Time"] - average_data["Time"].min()
 
             return average_data
 
         temp_data['unsmoothed data'] = process_data(self, selected_specimens, split_data)
         average_data = temp_data['unsmoothed data']
+
+        if sweep and len(selected_specimens) > 1:
+            # Rank the smoothing candidates and keep the best one for the following runs
+            self.smoothing_report = sweep_smoothing(average_data, self._average_key_points(selected_specimens))
+            best = self.smoothing_report.iloc[0]
+            self.app.variables.hysteresis_smoothing = (best['filter'], best['parameter'])
               
         if smoothing and len(selected_specimens) > 1:  
              
@@ -305,6 +352,10 @@ class DataHandler:
                 temp_data['2x smooth after avg med followed by gussian'] = gaussian_smoothing(temp_data['1x smooth after avg med'], sigma= 1)
         
                 average_data = temp_data['1x smooth after avg med'] if ( len(selected_specimens) > 1) else temp_data['unsmoothed data']
+        elif self.app.variables.hysteresis_smoothing is not None and len(selected_specimens) > 1:
+            filter_name, parameter = self.app.variables.hysteresis_smoothing
+            average_data = smooth_columns(temp_data['unsmoothed data'], filter_name, parameter)
+            temp_data[f'1x after avg smooth with {filter_name} {parameter}'] = average_data
         self.app.variables.average_of_specimens_hysteresis = average_data 
         self.app.variables.average_of_specimens_hysteresis_sm = temp_data
 
@@ -322,6 +373,27 @@ class DataHandler:
 
             self._plot_avg_temp_data(temp_data, title= 'with smooth', alpha=0.6, all_plots=all_plots)
 
+        return self.smoothing_report if sweep else None
+
+    def sweep_hysteresis_smoothing(self, selected_indices):
+        """
+        Run the smoothing sweep on the hysteresis average of the selected specimens and keep the best filter.
+
+        The winner is stored in `AppVariables.hysteresis_smoothing`, so every later hysteresis average
+        is smoothed with it.
+
+        Returns:
+            pd.DataFrame: The ranked candidates, see `sweep_smoothing`.
+
+        Raises:
+            ValueError: Fewer than two selected specimens have hysteresis data.
+        """
+        specimens = [specimen for specimen in self.get_selected_specimens(selected_indices)
+                     if specimen.processed_hysteresis_data is not None]
+        if len(specimens) < 2:
+            raise ValueError("The smoothing sweep needs at least two specimens with hysteresis data.")
+        return self.process_hysteresis_data(specimens, sweep=True)
+
     def _plot_avg_temp_data(self, temp_data, title = '', alpha=0.6, all_plots=False, pts=None):
         if all_plots:
             smoothing_functions = ["moving_average", "median_filter", "gaussian_smoothing"]
@@ -365,31 +437,31 @@ class DataHandler:
         column_names = data.columns
         if  "Strain" in column_names or "Stress" in column_names:
             strain_key = "Strain"
-            stress_key = "Stress"   
+            stress_key = "Stress"
         else:
             strain_key = "strain"
             stress_key = "stress"
 
-        distances = np.sqrt((data[strain_key].iloc[start_index:] - key_strain)**2 + (data[stress_key].iloc[start_index:] - key_stress)**2)
-        min_distance_index = distances.idxmin()
-        closest_strain, closest_stress = data[strain_key].iloc[min_distance_index], data[stress_key].iloc[min_distance_index]
-        error = np.sqrt((closest_strain - key_strain)**2 + (closest_stress - key_stress)**2)
+        strain, stress = data[strain_key].to_numpy(), data[stress_key].to_numpy()
+        min_distance_index, error = nearest_point(strain, stress, key_strain, key_stress, start_index)
+        if min_distance_index < 0:
+            # Nothing left after start_index, keep the search where it was
+            return error, (np.nan, np.nan), start_index
+        closest_strain, closest_stress = strain[min_distance_index], stress[min_distance_index]
         return error, (closest_strain, closest_stress), min_distance_index
     
+    def _average_key_points(self, specimens):
+        """Mean (strain, stress) of the specimens' 70% plateau points and of their 20% end points."""
+        strain_70 , stress_70 = zip(*[specimen.data_manager.pt_70_plt for specimen in specimens])
+        stress_20 = [specimen.data_manager.formatted_hysteresis_data["stress"].iloc[-1] for specimen in specimens]
+        strain_20 = [specimen.data_manager.formatted_hysteresis_data["strain"].iloc[-1] for specimen in specimens]
+        return [(np.mean(strain_70), np.mean(stress_70)), (np.mean(strain_20), np.mean(stress_20))]
+
     def _filter_end_points(self, temp_data, key = 'unsmoothed data', show_plot=False):
         if len(self.specimens_with_hysteresis_data) == 1:
             return temp_data
-        strain_70 , stress_70 = zip(*[specimen.data_manager.pt_70_plt for specimen in self.specimens_with_hysteresis_data])
-        stress_20 = [specimen.data_manager.formatted_hysteresis_data["stress"].iloc[-1] for specimen in self.specimens_with_hysteresis_data]
-        strain_20 = [specimen.data_manager.formatted_hysteresis_data["strain"].iloc[-1] for specimen in self.specimens_with_hysteresis_data]
-
-        mean_stress_70 = np.mean(stress_70)
-        mean_strain_70 = np.mean(strain_70)
-
-        mean_stress_20 = np.mean(stress_20)
-        mean_strain_20 = np.mean(strain_20)
-
-        pts = [(mean_strain_70, mean_stress_70), (mean_strain_20, mean_stress_20)]
+        pts = self._average_key_points(self.specimens_with_hysteresis_data)
+        (mean_strain_70, mean_stress_70), (mean_strain_20, mean_stress_20) = pts
         self.app.variables.avg_pleatue_stress = np.mean([mean_stress_70/0.7, mean_stress_20/0.2])
 
         def error_at_key_point(data, key_points):
@@ -493,7 +565,10 @@ class DataHandler:
         return data["Stress"].iloc[max_stress_index], max_stress_index
 
     def _find_closest_stress(self, data, stress_value):
-        closest_stress_index = (data["Stress"] - stress_value).abs().idxmin()
+        # The average is looked up several times per plot, so its sorted stress is kept
+        if self._stress_index is None or self._stress_index[0] is not data:
+            self._stress_index = (data, SortedIndex(data["Stress"].to_numpy()))
+        closest_stress_index = self._stress_index[1].nearest(stress_value)
         return closest_stress_index, data["Strain"].iloc[closest_stress_index], data["Stress"].iloc[closest_stress_index]
 
     def _shift_strain(self, data, max_stress_index, closest_strain):
@@ -577,32 +652,9 @@ class DataHandler:
         return mean_stresses
 
     def _fit_linear_model(self, strain_range, stress_range):
-        def linear_func(x, a, b):
-            return a * x + b
-        popt, _ = curve_fit(linear_func, strain_range, stress_range)
-        return popt[0]  
+        slope, _, _ = fit_line(strain_range, stress_range)
+        return slope
 
-    def get_common_strain(self, selected_specimens):
-        max_strain = max(specimen.shifted_strain.max() for specimen in selected_specimens)
-        max_num_points = max(len(specimen.shifted_strain) for specimen in selected_specimens)
-        common_strain = np.linspace(-0.05, max_strain, num=max_num_points)
-
-        return common_strain
-
-    def get_interpolated_stresses(self, selected_specimens, common_strain):
-        interpolated_stresses = [np.interp(common_strain, specimen.shifted_strain, specimen.stress) for specimen in selected_specimens]
-        return interpolated_stresses
-    
-    def get_common_displacement(self, selected_specimens):
-        max_displacement = max(specimen.shifted_displacement.max() for specimen in selected_specimens)
-        max_num_points = max(len(specimen.shifted_displacement) for specimen in selected_specimens)
-        common_displacement = np.linspace(0, max_displacement, num=max_num_points)
-        return common_displacement
-
-    def get_interpolated_forces(self, selected_specimens, common_displacement):
-        interpolated_forces = [np.interp(common_displacement, specimen.shifted_displacement, specimen.force) for specimen in selected_specimens]
-        return interpolated_forces
-    
     def get_selected_specimens(self, selected_indices=None):
         if selected_indices is None:
             selected_indices = self.widget_manager.specimen_listbox.curselection()
@@ -618,25 +670,16 @@ class DataHandler:
         
         self.app.variables.selected_specimen_names = [specimen.name for specimen in selected_specimens]
 
-        common_displacement = self.get_common_displacement(selected_specimens)
-        interpolated_forces = self.get_interpolated_forces(selected_specimens, common_displacement)
-
-        average_force = np.mean(interpolated_forces, axis=0)
-        average_displacement = common_displacement
-
-        common_strain = self.get_common_strain(selected_specimens)
-        interpolated_stresses = self.get_interpolated_stresses(selected_specimens, common_strain)
-        std_strain = np.std(common_strain)
-
+        variables = self.app.variables
+        average = self.selection_averages.for_selection(selected_specimens, variables.specimens,
+                                                        variables.average_grid_points, variables.average_strain_step)
+        statistics = average.select(selected_specimens)
+        # Kept for percentile and outlier queries on the selection
+        self.stress_matrix, self.force_matrix = average.stress_matrix(selected_specimens), average.force_matrix(selected_specimens)
+        self.confidence_band, self.kpi_intervals = None, None  # bootstrapped on request for this selection
 
-        average_stress = np.mean(interpolated_stresses, axis=0)
-        std_dev_stress = np.std(interpolated_stresses, axis=0)
-        max_stress = np.max(interpolated_stresses, axis=0)
-        min_stress = np.min(interpolated_stresses, axis=0)
-        UCL_stress = average_stress + (control_limit_L * std_dev_stress)
-        LCL_stress = average_stress - (control_limit_L * std_dev_stress)
-
-        average_strain = common_strain
+        summary = stress_summary(statistics['mean'], statistics['std'], statistics['min'], statistics['max'], control_limit_L)
+        average_force = statistics['force']
 
         specimens_with_hysteresis_data = []
 
@@ -647,24 +690,81 @@ class DataHandler:
         # If the list is not empty, process the hysteresis data
         if specimens_with_hysteresis_data:
             self.specimens_with_hysteresis_data =  specimens_with_hysteresis_data
-            self.process_hysteresis_data(specimens_with_hysteresis_data)
+            self.average_hysteresis_of_selection(specimens_with_hysteresis_data)
 
-        self.app.variables.average_of_specimens = pd.DataFrame({
-        "Displacement": average_displacement,
-        "Force": average_force,
-        "Strain": average_strain,
-        "Stress": average_stress,
-        "std Stress":std_dev_stress,
-        "std Strain":std_strain,
-        "max Stress":max_stress,
-        "min Stress":min_stress,
-        "UCL Stress":UCL_stress,
-        "LCL Stress":LCL_stress,
-        })
+        self.app.variables.average_of_specimens = average_dataframe(average.displacement_grid, average_force, average.strain_grid, summary)
 
         if self.app.variables.average_of_specimens_hysteresis is not None and not self.app.variables.average_of_specimens_hysteresis.empty:
             self.shift_hysteresis_data()
           
+    def average_hysteresis_of_selection(self, specimens_with_hysteresis_data):
+        """
+        `process_hysteresis_data` for a selection, reusing the result of a recently averaged selection.
+
+        Results are kept in an LRU cache keyed by the frozen set of specimen ids and the configured smoothing,
+        and are only reused while every specimen still holds the same hysteresis data. Copies are handed
+        out because the shifting of the average modifies it in place.
+        """
+        hysteresis_data = {id(specimen): specimen.processed_hysteresis_data for specimen in specimens_with_hysteresis_data}
+        selection = (frozenset(hysteresis_data), self.app.variables.hysteresis_smoothing)
+        cached = self._hysteresis_averages.get(selection)
+        if cached is not None and all(hysteresis_data[key] is cached[0][key] for key in hysteresis_data):
+            self._hysteresis_averages.move_to_end(selection)
+        else:
+            self.process_hysteresis_data(specimens_with_hysteresis_data)
+            averages = (self.app.variables.average_of_specimens_hysteresis.copy(),
+                        {key: data.copy() for key, data in self.app.variables.average_of_specimens_hysteresis_sm.items()})
+            cached = self._hysteresis_averages[selection] = (hysteresis_data, averages)
+            if len(self._hysteresis_averages) > AVERAGE_CACHE_SIZE:
+                self._hysteresis_averages.popitem(last=False)
+
+        average_data, smoothed_data = cached[1]
+        self.app.variables.average_of_specimens_hysteresis = average_data.copy()
+        self.app.variables.average_of_specimens_hysteresis_sm = {key: data.copy() for key, data in smoothed_data.items()}
+
+    def bootstrap_confidence_bands(self, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE_LEVEL, seed=None, on_progress=None, on_done=None):
+        """
+        Queue the bootstrap confidence band of the average stress-strain curve and intervals of the KPI means.
+
+        Uses the stress matrix and properties of the last averaged selection, so run
+        `average_of_selected_specimens` and `update_properties_df` first. The resampling runs on the
+        export queue, off the Tk thread; once it is done the band and intervals are kept as
+        `confidence_band` and `kpi_intervals`, unless another selection has been averaged meanwhile.
+
+        Args:
+            resamples (int): Number of bootstrap resamples.
+            confidence (float): Confidence level, e.g. 0.95.
+            seed (int): Seed for reproducible bands, None for a fresh one.
+            on_progress, on_done (callable): Called with the ExportJob in the Tk thread, see `ExportQueue.submit`.
+
+        Returns:
+            ExportJob: The queued job, its result is (ConfidenceBand, pd.DataFrame of 'mean', 'lower', 'upper' per KPI).
+
+        Raises:
+            ValueError: No selection has been averaged yet.
+        """
+        if self.stress_matrix is None:
+            raise ValueError("Plot the average of the selected specimens first.")
+        stress_matrix, properties_df = self.stress_matrix, self.properties_df.copy()
+
+        def keep_result(job):
+            if job.status == 'done' and self.stress_matrix is stress_matrix:
+                self.confidence_band, self.kpi_intervals = job.result
+            if on_done is not None:
+                on_done(job)
+
+        return self.export_queue.submit(f"Bootstrap of {len(stress_matrix.names)} specimens", self._bootstrap_job, stress_matrix,
+                                        properties_df, resamples, confidence, seed, on_progress=on_progress, on_done=keep_result)
+
+    def _bootstrap_job(self, job, stress_matrix, properties_df, resamples, confidence, seed):
+        job.report(0.0, "Bootstrapping the average curve")
+        band = ConfidenceBand.from_matrix(stress_matrix, resamples, confidence, seed)
+        job.report(0.9, "Bootstrapping the KPIs")
+        intervals = None
+        if not properties_df.empty:
+            intervals = bootstrap_kpi_intervals(properties_df, resamples=resamples, confidence=confidence, seed=seed)
+        return band, intervals
+
     def calculate_summary_stats(self, values, control_limit_L = 3):
         if np.any(np.equal(values, None)):
             return None, None, None, None, None
@@ -698,31 +798,7 @@ class DataHandler:
     
     def get_specimen_full_properties(self, specimen):
         """Extracts the properties of a specimen."""
-        specimen.calculate_general_KPI()
-        properties = {}
-
-        # Get general properties
-        for prop in self.general_properties:
-            properties[prop] = getattr(specimen, prop)
-        
-        # Get DIN analysis properties
-        if self.app.variables.DIN_Mode == True:
-            for prop in self.din_properties:
-                try:
-                    properties[prop] = getattr(specimen.din_analyzer, prop)
-                except AttributeError:
-                    print(f'Error: din_analyzer not initialized for specimen: {specimen}')
-            
-        # Get data manager properties
-        for prop in self.data_manager_properties:
-            properties[prop] = getattr(specimen.data_manager, prop)
-        
-        # Get hysteresis data manager properties
-        for prop in self.hysteresis_data_manager_properties:
-            if specimen.processed_hysteresis_data is not None and not specimen.processed_hysteresis_data.empty:
-                properties[prop] = getattr(specimen.data_manager, prop)
-        
-        return properties
+        return collect_specimen_properties(specimen, din_mode=self.app.variables.DIN_Mode == True)
 
     def create_summary_df(self, properties_df):
         """Create a summarized DataFrame of their average with the corresponding STD and CV."""
@@ -758,15 +834,8 @@ class DataHandler:
             return (np.abs(stress - 1.3 * self.app.variables.average_plt)).argmin()
         
         def calculate_energy(self, strain, stress):
-
-            def calculate_Ev(stress, strain, compression):
-                idx = (np.abs(strain - compression)).argmin()
-                return trapz(stress[:idx], strain[:idx])
-            
-            E20 = calculate_Ev(stress, strain, 0.2)
-            E50 = calculate_Ev(stress, strain,0.5)
-            dense_index = strain[self.app.variables.average_plt_end_id]
-            E_dense = calculate_Ev(stress, strain, dense_index)
+            dense_strain = strain[self.app.variables.average_plt_end_id]
+            E20, E50, E_dense = EnergyCurve(stress, strain).energy_at([0.2, 0.5, dense_strain])
             return E20, E50, E_dense
         
         if self.app.variables.average_of_specimens is not None:
@@ -779,144 +848,171 @@ class DataHandler:
             self.app.variables.average_E20, self.app.variables.average_E50, self.app.variables.average_E_dense = calculate_energy(self, strain, stress)
 
 
-    def export_average_to_excel(self,selected_indices, file_path, track_export = False):
-    
+    def _export_queue_changed(self, export_queue):
+        self.app.variables.export_in_progress = export_queue.active
+
+    def export_average_to_excel(self,selected_indices, file_path, track_export = False, on_progress=None, on_done=None):
+        """
+        Queue the Excel export of the selected specimens; it runs in the background.
+
+        The data is snapshotted now, on the Tk thread, so the export is not affected by later changes
+        to the selection or the averages.
+
+        Args:
+            selected_indices (list[int]): Specimens to export.
+            file_path (str): Workbook to write.
+            track_export (bool): Profile the export and open the profile in snakeviz once it is done.
+            on_progress, on_done (callable): Called with the ExportJob in the Tk thread, see `ExportQueue.submit`.
+
+        Returns:
+            ExportJob: The queued job, e.g. to cancel it.
+        """
         self.update_properties_df(selected_indices)
 
-        print("Starting export thread")
+        snapshot = self.excel_exporter.snapshot(selected_indices)
+
+        print("Queueing Excel export")
         if track_export is False:
-            export_thread = threading.Thread(target=self.excel_exporter.export_data_to_excel(selected_indices, file_path))
+            function = self._excel_export_job
         else:
-            export_thread = threading.Thread(target=self.excel_exporter.profile_export_average_to_excel, args=(selected_indices, file_path))
-        export_thread.start()
-        self.app.variables.export_in_progress = True
+            function = self._profiled_excel_export_job
+            on_done = partial(self._open_export_profile, on_done)
+        return self.export_queue.submit(f"Excel export to {Path(file_path).name}", function, selected_indices, file_path, snapshot,
+                                        target=file_path, on_progress=on_progress, on_done=on_done)
 
-    def format_specimen_name_for_file(self, specimen_name):
-        valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
-        filename = ''.join(c for c in specimen_name if c in valid_chars)
-        specimen_filename  = filename.replace(' ', '_')  # replace spaces with underscore
-        if len(filename) > 50:  # check if filename is too long
-            specimen_filename = filename[:50]
-        return specimen_filename 
-    
-    def export_DIN_to_word(self,selected_indices, file_path):
-        self.update_properties_df(selected_indices)
+    def _excel_export_job(self, job, selected_indices, file_path, snapshot):
+        self.excel_exporter.export_data_to_excel(selected_indices, file_path, job=job, snapshot=snapshot)
+        return file_path
 
-        print("Starting export thread")
-        export_thread = threading.Thread(target=self.word_exporter.export_report(selected_indices, file_path))
-          
+    def _profiled_excel_export_job(self, job, selected_indices, file_path, snapshot):
+        return self.excel_exporter.profile_export_average_to_excel(selected_indices, file_path, job=job, snapshot=snapshot)
 
-    def save_specimen_data(self, specimen, output_directory):
-        """
-        Saves the specimen data to a temporary directory and then zips the files.
+    def _open_export_profile(self, on_done, job):
+        if job.status == 'done':
+            self.excel_exporter.open_profile(job.result)
+        if on_done is not None:
+            on_done(job)
 
-        Args:
-        specimen (Specimen): The specimen to save.
-        output_directory (str): The directory where to save the zipped file.
+    def format_specimen_name_for_file(self, specimen_name):
+        return specimen_file_name(specimen_name)
+    
+    def export_columnar(self, selected_indices, output_dir, lot=None, file_format=PARQUET, compression='zstd', on_progress=None, on_done=None):
         """
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Serialize specimen properties to JSON
-            properties_dict = specimen.__dict__
-            with open(os.path.join(temp_dir, 'specimen_properties.json'), 'w') as json_file:
-                json.dump(properties_dict, json_file, cls=SpecimenDataEncoder, export_dir=temp_dir)
-
-            # Zip all generated files
-            specimen_file_name =  self.format_specimen_name_for_file(specimen.name)
-            zip_file_path = os.path.join(output_directory, f'{specimen_file_name}_analyzer_data.zip')
-            with zipfile.ZipFile(zip_file_path, 'w') as zip_file:
-                for file in glob.glob(os.path.join(temp_dir, '*')):
-                    zip_file.write(file, os.path.basename(file))
+        Queue the export of the selected specimens for analytics as Parquet or Arrow IPC files.
 
-    def load_specimen_data(self, file_path):
-        """
-        Loads the specimen data from a zipped file.
+        Writes the curves of every specimen partitioned by lot, the properties, the summary statistics
+        and the average curves of the selection. The curves and tables are copied now, on the Tk thread.
+        Cancelling stops before the next specimen and removes the curves written so far.
 
         Args:
-        file_path (str): The path to the zipped file containing the specimen data.
+            selected_indices (list[int]): Specimens to export.
+            output_dir (str): Root directory of the export.
+            lot (str, dict or callable): Lot of the specimens, see `ColumnarExporter.export_curves`.
+                Defaults to app.variables.catalog_lot.
+            file_format (str): 'parquet' or 'arrow'.
+            compression (str): Codec, or None.
+
+        Returns:
+            ExportJob: The queued job, its result is the list of written files.
         """
-        # Create a temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Unzip the file
-            with zipfile.ZipFile(file_path, 'r') as zipf:
-                zipf.extractall(temp_dir)
-
-            # Load properties from the JSON file
-            with open(os.path.join(temp_dir, 'specimen_properties.json'), 'r') as fp:
-                properties_dict = json.load(fp)
-
-            # Reconstruct the Specimen object
-            specimen = Specimen.from_dict(properties_dict, temp_dir=temp_dir)
-            # Add to GUI
-            tab_id = self.widget_manager.create_new_tab(specimen.name)
-            self.app.variables.add_specimen(tab_id, specimen)
-            self.widget_manager.enable_buttons()
-            filename = Path(file_path).name
-            self.widget_manager.update_ui_elements(filename, specimen)
-        return 
+        exporter = ColumnarExporter(output_dir, file_format, compression)
+        self.update_properties_df(selected_indices)
+        curves = [specimen_curves(specimen) for specimen in self.get_selected_specimens(selected_indices)]
+        tables = [(self.properties_df.copy(), 'properties', 'specimen'), (self.summary_statistics(), 'summary_statistics', None)]
+        for data, name in [(self.app.variables.average_of_specimens, 'average_curve'),
+                           (self.app.variables.average_of_specimens_hysteresis, 'average_hysteresis_curve')]:
+            tables.append((None if data is None else data.copy(), name, None))
+        lot = (self.app.variables.catalog_lot or None) if lot is None else lot
+        return self.export_queue.submit(f"Columnar export of {len(curves)} specimen(s)", self._columnar_export_job, exporter, curves, tables,
+                                        lot, target=str(output_dir), on_progress=on_progress, on_done=on_done)
+
+    def _columnar_export_job(self, job, exporter, curves, tables, lot):
+        job.report(0.0, "Writing curves")
+        written = exporter.export_curves(curves, lot=lot, checkpoint=job.check_cancelled)
+        job.report(0.8, "Writing tables")
+        written.extend(exporter.export_table(data, name, index_name=index_name) for data, name, index_name in tables)
+        return [path for path in written if path is not None]
+
+    def export_DIN_to_word(self,selected_indices, file_path, on_progress=None, on_done=None):
+        """Queue the Word report of the selected specimens, see `export_average_to_excel`."""
+        self.update_properties_df(selected_indices)
+        # Each report gets its own exporter and document, with the data taken now on the Tk thread
+        word_exporter = WordExporter(self.app)
+        properties_df, summary_df = self.properties_df.copy(), self.summary_statistics()
 
+        print("Queueing Word export")
+        return self.export_queue.submit(f"Word export to {Path(file_path).name}", self._word_export_job, word_exporter, selected_indices,
+                                        file_path, properties_df, summary_df, target=file_path, on_progress=on_progress, on_done=on_done)
 
-class SpecimenDataEncoder(json.JSONEncoder):
-    """
-    Custom JSONEncoder subclass that knows how to encode custom specimen data types.
+    def _word_export_job(self, job, word_exporter, selected_indices, file_path, properties_df, summary_df):
+        job.report(0.0, "Writing report")
+        word_exporter.export_report(selected_indices, file_path, properties_df=properties_df, summary_df=summary_df)
+        return file_path
 
-    Attributes:
-    export_dir (str): Directory where data files are exported.
-    """
-    def __init__(self, *args, **kwargs):
-        # accept the export directory as an argument
-        self.export_dir = kwargs.pop("export_dir", ".")
-        super().__init__(*args, **kwargs)
-
-    def default(self, obj):
+    def save_specimens_in_background(self, specimens, output_directory, on_progress=None, on_done=None):
         """
-        Overrides the default method of json.JSONEncoder.
+        Queue saving `specimens` as archives in `output_directory`; cancelling stops before the next specimen.
 
-        Args:
-        obj (object): The object to convert to JSON.
+        The archives are encoded now, on the Tk thread, into copies of the specimen data, and only
+        written by the job. Every saved archive is added to the specimen catalog at
+        app.variables.catalog_path, if set; the catalog rows are also taken now and written once
+        their archives exist.
 
         Returns:
-        dict or list or str or int or float or bool or None: The JSON-serializable representation of obj.
+            ExportJob: The queued job, its result is the list of saved files.
         """
-        if isinstance(obj, SpecimenDataManager) or isinstance(obj, SpecimenGraphManager):
-            return self.encode_dict(obj.__dict__)
-        else:
-            return super().default(obj)
-        # try:
-        #     return super().default(obj)
-        # except TypeError:
-        #     if isinstance(obj, dict):
-        #         return self.encode_dict(obj)
-        #     elif hasattr(obj, '__dict__'):
-        #         return self.encode_dict(obj.__dict__)
-        #     else:
-        #         raise
-
-    def encode_dict(self, obj_dict):
+        specimens = list(specimens)
+        archives = [(specimen.name, encode_specimen_archive(specimen, copy=True)) for specimen in specimens]
+        catalog_rows = self.catalog_rows(specimens, output_directory)
+        return self.export_queue.submit(f"Saving {len(specimens)} specimen(s)", self._save_specimens_job, archives, output_directory,
+                                        self.app.variables.compress_archives, catalog_rows, self.app.variables.catalog_path,
+                                        target=output_directory, on_progress=on_progress, on_done=on_done, finish_on_close=True)
+
+    def _save_specimens_job(self, job, archives, output_directory, compress, catalog_rows, catalog_path):
+        saved = []
+        try:
+            for i, (name, arrays) in enumerate(archives):
+                job.report(i / len(archives), f"Saving {name}")
+                saved.append(write_archive_arrays(arrays, archive_path_for(name, output_directory), compress=compress))
+        finally:
+            # Catalog what was saved, also when the job is cancelled part way
+            if catalog_rows and saved:
+                with SpecimenCatalog(catalog_path) as catalog:
+                    catalog.add_rows(catalog_rows[:len(saved)])
+        return saved
+
+    def catalog_rows(self, specimens, output_directory):
+        """Catalog rows of `specimens` saved to `output_directory`, none when the catalog is turned off."""
+        if self.app.variables.catalog_path is None:
+            return []
+        din_mode = self.app.variables.DIN_Mode == True
+        return [SpecimenCatalog.row_for_specimen(specimen, os.path.abspath(archive_path_for(specimen.name, output_directory)),
+                                                 lot=self.app.variables.catalog_lot, din_mode=din_mode) for specimen in specimens]
+
+    def save_specimen_data(self, specimen, output_directory, compress=None):
         """
-        Encodes a dictionary into a JSON-friendly format.
+        Saves the specimen data as a single binary archive.
 
         Args:
-        obj_dict (dict): The dictionary to encode.
+        specimen (Specimen): The specimen to save.
+        output_directory (str): The directory where to save the archive.
+        compress (bool): Compress the archive, defaults to app.variables.compress_archives.
+        """
+        compress = self.app.variables.compress_archives if compress is None else compress
+        return write_specimen_archive(specimen, archive_path_for(specimen.name, output_directory), compress=compress)
 
-        Returns:
-        dict: The encoded dictionary.
+    def load_specimen_data(self, file_path):
         """
-        encoded_dict = {}
-        for attr, value in obj_dict.items():
-            if attr == "raw_data" or attr == "specimen":
-                continue  # Skip raw_data and specimen
-            elif isinstance(value, dict):
-                encoded_dict[attr] = self.encode_dict(value)  # recursively handle nested dictionaries
-            elif isinstance(value, np.int64) or isinstance(value, pd.Int64Dtype):
-                encoded_dict[attr] = int(value)  # Convert np.int64 to int
-            elif isinstance(value, (pd.DataFrame,pd.Series, np.ndarray)):
-                csv_filename = f'{attr}_data.csv'
-                csv_filepath = os.path.join(self.export_dir, csv_filename)
-                if isinstance(value, pd.DataFrame):
-                    value.to_csv(csv_filepath, index=False)
-                else:
-                    np.savetxt(csv_filepath, value, delimiter=",")
-                encoded_dict[attr] = os.path.basename(csv_filename)
-            else:
-                encoded_dict[attr] = value
-        return encoded_dict
+        Loads the specimen data from a binary archive or an older zipped file.
+
+        Args:
+        file_path (str): The path to the file containing the specimen data.
+        """
+        specimen = read_specimen_archive(file_path, lazy=True)
+        # Add to GUI
+        tab_id = self.widget_manager.create_new_tab(specimen.name)
+        self.app.variables.add_specimen(tab_id, specimen)
+        self.widget_manager.enable_buttons()
+        filename = Path(file_path).name
+        self.widget_manager.update_ui_elements(filename, specimen)
+        return 
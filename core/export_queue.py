@@ -0,0 +1,202 @@
+# export_queue.py
+"""
+Background export jobs.
+
+Exports run on a small thread pool so the Tk main loop keeps handling events however long an export
+takes. Workers never touch Tk: they post progress and results to a thread-safe queue, which the main
+loop drains with `after()` and turns into the jobs' callbacks. Queued jobs can be cancelled before
+they start, running jobs at their next checkpoint.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+EXPORT_WORKERS = 2
+POLL_INTERVAL_MS = 100
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class ExportCancelled(Exception):
+    """Raised inside an export at a checkpoint after its job was cancelled."""
+
+
+class ExportJob:
+    """
+    One export, handed to its function so it can report progress and honour cancellation.
+
+    Attributes:
+        name (str): Shown in progress messages.
+        target (str): File or directory written, only one pending job may write it.
+        status (str): 'queued', 'running', 'done', 'failed' or 'cancelled'.
+        progress (float): Fraction done, 0 to 1.
+        message (str): Last progress message.
+        result: Return value of the function once done.
+        error (Exception): Exception raised by the function when it failed.
+        finish_on_close (bool): Let the job finish when the application closes instead of cancelling it.
+    """
+    def __init__(self, name, function, args=(), kwargs=None, target=None, on_progress=None, on_done=None, finish_on_close=False):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.target = str(target) if target is not None else None
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.finish_on_close = finish_on_close
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._events = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def report(self, fraction, message=''):
+        """Post progress from the worker; raises ExportCancelled when the job was cancelled."""
+        self.check_cancelled()
+        self._events.put((self, 'progress', (min(max(fraction, 0.0), 1.0), message)))
+
+    def check_cancelled(self, *_):
+        """Checkpoint of the export; accepts and ignores arguments so it can be passed as a row callback."""
+        if self._cancel_event.is_set():
+            raise ExportCancelled(f"{self.name} was cancelled")
+
+    def run(self):
+        self._events.put((self, 'status', RUNNING))
+        try:
+            if self.cancelled:
+                raise ExportCancelled(f"{self.name} was cancelled")
+            result = self.function(self, *self.args, **self.kwargs)
+        except ExportCancelled:
+            self._events.put((self, CANCELLED, None))
+        except Exception as e:
+            self._events.put((self, FAILED, e))
+        else:
+            self._events.put((self, DONE, result))
+
+
+class ExportQueue:
+    """
+    Runs export jobs on a worker pool and reports back to Tk.
+
+    Args:
+        root: Tk widget whose `after` schedules the polling, usually the main window.
+        max_workers (int): Exports running at the same time, the rest wait in order.
+        on_change (callable): Called in the Tk thread as `on_change(export_queue)` whenever a job
+            starts or finishes, e.g. to update an "export in progress" flag.
+    """
+    def __init__(self, root, max_workers=EXPORT_WORKERS, on_change=None):
+        self.root = root
+        self.on_change = on_change
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+        self.jobs = []
+        self._events = queue.Queue()
+        self._polling = False
+
+    @property
+    def pending(self):
+        """Jobs queued or running."""
+        return [job for job in self.jobs if not job.finished]
+
+    @property
+    def active(self):
+        return bool(self.pending)
+
+    def submit(self, name, function, *args, target=None, on_progress=None, on_done=None, finish_on_close=False, **kwargs):
+        """
+        Queue `function(job, *args, **kwargs)`.
+
+        The function runs on a worker thread and must not call Tk; it reports through `job.report`
+        and should call `job.check_cancelled` between steps. `on_progress(job)` and `on_done(job)`
+        run in the Tk thread, `on_done` also after a failure or cancellation, see `job.status`.
+        Jobs that must not be lost, such as specimen saves, pass `finish_on_close`, see `cancel_all`.
+
+        Raises:
+            ValueError: Another pending job writes the same target.
+        """
+        if target is not None and any(job.target == str(target) for job in self.pending):
+            raise ValueError(f"An export to {target} is already queued")
+        job = ExportJob(name, function, args, kwargs, target, on_progress, on_done, finish_on_close)
+        job._events = self._events
+        self.jobs.append(job)
+        job.future = self.executor.submit(job.run)
+        self._notify()
+        self._schedule_poll()
+        return job
+
+    def cancel(self, job):
+        """Cancel a job: a queued job never starts, a running one stops at its next checkpoint."""
+        job._cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status = CANCELLED
+            self._finish(job)
+
+    def cancel_all(self, closing=False):
+        """Cancel every pending job; when `closing` the application, jobs submitted with `finish_on_close` are left to finish."""
+        for job in self.pending:
+            if not (closing and job.finish_on_close):
+                self.cancel(job)
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            self.cancel_all()
+        self.executor.shutdown(wait=False)
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def _poll(self):
+        """Drain the worker events in the Tk thread and keep polling while jobs are pending."""
+        while True:
+            try:
+                job, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if job.finished:
+                continue
+            if kind == 'progress':
+                job.progress, job.message = payload
+                if job.on_progress is not None:
+                    job.on_progress(job)
+            elif kind == 'status':
+                job.status = payload
+                self._notify()
+            else:
+                job.status = kind
+                if kind == DONE:
+                    job.progress, job.result = 1.0, payload
+                elif kind == FAILED:
+                    job.error = payload
+                self._finish(job)
+
+        self.jobs = [job for job in self.jobs if not job.finished]
+        if self.jobs:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _finish(self, job):
+        if job.on_done is not None:
+            job.on_done(job)
+        self._notify()
+
+    def _notify(self):
+        if self.on_change is not None:
+            self.on_change(self)
@@ -8,6 +8,7 @@ from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg, NavigationTool
 from tkinter import filedialog
 
 from core.widget_manager import SliderManager
+from specimens.nearest import SortedIndex
 from matplotlib.path import Path
 from matplotlib.patches import PathPatch
 
@@ -54,6 +55,7 @@ class PlotManager:
 
         self.enable_click_event = False  # No click events on plots by default
         self.selected_points = []
+        self._nearest_x_index = None  # (xdata, SortedIndex) of the last clicked line
 
 
     def create_figure_canvas(self, fig, position):
@@ -188,6 +190,7 @@ class PlotManager:
         # Set the indices
         specimen.graph_manager.first_increase_index = self.selected_points[0]
         specimen.graph_manager.next_decrease_index = self.selected_points[1]
+        specimen.invalidate_shift_cache()
 
         # Recalculate
         specimen.graph_manager.youngs_modulus = None
@@ -264,7 +267,7 @@ class PlotManager:
                         # Get the nearest index to the clicked point along the x-axis
                         xdata, ydata = line.get_xdata(), line.get_ydata()
                         clicked_point = event.xdata  # Only the x-coordinate matters
-                        index = self.find_nearest_x(clicked_point, xdata)
+                        index = self.nearest_x_index(xdata).nearest(clicked_point)
                         print(f"index is {index}")
 
                         self.selected_points.append(index)
@@ -283,11 +286,11 @@ class PlotManager:
 
                         break
 
-    @staticmethod
-    def find_nearest_x(clicked_x, xdata):
-        """Find the index of the nearest x value to 'clicked_x' in 'xdata'."""
-        distances = np.abs(xdata - clicked_x)
-        return np.argmin(distances)
+    def nearest_x_index(self, xdata):
+        """Sorted index of the x values of the clicked line, kept while the line keeps its data."""
+        if self._nearest_x_index is None or self._nearest_x_index[0] is not xdata:
+            self._nearest_x_index = (xdata, SortedIndex(xdata))
+        return self._nearest_x_index[1]
 
 def draw_error_band_xy(ax, x, y, xerr, yerr, **kwargs):
     # Calculate normals via centered finite differences
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from scipy.ndimage import gaussian_filter1d
+from scipy.signal import medfilt
+
+from specimens.nearest import nearest_point
+
+SMOOTHED_COLUMNS = ("Stress", "Strain")
+# Filter name -> parameters tried by default
+DEFAULT_SWEEP = {
+    "moving_average": [3, 5, 11, 21, 31],
+    "median_filter": [3, 5, 11, 21, 31],
+    "gaussian_smoothing": [1, 2, 4, 6, 8],
+}
+KEY_POINT_ERROR_WEIGHT = 10  # weight of the key point error, relative to the peak stress, against the total variation
+
+
+def _moving_average(values, window_size):
+    return pd.Series(values).rolling(int(window_size), min_periods=1).mean().to_numpy()
+
+
+def _median_filter(values, denoise_strength):
+    return medfilt(values, int(denoise_strength))
+
+
+def _gaussian_smoothing(values, sigma):
+    return gaussian_filter1d(values, sigma=sigma)
+
+
+SMOOTHING_FILTERS = {
+    "moving_average": _moving_average,
+    "median_filter": _median_filter,
+    "gaussian_smoothing": _gaussian_smoothing,
+}
+
+
+def smooth_columns(data, filter_name, parameter, columns=SMOOTHED_COLUMNS):
+    """Copy of `data` with only `columns` smoothed, Force, Time and Displacement are left as they are."""
+    smoothed = data.copy()
+    smooth = SMOOTHING_FILTERS[filter_name]
+    for column in columns:
+        smoothed[column] = smooth(data[column].to_numpy(dtype=np.float64), parameter)
+    return smoothed
+
+
+def total_variation(values):
+    return np.nansum(np.abs(np.diff(values)))
+
+
+def key_point_error(strain, stress, key_points):
+    """
+    Distance from each key point to the closest point of the curve, as in `DataHandler._filter_end_points`.
+
+    The points are searched in order, each from the closest point of the previous one onwards.
+    """
+    error = 0.0
+    start_index = 0
+    for key_strain, key_stress in key_points:
+        closest, distance = nearest_point(strain, stress, key_strain, key_stress, start_index)
+        if closest < 0:
+            return np.inf
+        error += distance
+        start_index = closest
+    return error
+
+
+def score_candidate(strain, stress, filter_name, parameter, key_points, reference_variation, stress_scale,
+                    error_weight=KEY_POINT_ERROR_WEIGHT):
+    """Smooth the curve with one candidate and score it, lower is better."""
+    smooth = SMOOTHING_FILTERS[filter_name]
+    smoothed_strain, smoothed_stress = smooth(strain, parameter), smooth(stress, parameter)
+    variation = total_variation(smoothed_stress) / reference_variation if reference_variation else 1.0
+    error = key_point_error(smoothed_strain, smoothed_stress, key_points) if key_points else 0.0
+    return {
+        "filter": filter_name,
+        "parameter": parameter,
+        "total variation": variation,
+        "key point error": error,
+        "score": variation + error_weight * error / stress_scale,
+    }
+
+
+def sweep_smoothing(data, key_points=None, sweep=None, error_weight=KEY_POINT_ERROR_WEIGHT):
+    """
+    Try every filter and parameter of `sweep` on the averaged hysteresis curve and rank them.
+
+    Each candidate smooths the stress and strain arrays only and is scored by its total variation,
+    normalised by that of `data`, plus its key point error relative to the peak stress, weighted by
+    `error_weight`. The candidates run one after the other in this process: every filter is a single
+    numpy or scipy pass over a few thousand points, cheaper than shipping the curve to a worker.
+
+    Args:
+        data (pd.DataFrame): Unsmoothed average with 'Stress' and 'Strain' columns.
+        key_points (list[tuple]): (strain, stress) points the curve should pass through, e.g. the
+            average 70% and 20% points.
+        sweep (dict): Filter name -> parameters to try, defaults to DEFAULT_SWEEP.
+        error_weight (float): Weight of the key point error.
+
+    Returns:
+        pd.DataFrame: One row per candidate, best first.
+    """
+    sweep = DEFAULT_SWEEP if sweep is None else sweep
+    strain = data["Strain"].to_numpy(dtype=np.float64)
+    stress = data["Stress"].to_numpy(dtype=np.float64)
+    reference_variation = total_variation(stress)
+    stress_scale = np.nanmax(np.abs(stress)) or 1.0
+
+    scores = [score_candidate(strain, stress, name, parameter, key_points, reference_variation, stress_scale, error_weight)
+              for name, parameters in sweep.items() for parameter in parameters]
+    report = pd.DataFrame(scores).sort_values("score", kind="stable").reset_index(drop=True)
+    report.index.name = "rank"
+    return report
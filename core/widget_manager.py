@@ -55,10 +55,12 @@ class WidgetManager:
 
     def create_data_analysis_button_group(self):
         data_analysis_names = ["Submit", "Plot Current Specimen", "Plot Average", 
-                               "Recalculate Specimen Variables", "Clear Specimen"]
+                               "Recalculate Specimen Variables", "Clear Specimen", "Sweep Hysteresis Smoothing",
+                               "Bootstrap Confidence Bands"]
         data_analysis_functions = [self.button_actions.submit, self.button_actions.plot_current_specimen, 
                                    self.button_actions.plot_average, self.button_actions.recalculate_specimen,
-                                   self.button_actions.delete_selected_specimens]
+                                   self.button_actions.delete_selected_specimens, self.button_actions.sweep_hysteresis_smoothing,
+                                   self.button_actions.configure_bootstrap]
         data_analysis_specs = list(zip(data_analysis_names, data_analysis_functions, 
                                        ['normal' if i == 0 else 'disabled' for i in range(len(data_analysis_names))]))
 
@@ -69,12 +71,13 @@ class WidgetManager:
 
     def create_data_management_button_group(self):
         data_management_names = ["Import Specimen Properties","Save Specimen", "Export Average to Excel", 
-                                 "MS Word", "Custom Skew Cards"]
+                                 "Export Parquet", "MS Word", "Custom Skew Cards"]
         data_management_functions = [self.button_actions.import_properties, self.button_actions.save_selected_specimens, self.button_actions.export_average_to_excel, 
-                                     self.button_actions.export_ms_data,
+                                     self.button_actions.export_columnar, self.button_actions.export_ms_data,
                                      self.button_actions.custom_skew_cards]
         data_management_specs = list(zip(data_management_names, data_management_functions, 
                                          ['disabled' if i != 0 else 'normal' for i in range(len(data_management_names))]))
+        data_management_specs.append(("Cancel Exports", self.button_actions.cancel_exports, 'normal'))
 
         self.data_management_button_group = ButtonGroup(self.app.master, data_management_specs)
         self.data_management_button_group.grid(row=0, column=3, rowspan=5, sticky='ns')
@@ -124,8 +127,11 @@ class WidgetManager:
         specimen.display_properties_in_label(self.specimen_properties_label)
         self.file_name_label.config(text=f"File:\n{filename}")
         self.update_specimen_listbox(specimen.name)
-        tk.messagebox.showinfo(
-            "Data Import", f"Data has been imported successfully from {filename}!")
+        message = f"Data has been imported successfully from {filename}!"
+        parse_summary = specimen.data_manager.parse_summary()
+        if parse_summary:
+            message += f"\n\n{parse_summary}."
+        tk.messagebox.showinfo("Data Import", message)
 
     def update_specimen_properties_label(self, event=None):
         selected_tab_index = self.notebook.index(self.notebook.select())
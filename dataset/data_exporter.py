@@ -0,0 +1,174 @@
+# data_exporter.py
+"""
+Columnar export of specimen data for downstream analytics.
+
+Curves are written in long format, one row per data point with the specimen as key, and partitioned
+by lot in hive layout (`curves/lot=<lot>/part-<time>-<id>.parquet`). Every export adds new part files,
+so exporting the same lot again never overwrites the curves already there, and readers of the dataset
+see all parts. Every specimen is converted and written as its own row group or record batch, so memory
+use does not grow with the number of specimens. Tables such as the properties, the summary statistics
+and the average curves are written as single files.
+
+Parquet files are compact and read by every analytics tool. Arrow IPC files can be memory-mapped and
+read without a copy, e.g. `pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()`.
+"""
+import re
+import time
+import uuid
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+PARQUET = 'parquet'
+ARROW = 'arrow'
+FILE_SUFFIXES = {PARQUET: '.parquet', ARROW: '.arrow'}
+CURVES_DIRECTORY = 'curves'
+UNASSIGNED_LOT = 'unassigned'
+CURVE_COLUMNS = ['strain', 'stress', 'shifted_strain', 'force', 'displacement', 'shifted_displacement']
+
+# Copies of the curves of one specimen, exported like the specimen itself
+SpecimenCurves = namedtuple('SpecimenCurves', ['name', *CURVE_COLUMNS])
+
+
+def specimen_curves(specimen):
+    """Copy the curves of a specimen, so they can be exported off the thread that owns the specimen."""
+    return SpecimenCurves(specimen.name, *(np.array(getattr(specimen, column), dtype=np.float64) for column in CURVE_COLUMNS))
+
+
+def curve_schema():
+    return pa.schema([('specimen', pa.string()), ('point', pa.int32())]
+                     + [(column, pa.float64()) for column in CURVE_COLUMNS])
+
+
+def specimen_curve_table(specimen, schema):
+    """The curves of one specimen as an Arrow table in long format."""
+    columns = {
+        'strain': specimen.strain,
+        'stress': specimen.stress,
+        'shifted_strain': specimen.shifted_strain,
+        'force': specimen.force,
+        'displacement': specimen.displacement,
+        'shifted_displacement': specimen.shifted_displacement,
+    }
+    arrays = {column: np.asarray(values, dtype=np.float64) for column, values in columns.items()}
+    length = len(arrays['stress'])
+    return pa.table({
+        'specimen': pa.array([str(specimen.name)] * length, type=pa.string()),
+        'point': pa.array(np.arange(length, dtype=np.int32)),
+        **{column: pa.array(arrays[column]) for column in CURVE_COLUMNS},
+    }, schema=schema)
+
+
+def typed_column(values):
+    """Object columns as numbers when every value is numeric, else as strings, so Arrow can type them."""
+    if values.dtype != object:
+        return values
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().sum() == values.notna().sum():
+        return numeric
+    return values.map(lambda value: None if value is None else str(value))
+
+
+def part_name():
+    """Name of a new part file, unique like the '{i}' of pyarrow's basename_template and sortable by time."""
+    return f"part-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def partition_name(lot):
+    """Directory of a lot partition, with characters that are unsafe in paths replaced."""
+    return f"lot={re.sub(r'[^A-Za-z0-9._-]', '_', str(lot or UNASSIGNED_LOT))}"
+
+
+class ColumnarExporter:
+    """
+    Writes specimen curves and analysis tables as Parquet or Arrow IPC files.
+
+    Attributes:
+        output_dir (Path): Root directory of the export.
+        file_format (str): 'parquet' or 'arrow'.
+        compression (str): Codec, e.g. 'zstd', 'lz4' or None.
+    """
+    def __init__(self, output_dir, file_format=PARQUET, compression='zstd'):
+        if pa is None:
+            raise ImportError("The columnar export needs pyarrow, install it with 'pip install pyarrow'")
+        if file_format not in FILE_SUFFIXES:
+            raise ValueError(f"Unknown file format {file_format!r}, use {PARQUET!r} or {ARROW!r}")
+        self.output_dir = Path(output_dir)
+        self.file_format = file_format
+        self.compression = compression
+
+    def path_for(self, name, directory=None):
+        directory = self.output_dir if directory is None else directory
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f"{name}{FILE_SUFFIXES[self.file_format]}"
+
+    def open_writer(self, path, schema):
+        if self.file_format == PARQUET:
+            return pq.ParquetWriter(path, schema, compression=self.compression or 'none')
+        options = pa.ipc.IpcWriteOptions(compression=self.compression) if self.compression else None
+        return pa.ipc.new_file(path, schema, options=options)
+
+    def export_curves(self, specimens, lot=None, checkpoint=None):
+        """
+        Stream the curves of `specimens` into a new part file per lot.
+
+        The files of an export that fails or is cancelled are removed, so a lot never holds part of an export.
+
+        Args:
+            specimens (iterable[Specimen]): Specimens or their `SpecimenCurves`, consumed once, e.g. `iter_specimen_archives`.
+            lot (str, dict or callable): Lot of every specimen, a mapping of specimen name to lot, or a
+                function of the specimen. Specimens without a lot go to 'lot=unassigned'.
+            checkpoint (callable): Called with the number of specimens written before each next one, e.g. to cancel the export.
+
+        Returns:
+            list[Path]: The written files.
+        """
+        lot_of = lot if callable(lot) else (lambda specimen: lot.get(specimen.name)) if isinstance(lot, dict) else (lambda specimen: lot)
+        schema = curve_schema()
+        name = part_name()
+        writers = {}
+        finished = False
+        try:
+            for count, specimen in enumerate(specimens):
+                if checkpoint is not None:
+                    checkpoint(count)
+                partition = partition_name(lot_of(specimen))
+                if partition not in writers:
+                    path = self.path_for(name, self.output_dir / CURVES_DIRECTORY / partition)
+                    writers[partition] = (path, self.open_writer(path, schema))
+                writers[partition][1].write_table(specimen_curve_table(specimen, schema))
+            finished = True
+        finally:
+            for path, writer in writers.values():
+                writer.close()
+                if not finished:
+                    path.unlink(missing_ok=True)
+        return [path for path, _ in writers.values()]
+
+    def export_table(self, data, name, index_name=None):
+        """
+        Write one DataFrame, keeping its dtypes; a named or non-default index is kept as a column.
+
+        Returns:
+            Path: The written file, or None when `data` is empty.
+        """
+        if data is None or data.empty:
+            return None
+        frame = data.copy()
+        frame.columns = [str(column) for column in frame.columns]
+        if index_name is not None or not isinstance(frame.index, pd.RangeIndex):
+            frame = frame.rename_axis(index_name or frame.index.name or 'index').reset_index()
+        frame = frame.apply(typed_column)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        path = self.path_for(name)
+        with self.open_writer(path, table.schema) as writer:
+            writer.write_table(table)
+        return path
@@ -0,0 +1,174 @@
+# db_connection.py
+"""
+Local SQLite catalog of tested specimens.
+
+One row per specimen holds its lot, test date, every scalar property shown in the summary tables
+and the path of its saved archive, which holds the curves. Lot, date, density and the key KPIs are
+indexed, so range queries over years of tests stay in the milliseconds and the matching archives can
+be streamed straight into the averaging.
+"""
+import sqlite3
+import zipfile
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from specimens.archive import open_specimen_archive
+from specimens.properties import (DATA_MANAGER_PROPERTIES, DIN_PROPERTIES, GENERAL_PROPERTIES, HYSTERESIS_DATA_MANAGER_PROPERTIES,
+                                  collect_specimen_properties)
+
+DEFAULT_CATALOG_PATH = Path.home() / '.cymat_stress_strain' / 'specimen_catalog.sqlite'
+TABLE_NAME = 'specimens'
+KEY_COLUMNS = ['name', 'lot', 'tested_on']
+PROPERTY_COLUMNS = [prop for prop in GENERAL_PROPERTIES + DIN_PROPERTIES + DATA_MANAGER_PROPERTIES + HYSTERESIS_DATA_MANAGER_PROPERTIES
+                    if prop != 'name']
+# Extent of the curves, so a query can size the averaging grid without opening any archive
+CURVE_COLUMNS = ['max_strain', 'max_displacement']
+INDEXED_COLUMNS = ['lot', 'tested_on', 'density', 'youngs_modulus', 'Rplt', 'E20_kJ_m3', 'E50_kJ_m3', 'compressive_proof_strength']
+
+
+def to_real(value):
+    """Value as a float for a REAL column, None when it is missing or not a number."""
+    if isinstance(value, (tuple, list, np.ndarray)) or value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(value) else value
+
+
+class SpecimenCatalog:
+    """
+    SQLite catalog of specimens.
+
+    Attributes:
+        path (Path): Database file, created on first use.
+        columns (list[str]): Queryable columns.
+    """
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        self.path = Path(path)
+        self.columns = KEY_COLUMNS + PROPERTY_COLUMNS + CURVE_COLUMNS + ['archive_path']
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.create_schema()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def create_schema(self):
+        real_columns = ', '.join(f'"{column}" REAL' for column in PROPERTY_COLUMNS + CURVE_COLUMNS)
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {TABLE_NAME} ('
+                'id INTEGER PRIMARY KEY, name TEXT NOT NULL, lot TEXT NOT NULL DEFAULT \'\', tested_on TEXT NOT NULL, '
+                f'{real_columns}, archive_path TEXT, UNIQUE (name, lot, tested_on))')
+            for column in INDEXED_COLUMNS:
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_{column} ON {TABLE_NAME} ("{column}")')
+
+    @staticmethod
+    def row_for(properties, lot='', tested_on=None, archive_path=None, max_strain=None, max_displacement=None):
+        tested_on = tested_on or date.today()
+        row = {'name': str(properties['name']), 'lot': lot or '', 'tested_on': tested_on.isoformat() if isinstance(tested_on, date) else str(tested_on)}
+        row.update({column: to_real(properties.get(column)) for column in PROPERTY_COLUMNS})
+        row.update({'max_strain': to_real(max_strain), 'max_displacement': to_real(max_displacement)})
+        row['archive_path'] = str(archive_path) if archive_path is not None else None
+        return row
+
+    def add_rows(self, rows):
+        """Insert or update rows in one transaction; a specimen is identified by name, lot and test date."""
+        rows = list(rows)
+        if not rows:
+            return
+        columns = ', '.join(f'"{column}"' for column in self.columns)
+        placeholders = ', '.join(f':{column}' for column in self.columns)
+        updates = ', '.join(f'"{column}" = excluded."{column}"' for column in self.columns if column not in KEY_COLUMNS)
+        with self.connection:
+            self.connection.executemany(
+                f'INSERT INTO {TABLE_NAME} ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT (name, lot, tested_on) DO UPDATE SET {updates}', rows)
+
+    def add_specimen(self, specimen, archive_path=None, lot='', tested_on=None, din_mode=False):
+        """
+        Catalog a processed specimen.
+
+        Args:
+            specimen (Specimen): The specimen.
+            archive_path (str or Path): Its saved archive, see `DataHandler.save_specimen_data`.
+            lot (str): Production lot.
+            tested_on (date or str): Test date, ISO formatted when a string. Defaults to today.
+            din_mode (bool): Include the DIN properties.
+        """
+        self.add_rows([self.row_for_specimen(specimen, archive_path, lot, tested_on, din_mode)])
+
+    @classmethod
+    def row_for_specimen(cls, specimen, archive_path=None, lot='', tested_on=None, din_mode=False):
+        """
+        The catalog row of a processed specimen, see `add_specimen`.
+
+        Reads the specimen only, so the row can be built where the specimen lives, e.g. on the Tk
+        thread or in a batch worker, and written to the catalog later with `add_rows`.
+        """
+        properties = collect_specimen_properties(specimen, din_mode=din_mode)
+        return cls.row_for(properties, lot, tested_on, archive_path,
+                           np.max(specimen.shifted_strain), np.max(specimen.shifted_displacement))
+
+    def query(self, lot=None, tested_from=None, tested_to=None, **ranges):
+        """
+        Specimens matching all the given conditions.
+
+        Args:
+            lot (str or list[str]): Lot or lots.
+            tested_from, tested_to (date or str): Inclusive test date range.
+            **ranges: Column -> (low, high), inclusive, either bound may be None,
+                e.g. `density=(0.3, 0.4)`.
+
+        Returns:
+            pd.DataFrame: Matching rows, indexed by catalog id.
+
+        Example:
+            catalog.query(density=(0.3, 0.4), tested_from=date(2024, 1, 1), tested_to=date(2024, 3, 31))
+        """
+        conditions, parameters = [], []
+        if lot is not None:
+            lots = [lot] if isinstance(lot, str) else list(lot)
+            conditions.append(f"lot IN ({', '.join('?' * len(lots))})")
+            parameters.extend(lots)
+        ranges = {'tested_on': (tested_from, tested_to), **ranges}
+        for column, (low, high) in ranges.items():
+            if column not in self.columns:
+                raise ValueError(f"Unknown catalog column: {column}")
+            for bound, operator in ((low, '>='), (high, '<=')):
+                if bound is not None:
+                    conditions.append(f'"{column}" {operator} ?')
+                    parameters.append(bound.isoformat() if isinstance(bound, date) else bound)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return pd.read_sql_query(f'SELECT * FROM {TABLE_NAME}{where} ORDER BY tested_on, name', self.connection,
+                                 params=parameters, index_col='id')
+
+    def remove(self, ids):
+        with self.connection:
+            self.connection.executemany(f'DELETE FROM {TABLE_NAME} WHERE id = ?', [(int(row_id),) for row_id in ids])
+
+    @staticmethod
+    def iter_specimens(rows):
+        """Lazily open the archives of queried rows one at a time, e.g. for `stream_average_of_specimens`."""
+        for archive_path in rows['archive_path'].dropna():
+            try:
+                yield open_specimen_archive(archive_path)
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+                print(f"Skipping {Path(archive_path).name}: {e}")
+
+    @staticmethod
+    def grid_bounds(rows):
+        """Largest strain and displacement of the queried specimens, the end points of the averaging grids."""
+        return rows['max_strain'].max(), rows['max_displacement'].max()
@@ -1,6 +1,7 @@
 # excel_exporter.py
 import cProfile
-import tkinter as tk
+from collections import namedtuple
+from copy import copy
 
 import pandas as pd
 from openpyxl.chart import Reference, ScatterChart, Series
@@ -9,6 +10,12 @@ from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.table import Table, TableStyleInfo
 from openpyxl.styles import NamedStyle, Font, PatternFill
 import subprocess
+from pathlib import Path
+
+from core.export_queue import ExportCancelled
+from specimens.decimation import decimate
+from ms_file_handling.excel_stream import (HEADER_STYLE, NUMBER_FORMAT, NUMBER_STYLE, Block, StreamingWorkbook, TableNameRegistry,
+                                           block_columns, column_width)
 
 # Excel Sheet Names
 SELECTED_SPECIMEN = 'Selected Specimens'
@@ -18,49 +25,193 @@ RAW_DATA = 'Raw Data'
 PROCESSED_DATA = 'Processed Data'
 SUMMARY = 'Summary'
 AVERAGE_CHART = "Average Chart"
+PROCESSED_DATA_HYSTERESIS = 'Hysteresis data'
+CHART_DATA = 'Chart Data'
+CHART_DATA_FIRST_ROW = 3  # below the specimen name and the header of each block
+
+# Overlay charts of the streamed export: title, x and y columns of `Specimen.shifted_data`, axis titles
+OVERLAY_CHARTS = [
+    ("Stress-Strain Curve ", 'strain', 'stress', "Strain", "Stress (MPa)"),
+    ("Stress-Shifted Strain Curve ", 'Shifted Strain', 'stress', "Shifted Strain", "Stress (MPa)"),
+    ("Force-Shifted Displacement Curve ", 'Shifted Displacement (mm)', 'Force', "Shifted Displacement (mm)", "Force (N)"),
+]
+OVERLAY_CHART_ANCHORS = ["A1", "M1", "W1"]
+AVERAGE_SERIES = 'average'
+
+# Copies of what an export reads of one specimen, exported like the specimen itself
+ExportedSpecimen = namedtuple('ExportedSpecimen', ['name', 'density', 'IYS', 'data', 'processed_data', 'processed_hysteresis_data'])
+
+
+def reference_series(ws, x_col, y_col, first_row, last_row, title):
+    """Scatter series over two columns of a sheet, one-based columns and rows."""
+    x_data = Reference(ws, min_col=x_col, min_row=first_row, max_col=x_col, max_row=last_row)
+    y_data = Reference(ws, min_col=y_col, min_row=first_row, max_col=y_col, max_row=last_row)
+    return Series(values=y_data, xvalues=x_data, title=title)
+
+
+def chart_data_series(ws, block, title):
+    """Series over a two-column block of the chart data sheet."""
+    return reference_series(ws, block.start_col + 1, block.start_col + 2, CHART_DATA_FIRST_ROW,
+                            CHART_DATA_FIRST_ROW + len(block.frame) - 1, title)
+
+
+def decimated_frame(df, x_column, y_column, budget, method):
+    """The x and y columns of `df` reduced to at most `budget` points that keep the shape of the curve."""
+    indices = decimate(df[x_column].to_numpy(dtype=float), df[y_column].to_numpy(dtype=float), budget, method)
+    return pd.DataFrame({x_column: df[x_column].to_numpy()[indices], y_column: df[y_column].to_numpy()[indices]})
+
+
+def copy_frame(df):
+    return None if df is None else df.copy()
+
+
+def exported_specimen(specimen):
+    """Copy what an export reads of a specimen, so it can be exported off the thread that owns the specimen."""
+    iys = None if specimen.IYS is None else tuple(specimen.IYS)
+    return ExportedSpecimen(specimen.name, specimen.density, iys, copy_frame(specimen.data), copy_frame(specimen.processed_data),
+                            copy_frame(specimen.processed_hysteresis_data))
+
+
+def format_columns(worksheet, header_blocks, number_style=NUMBER_STYLE):
+    """
+    Format the frames written to a sheet column by column.
+
+    Widths come from the header and dtype of each column, numeric columns get `number_style` and
+    the row stripes come from the table style, so no cell value is read or converted to text.
+
+    This is still O(cells): openpyxl stores a style in every cell it has written and a column
+    style only covers empty cells, so the number style is resolved once per column and then
+    copied into each numeric cell. Formatting in O(columns) needs cells written without a style
+    of their own, as the streamed export does with xlsxwriter's `set_column`, see
+    `StreamingSheet.fit_columns`; this in-memory path is kept for `stream_excel_export = False`.
+
+    Args:
+        worksheet: The sheet the frames were written to.
+        header_blocks: (header row, Block) pairs, the header row one-based.
+        number_style: Named style of the numeric columns.
+    """
+    widths = {}
+    for header_row, block in header_blocks:
+        for offset, (header, values, numeric) in enumerate(block_columns(block)):
+            column = block.start_col + offset + 1
+            widths[column] = max(widths.get(column, 0), column_width(header, values, numeric))
+            worksheet.cell(row=header_row, column=column).style = HEADER_STYLE
+            if not numeric or not len(values):
+                continue
+            first_cell = worksheet.cell(row=header_row + 1, column=column)
+            first_cell.style = number_style
+            style = first_cell._style
+            for (cell,) in worksheet.iter_rows(min_row=header_row + 2, max_row=header_row + len(values), min_col=column, max_col=column):
+                cell._style = copy(style)
+
+    for column, width in widths.items():
+        worksheet.column_dimensions[get_column_letter(column)].width = width
+
+class ExportSnapshot:
+    """
+    Everything one Excel export reads, taken on the Tk thread when the export is queued.
+
+    Exports run on worker threads while the GUI keeps changing the selection, the averages and the
+    specimens themselves, so the snapshot holds copies and no live Specimen; reading a specimen on
+    a worker could also start one of its lazy loads. An export reads only its snapshot and keeps
+    its own state, such as the table names, here.
+
+    Attributes:
+        specimens (list[ExportedSpecimen]): Copies of the exported specimens, in order.
+        properties_dfs, data_dfs (list[DataFrame]): Properties and copies of the shifted data of every specimen.
+        average, average_hysteresis (DataFrame): The average curves.
+        summary_statistics (DataFrame): Statistics of the specimen properties.
+        stream (bool): Write row by row through xlsxwriter, see `AppVariables.stream_excel_export`.
+        chart_point_budget (int), chart_decimation (str): See `ExcelExporter.chart_data_blocks`.
+        table_names (TableNameRegistry): Table names of the workbook being written.
+    """
+    def __init__(self, specimens, properties_dfs, data_dfs, average, average_hysteresis, summary_statistics,
+                 stream=True, chart_point_budget=None, chart_decimation='lttb'):
+        self.specimens = specimens
+        self.properties_dfs = properties_dfs
+        self.data_dfs = data_dfs
+        self.average = average
+        self.average_hysteresis = average_hysteresis
+        self.summary_statistics = summary_statistics
+        self.stream = stream
+        self.chart_point_budget = chart_point_budget
+        self.chart_decimation = chart_decimation
+        self.table_names = TableNameRegistry()
+
 
 class ExcelExporter:
     """
     This class handles the exporting of data to an Excel file.
 
+    The exporter keeps no state of its own between calls; each export works from an ExportSnapshot,
+    so several exports can run at once.
+
     Attributes:
         app: A reference to the application that uses this class.
-        export_in_progress: A boolean flag indicating whether an export is currently in progress.
     """
     def __init__(self, app):
         self.app = app
-    
-    @property
-    def selected_specimens(self):
-        selected_indices = self.app.widget_manager.specimen_listbox.curselection()
-        return [self.app.variables.specimens[index] for index in selected_indices]
-    
-    def profile_export_average_to_excel(self,selected_indices, file_path):
 
+    def snapshot(self, selected_indices):
+        """Take what an export of `selected_indices` needs; call it on the Tk thread."""
+        properties_dfs, data_dfs = self.prepare_data(selected_indices)
+        variables = self.app.variables
+        return ExportSnapshot([exported_specimen(variables.specimens[index]) for index in selected_indices], properties_dfs, data_dfs,
+                              copy_frame(variables.average_of_specimens), copy_frame(variables.average_of_specimens_hysteresis),
+                              self.app.data_handler.summary_statistics(), stream=variables.stream_excel_export,
+                              chart_point_budget=variables.chart_point_budget, chart_decimation=variables.chart_decimation)
+
+    def profile_export_average_to_excel(self, selected_indices, file_path, job=None, snapshot=None):
+        """
+        Run `export_data_to_excel` under cProfile.
+
+        Returns:
+            str: The written profile, e.g. for `open_profile`.
+        """
         # cProfile.runctx('self.export_data_to_excel(selected_indices, file_path)', globals(), locals(), 'export_data_to_excel.profile')
         # Run the function with profiling and save the result
         profiler = cProfile.Profile()
-        profiler.runcall(self.export_data_to_excel, selected_indices, file_path)
+        profiler.runcall(self.export_data_to_excel, selected_indices, file_path, job, snapshot)
         
         # Dump the profiling results to a file
         profile_file = 'export_data_to_excel.profile'
         profiler.dump_stats(profile_file)
+        return profile_file
 
-        subprocess.run(["snakeviz", profile_file])
+    @staticmethod
+    def open_profile(profile_file):
+        """Open a profile in snakeviz without waiting for it."""
+        subprocess.Popen(["snakeviz", profile_file])
 
     # Main control flow function 
-    def export_data_to_excel(self, selected_indices, file_path):
+    def export_data_to_excel(self, selected_indices, file_path, job=None, snapshot=None):
         """
         Exports the data of the selected specimens to an Excel file.
 
+        Errors are raised, not shown: the export usually runs on a worker thread, where Tk must not be
+        called, and the job's `on_done` reports the outcome.
+
         Args:
             selected_indices: Indices of the specimens to export.
             file_path: The path to the Excel file to which the data is exported.
+            job (ExportJob): Background job running the export, progress is reported to it.
+            snapshot (ExportSnapshot): Data to export, taken on the Tk thread. Taken from
+                `selected_indices` now when None, which is only safe on the Tk thread.
         """
         print("export_data_to_excel")
+        if snapshot is None:
+            snapshot = self.snapshot(selected_indices)
+        if snapshot.stream:
+            return self.stream_data_to_excel(selected_indices, file_path, job, snapshot)
+        specimens = snapshot.specimens
+        report = job.report if job is not None else lambda fraction, message='': None
+
         def create_charts(writer, data_dfs, average_df):
             # Create combined chart for selected specimens
             selected_specimens_ws = writer.sheets[SELECTED_SPECIMEN ]
+            chart_blocks = self.chart_data_blocks(snapshot, data_dfs, average_df)
+            if chart_blocks is not None:
+                chart_data_ws = self.write_chart_data_to_excel(writer, chart_blocks)
             
             chart1 = ScatterChart()
             chart1.title = "Stress-Strain Curve "
@@ -73,7 +224,11 @@ class ExcelExporter:
 
 
             for idx, df in enumerate(data_dfs):
-                specimen = self.selected_specimens[idx]
+                specimen = specimens[idx]
+                if chart_blocks is not None:
+                    for chart_index, chart in enumerate([chart1, chart2, chart3]):
+                        chart.series.append(chart_data_series(chart_data_ws, chart_blocks[(chart_index, idx)], f"Specimen {specimen.name}"))
+                    continue
                 stress_col = idx * (len(df.columns) + 1) + 4
                 strain_col = stress_col + 1
                 shifted_strain_col = stress_col + 2
@@ -118,9 +273,12 @@ class ExcelExporter:
             average_ws = writer.sheets[ AVERAGE_OF_SELECTED]
             chart4 = ScatterChart()
             chart4.title = "Stress-Strain Curve - Average"
-            x_data = Reference(average_ws, min_col=3, min_row=2, max_col=3, max_row=len(average_df) + 1)
-            y_data = Reference(average_ws, min_col=4, min_row=2, max_col=4, max_row=len(average_df) + 1)
-            series = Series(values=y_data, xvalues=x_data, title="Average")
+            if chart_blocks is not None:
+                series = chart_data_series(chart_data_ws, chart_blocks[AVERAGE_SERIES], "Average")
+            else:
+                x_data = Reference(average_ws, min_col=3, min_row=2, max_col=3, max_row=len(average_df) + 1)
+                y_data = Reference(average_ws, min_col=4, min_row=2, max_col=4, max_row=len(average_df) + 1)
+                series = Series(values=y_data, xvalues=x_data, title="Average")
             chart4.series.append(series)
 
             chart4.x_axis.title = "Strain"
@@ -130,64 +288,17 @@ class ExcelExporter:
             average_chart_ws = writer.book.create_sheet(AVERAGE_CHART)
             average_chart_ws.add_chart(chart4, "A1")
 
-        def apply_formatting(worksheet,apply_pattern_fill=True):
-            column_widths = {}
-
-            for i, row in enumerate(worksheet.iter_rows(), start=1):
-                for cell in row:
-                    # Determine column widths
-                    column_widths[cell.column] = max(column_widths.get(cell.column, 0), len(str(cell.value)))
-
-                    if i == 1:
-                        cell.style = 'header_font'
-                    elif apply_pattern_fill and i % 2 == 0:  # Apply alternating row fill
-                        cell.style = 'fill'
-                    elif isinstance(cell.value, (int, float)):
-                        cell.style = 'number_format'
-
-            # Set column widths
-            for column, width in column_widths.items():
-                worksheet.column_dimensions[get_column_letter(column)].width = width + 2
-            # arial_font = Font(name='Arial', size=8)
-            # header_font = Font(name='Arial', size=10, bold=True)
-            # fill = PatternFill(start_color='F2F2F2', end_color='F2F2F2', fill_type='solid')
-            
-            # number_format = '#,##0.000' 
-
-            # column_widths = {}
-            
-            # for i, row in enumerate(worksheet.iter_rows(), start=1):
-            #     for cell in row:
-            #         # Apply font to all cells
-            #         cell.font = arial_font
-                    
-            #         # Determine column widths
-            #         column_widths[cell.column] = max(column_widths.get(cell.column, 0), len(str(cell.value)))
-                    
-            #         # Apply formatting to header row
-            #         if i == 1:
-            #             cell.font = header_font
-            #         elif apply_pattern_fill and i % 2 == 0:   # Apply alternating row fill
-            #             cell.fill = fill
-                    
-            #         if isinstance(cell.value, (int, float))and sheet_name not in [SPECIMENS_OVERLAYED, AVERAGE_CHART]:
-            #             cell.number_format = number_format
-            
-            # # Set column widths
-            # for column, width in column_widths.items():
-            #     worksheet.column_dimensions[get_column_letter(column)].width = width + 2
-
         def add_summary_sheet(writer):
             summary_dfs = []
 
-            summary_stats_df = self.app.data_handler.summary_statistics()
+            summary_stats_df = snapshot.summary_statistics
 
             summary_dfs.append(summary_stats_df)
             
-            average_summary = self.app.variables.average_of_specimens.describe().transpose()
+            average_summary = snapshot.average.describe().transpose()
             summary_dfs.append(average_summary)
             
-            for df in self.data_dfs:
+            for df in snapshot.data_dfs:
                 summary = df.describe().transpose()
                 summary_dfs.append(summary)
             
@@ -201,7 +312,7 @@ class ExcelExporter:
                 elif i == 1:
                     specimen_name = "Average"
                 else:
-                    specimen = self.selected_specimens[i - 2]
+                    specimen = specimens[i - 2]
                     specimen_name = specimen.name if specimen else "Unknown Specimen"
 
                 if specimen:
@@ -220,51 +331,54 @@ class ExcelExporter:
             
             # apply_formatting(summary_ws)
 
-        properties_dfs, data_dfs = self.prepare_data(selected_indices)
-        self.properties_dfs = properties_dfs
-        self.data_dfs =data_dfs
+        properties_dfs, data_dfs = snapshot.properties_dfs, snapshot.data_dfs
+        average = snapshot.average
 
         try:
             with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
                 self.set_workbook_style(writer.book)
-                self.write_dfs_to_excel(properties_dfs, data_dfs, writer)
+                report(0.0, "Writing selected specimens")
+                self.write_dfs_to_excel(properties_dfs, data_dfs, writer, table_names=snapshot.table_names)
                 # self.app.variables.average_of_specimens.to_excel(writer, sheet_name= AVERAGE_OF_SELECTED, index=False)
-                avg_start_row = self.write_average_of_specimens(writer, AVERAGE_OF_SELECTED)
-                self.create_table(writer,  AVERAGE_OF_SELECTED, avg_start_row, 0, len(self.app.variables.average_of_specimens.index), len(self.app.variables.average_of_specimens.columns))
-                self.write_raw_data_to_excel(writer)
-                self.write_processed_data_to_excel(writer) 
-
-                for sheet_name in [SELECTED_SPECIMEN ,  AVERAGE_OF_SELECTED]:
+                report(0.3, "Writing average curve")
+                avg_start_row = self.write_average_of_specimens(writer, AVERAGE_OF_SELECTED, snapshot)
+                self.create_table(writer,  AVERAGE_OF_SELECTED, avg_start_row, 0, len(average.index), len(average.columns), snapshot.table_names)
+                report(0.4, "Writing raw and processed data")
+                self.write_raw_data_to_excel(writer, specimens)
+                self.write_processed_data_to_excel(writer, specimens)
+
+                report(0.7, "Formatting")
+                for sheet_name, header_blocks in self.formatting_blocks(snapshot, avg_start_row + 1).items():
                     ws = writer.sheets[sheet_name]
-                    apply_formatting(ws,apply_pattern_fill = False )
+                    format_columns(ws, header_blocks)
                     ws.freeze_panes = ws.cell(row=5 if sheet_name == SELECTED_SPECIMEN  else 2, column=1)
+                report(0.8, "Writing summary and charts")
                 add_summary_sheet(writer)
-                create_charts(writer, data_dfs, self.app.variables.average_of_specimens)
-                self.app.variables.export_in_progress = False
-                tk.messagebox.showinfo("Success", f"Data successfully exported to {file_path}")
+                create_charts(writer, data_dfs, average)
+                report(0.9, "Saving workbook")
 
-        except Exception as e:
-            tk.messagebox.showerror("Error", f"An error occurred while exporting the data: {e}")
-            self.app.variables.export_in_progress = False
+        except ExportCancelled:
+            # The writer saves what it has on the way out, don't leave a partial workbook behind
+            Path(file_path).unlink(missing_ok=True)
+            raise
    
     def set_workbook_style(self, workbook):
-        self.wb = workbook
 
         arial_font = NamedStyle(name="arial_font")
         arial_font.font = Font(name='Arial', size=8)
-        self.wb.add_named_style(arial_font)
+        workbook.add_named_style(arial_font)
 
         header_font = NamedStyle(name="header_font")
         header_font.font = Font(name='Arial', size=10, bold=True)
-        self.wb.add_named_style(header_font)
+        workbook.add_named_style(header_font)
 
         fill = NamedStyle(name="fill")
         fill.fill = PatternFill(start_color='F2F2F2', end_color='F2F2F2', fill_type='solid')
-        self.wb.add_named_style(fill)
+        workbook.add_named_style(fill)
 
         number_format = NamedStyle(name="number_format")
-        number_format.number_format = '#,##0.000'
-        self.wb.add_named_style(number_format)
+        number_format.number_format = NUMBER_FORMAT
+        workbook.add_named_style(number_format)
 
     # Procoessing and creation functions
     def prepare_data(self, selected_indices):
@@ -275,7 +389,7 @@ class ExcelExporter:
             specimen = self.app.variables.specimens[index]
             properties_df = self.get_properties_df(specimen)
             properties_dfs.append(properties_df)
-            data_dfs.append(specimen.shifted_data)
+            data_dfs.append(specimen.shifted_data.copy())
 
         return properties_dfs, data_dfs
 
@@ -302,7 +416,7 @@ class ExcelExporter:
 
         return df
     
-    def _write_dfs_to_excel(self, properties_dfs, data_dfs, writer, start_row=0, start_col=0):
+    def _write_dfs_to_excel(self, properties_dfs, data_dfs, writer, start_row=0, start_col=0, table_names=None):
         """
         Writes properties and data dataframes to an Excel file.
 
@@ -312,6 +426,7 @@ class ExcelExporter:
             writer: The ExcelWriter to use for writing.
             start_row: The row at which to start writing (default is 0).
             start_col: The column at which to start writing (default is 0).
+            table_names: TableNameRegistry of the workbook, see `create_table`.
         """
 
         # Compute the max length of columns for all dataframes only once
@@ -329,7 +444,7 @@ class ExcelExporter:
         # Create tables for each original dataframe in properties_dfs
         start_col_temp = start_col
         for df in properties_dfs:
-            self.create_table(writer, SELECTED_SPECIMEN, start_row, start_col_temp, len(df.index), len(df.columns))
+            self.create_table(writer, SELECTED_SPECIMEN, start_row, start_col_temp, len(df.index), len(df.columns), table_names)
             start_col_temp += max_len + 1
 
         start_col = 0  # Reset start column
@@ -342,11 +457,11 @@ class ExcelExporter:
         # Create tables for each original dataframe in data_dfs
         start_col_temp = start_col
         for df in data_dfs:
-            self.create_table(writer, SELECTED_SPECIMEN, start_row + 3, start_col_temp, len(df.index), len(df.columns))
+            self.create_table(writer, SELECTED_SPECIMEN, start_row + 3, start_col_temp, len(df.index), len(df.columns), table_names)
             start_col_temp += max_len + 1
 
 
-    def write_dfs_to_excel(self, properties_dfs, data_dfs, writer, start_row=0, start_col=0):
+    def write_dfs_to_excel(self, properties_dfs, data_dfs, writer, start_row=0, start_col=0, table_names=None):
         """
         Writes properties and data dataframes to an Excel file.
 
@@ -356,6 +471,7 @@ class ExcelExporter:
             writer: The ExcelWriter to use for writing.
             start_row: The row at which to start writing (default is 0).
             start_col: The column at which to start writing (default is 0).
+            table_names: TableNameRegistry of the workbook, see `create_table`.
         """
 
          # Compute the max length of columns for all dataframes only once
@@ -365,7 +481,7 @@ class ExcelExporter:
         for df in properties_dfs:
             df.columns = df.columns.astype(str)
             df.to_excel(writer, sheet_name=SELECTED_SPECIMEN , index=False, startrow=start_row, startcol=start_col)
-            self.create_table(writer, SELECTED_SPECIMEN , start_row, start_col, len(df.index), len(df.columns))
+            self.create_table(writer, SELECTED_SPECIMEN , start_row, start_col, len(df.index), len(df.columns), table_names)
             start_col += max_len + 1
 
         start_col = 0
@@ -373,36 +489,85 @@ class ExcelExporter:
         # Write data tables
         for df in data_dfs:
             df.to_excel(writer, sheet_name=SELECTED_SPECIMEN , index=False, startrow=start_row + 3, startcol=start_col)
-            self.create_table(writer, SELECTED_SPECIMEN , start_row + 3, start_col, len(df.index), len(df.columns))
+            self.create_table(writer, SELECTED_SPECIMEN , start_row + 3, start_col, len(df.index), len(df.columns), table_names)
             start_col +=  max_len + 1
 
-    def write_average_of_specimens(self, writer, sheet_name):
+    def formatting_blocks(self, snapshot, average_header_row):
+        """The (header row, Block) pairs of the formatted sheets, in the layout of `write_dfs_to_excel` and `write_average_of_specimens`."""
+        properties_dfs, data_dfs = snapshot.properties_dfs, snapshot.data_dfs
+        max_len = max(len(df.columns) for df in properties_dfs + data_dfs)
+        selected = [(1, Block(idx * (max_len + 1), df)) for idx, df in enumerate(properties_dfs)]
+        selected += [(4, Block(idx * (max_len + 1), df)) for idx, df in enumerate(data_dfs)]
+
+        average = snapshot.average
+        hysteresis = snapshot.average_hysteresis
+        averages = [(1, Block(0, pd.DataFrame({'Description': ['Average Data', 'description 2']}))),
+                    (average_header_row, Block(0, average))]
+        if hysteresis is not None:
+            averages.append((average_header_row, Block(average.shape[1] + 1, hysteresis)))
+        return {SELECTED_SPECIMEN: selected, AVERAGE_OF_SELECTED: averages}
+
+    def chart_data_blocks(self, snapshot, data_dfs, average_df):
+        """
+        Decimated copies of the charted curves, one two-column block per series, side by side.
+
+        Charts over the full-resolution columns make Excel render every point and the file slow to
+        open, so the charts point at these copies of at most `snapshot.chart_point_budget` points,
+        reduced by `snapshot.chart_decimation`. The data sheets keep every point.
+
+        Returns:
+            dict: (chart index, specimen index) and 'average' -> Block, None when the budget is None
+            and the charts use the data sheets.
+        """
+        budget = snapshot.chart_point_budget
+        if budget is None:
+            return None
+        method = snapshot.chart_decimation
+        blocks = {}
+        start_col = 0
+        for chart_index, (_, x_column, y_column, _, _) in enumerate(OVERLAY_CHARTS):
+            for idx, (specimen, df) in enumerate(zip(snapshot.specimens, data_dfs)):
+                blocks[(chart_index, idx)] = Block(start_col, decimated_frame(df, x_column, y_column, budget, method), str(specimen.name))
+                start_col += 3
+        blocks[AVERAGE_SERIES] = Block(start_col, decimated_frame(average_df, 'Strain', 'Stress', budget, method), "Average")
+        return blocks
+
+    def write_chart_data_to_excel(self, writer, chart_blocks):
+        """Write the chart data blocks to a hidden sheet, in the layout of the streamed export."""
+        for block in chart_blocks.values():
+            block.frame.to_excel(writer, sheet_name=CHART_DATA, index=False, startrow=CHART_DATA_FIRST_ROW - 2, startcol=block.start_col)
+            ws = writer.sheets[CHART_DATA]
+            ws.cell(row=CHART_DATA_FIRST_ROW - 2, column=block.start_col + 1, value=block.title).font = Font(bold=True)
+        ws.sheet_state = 'hidden'
+        return ws
+
+    def write_average_of_specimens(self, writer, sheet_name, snapshot):
         # Create a new DataFrame with your descriptions
         descriptions = pd.DataFrame({'Description': ['Average Data', 'description 2', 'description 3']})
         start_row = len(descriptions)
         descriptions.to_excel(writer, sheet_name=sheet_name, index=False)
 
         # Write the average_of_specimens DataFrame to Excel, starting after the descriptions
-        self.app.variables.average_of_specimens.to_excel(writer, sheet_name=sheet_name, startrow=start_row, index=False)
+        snapshot.average.to_excel(writer, sheet_name=sheet_name, startrow=start_row, index=False)
 
         # Write the average_of_specimens_hysteresis DataFrame to the same sheet, leaving a column of space in between
-        if self.app.variables.average_of_specimens_hysteresis is not None:
-            self.app.variables.average_of_specimens_hysteresis.to_excel(writer, sheet_name=sheet_name, startcol=self.app.variables.average_of_specimens.shape[1] + 1,startrow=start_row, index=False)
+        if snapshot.average_hysteresis is not None:
+            snapshot.average_hysteresis.to_excel(writer, sheet_name=sheet_name, startcol=snapshot.average.shape[1] + 1,startrow=start_row, index=False)
         return start_row
 
 
 
-    def write_raw_data_to_excel(self, writer):
-        raw_data_dfs = [specimen.data for specimen in self.selected_specimens]
+    def write_raw_data_to_excel(self, writer, specimens):
+        # Memory-mapped imports keep no raw text, so they have no raw data table to write
+        specimens = [specimen for specimen in specimens if specimen.data is not None]
+        raw_data_dfs = [specimen.data for specimen in specimens]
         for idx, df in enumerate(raw_data_dfs):
             df.to_excel(writer, sheet_name=RAW_DATA, index=False, startrow=1, startcol=idx * (len(df.columns) + 1))
             ws = writer.sheets[RAW_DATA]
-            ws.cell(row=1, column=idx * (len(df.columns) + 1) + 1, value=self.selected_specimens[idx].name).font = Font(bold=True)
+            ws.cell(row=1, column=idx * (len(df.columns) + 1) + 1, value=specimens[idx].name).font = Font(bold=True)
 
-    def write_processed_data_to_excel(self, writer):
-        PROCESSED_DATA_HYSTERESIS = 'Hysteresis data'  # the sheet name for hysteresis data
-
-        for idx, specimen in enumerate(self.selected_specimens):
+    def write_processed_data_to_excel(self, writer, specimens):
+        for idx, specimen in enumerate(specimens):
             startcol = idx * (len(specimen.processed_data.columns) + 1)
             
             # Write processed data
@@ -417,9 +582,9 @@ class ExcelExporter:
                 ws_hysteresis.cell(row=1, column=startcol + 1, value=specimen.name).font = Font(bold=True)
       
 
-    def create_table(self, writer, sheet_name, start_row, start_col, row_count, col_count):
+    def create_table(self, writer, sheet_name, start_row, start_col, row_count, col_count, table_names=None):
         """
-        Creates a table in an Excel file.
+        Creates a table in an Excel file, named through the export's table name registry.
 
         Args:
             writer: The ExcelWriter to use for writing.
@@ -428,31 +593,160 @@ class ExcelExporter:
             start_col: The column at which to start the table.
             row_count: The number of rows in the table.
             col_count: The number of columns in the table.
+            table_names: TableNameRegistry of the workbook. When None, one is built from the tables
+                of the workbook, which scans them all; pass the export's registry instead.
         """
-        def get_used_table_names(workbook):
-            """Get a list of all table names used in the workbook."""
-            return [
-                t.displayName
-                for sheet in workbook
-                for t in sheet._tables.values()
-            ]
+        if table_names is None:
+            table_names = TableNameRegistry(t.displayName for sheet in writer.book for t in sheet._tables.values())
 
         worksheet = writer.sheets[sheet_name]
         data_range = f"{get_column_letter(start_col + 1)}{start_row + 1}:{get_column_letter(start_col + col_count)}{start_row + row_count + 1}"
-        base_table_name = f"{sheet_name.replace(' ', '_')}_Table"
-        table_name = base_table_name
-        idx = 1
-        used_table_names = get_used_table_names(writer.book)
-        while table_name in used_table_names:
-            table_name = f"{base_table_name}_{idx}"
-            idx += 1
+        table_name = table_names.allocate(f"{sheet_name.replace(' ', '_')}_Table")
 
         table = Table(displayName=table_name, ref=data_range)
         style = TableStyleInfo(name="TableStyleLight11", showFirstColumn=False, showLastColumn=False, showRowStripes=True, showColumnStripes=False)
         table.tableStyleInfo = style
         worksheet.add_table(table)
 
+    # Streaming export
+    def stream_data_to_excel(self, selected_indices, file_path, job=None, snapshot=None):
+        """
+        Exports the same sheets as `export_data_to_excel` through a constant_memory xlsxwriter workbook.
 
+        Rows are written to temporary files as they are produced instead of being held as cells
+        until the workbook is saved, so memory stays flat for any number of specimens and points.
 
+        Args:
+            selected_indices: Indices of the specimens to export.
+            file_path: The path to the Excel file to which the data is exported.
+            job (ExportJob): Background job running the export, see `export_data_to_excel`. It is
+                also checked every few thousand rows, so a cancelled export stops promptly.
+            snapshot (ExportSnapshot): Data to export, see `export_data_to_excel`.
+        """
+        report = job.report if job is not None else lambda fraction, message='': None
+        if snapshot is None:
+            snapshot = self.snapshot(selected_indices)
+        specimens = snapshot.specimens
 
-
+        workbook = StreamingWorkbook(file_path, checkpoint=job.check_cancelled if job is not None else None)
+        try:
+            report(0.0, "Writing selected specimens")
+            data_header_row = self.stream_selected_specimens(workbook, snapshot.properties_dfs, snapshot.data_dfs)
+            report(0.3, "Writing average curve")
+            average_header_row = self.stream_average_of_specimens(workbook, snapshot)
+            report(0.4, "Writing raw data")
+            self.stream_specimen_tables(workbook, RAW_DATA, [(specimen.name, specimen.data) for specimen in specimens if specimen.data is not None])
+            report(0.55, "Writing processed data")
+            self.stream_specimen_tables(workbook, PROCESSED_DATA, [(specimen.name, specimen.processed_data) for specimen in specimens],
+                                        hysteresis_sheet=PROCESSED_DATA_HYSTERESIS,
+                                        hysteresis_tables=[specimen.processed_hysteresis_data for specimen in specimens])
+            report(0.7, "Writing summary and charts")
+            self.stream_summary_sheet(workbook, snapshot)
+            self.add_streamed_charts(workbook, snapshot, data_header_row, average_header_row)
+            report(0.8, "Saving workbook")
+        except Exception:
+            # Nothing was written to file_path yet, only the temporary row files
+            workbook.discard()
+            raise
+        workbook.save()
+
+    def stream_selected_specimens(self, workbook, properties_dfs, data_dfs):
+        """Properties tables side by side in the first rows and the data tables below them; returns the zero-based data header row."""
+        max_len = max(len(df.columns) for df in properties_dfs + data_dfs)
+        properties_blocks = [Block(idx * (max_len + 1), df) for idx, df in enumerate(properties_dfs)]
+        data_blocks = [Block(idx * (max_len + 1), df) for idx, df in enumerate(data_dfs)]
+
+        sheet = workbook.create_sheet(SELECTED_SPECIMEN)
+        sheet.fit_columns(properties_blocks + data_blocks, workbook.formats['number'])
+        sheet.ws.freeze_panes(4, 0)
+        properties_header_row = sheet.write_blocks(properties_blocks)
+        sheet.skip()
+        data_header_row = sheet.write_blocks(data_blocks)
+
+        for block in properties_blocks:
+            workbook.add_table(SELECTED_SPECIMEN, properties_header_row, block.start_col, [str(column) for column in block.frame.columns], len(block.frame))
+        for block in data_blocks:
+            workbook.add_table(SELECTED_SPECIMEN, data_header_row, block.start_col, [str(column) for column in block.frame.columns], len(block.frame))
+        return data_header_row
+
+    def stream_average_of_specimens(self, workbook, snapshot):
+        """Descriptions, then the average curve and, beside it, the hysteresis average; returns their zero-based header row."""
+        average = snapshot.average
+        hysteresis = snapshot.average_hysteresis
+        descriptions = pd.DataFrame({'Description': ['Average Data', 'description 2']})
+        average_blocks = [Block(0, average)]
+        if hysteresis is not None:
+            average_blocks.append(Block(average.shape[1] + 1, hysteresis))
+
+        sheet = workbook.create_sheet(AVERAGE_OF_SELECTED)
+        sheet.fit_columns([Block(0, descriptions)] + average_blocks, workbook.formats['number'])
+        sheet.ws.freeze_panes(1, 0)
+        sheet.write_blocks([Block(0, descriptions)])
+        header_row = sheet.write_blocks(average_blocks)
+        workbook.add_table(AVERAGE_OF_SELECTED, header_row, 0, [str(column) for column in average.columns], len(average))
+        return header_row
+
+    def stream_specimen_tables(self, workbook, sheet_name, named_tables, hysteresis_sheet=None, hysteresis_tables=()):
+        """One table per specimen side by side under its name; hysteresis tables, if any, go to their own sheet in the same columns."""
+        blocks, hysteresis_blocks = [], []
+        start_col = 0
+        for idx, (name, df) in enumerate(named_tables):
+            blocks.append(Block(start_col, df, name))
+            hysteresis = hysteresis_tables[idx] if idx < len(hysteresis_tables) else None
+            if hysteresis is not None and not hysteresis.empty:
+                hysteresis_blocks.append(Block(start_col, hysteresis, name))
+            start_col += len(df.columns) + 1
+        if blocks:
+            workbook.create_sheet(sheet_name).write_blocks(blocks)
+        if hysteresis_blocks:
+            workbook.create_sheet(hysteresis_sheet).write_blocks(hysteresis_blocks)
+
+    def stream_summary_sheet(self, workbook, snapshot):
+        """The summary statistics, then the description of the average and of every specimen, one below the other."""
+        sheet = workbook.create_sheet(SUMMARY)
+        titled_summaries = [("Summary Statistics", snapshot.summary_statistics),
+                            ("Average", snapshot.average.describe().transpose())]
+        for specimen, df in zip(snapshot.specimens, snapshot.data_dfs):
+            if specimen.processed_hysteresis_data is None and specimen.IYS:
+                yield_stress, yield_strain = specimen.IYS
+                density_iys_text = f" ({specimen.density:.2f} g/cc,IYS: {yield_stress:.2f} MPa, {yield_strain:.2f} mm)"
+            else:
+                density_iys_text = f" ({specimen.density:.2f} g/cc"
+            titled_summaries.append((f"{specimen.name}{density_iys_text}", df.describe().transpose()))
+
+        for title, summary_df in titled_summaries:
+            sheet.write_blocks([Block(0, summary_df, title, index=True)])
+
+    def add_streamed_charts(self, workbook, snapshot, data_header_row, average_header_row):
+        """Overlay charts of the selected specimens and the chart of the average, referencing the streamed columns by name."""
+        specimens, data_dfs, average = snapshot.specimens, snapshot.data_dfs, snapshot.average
+        max_len = max(len(df.columns) for df in snapshot.properties_dfs + data_dfs)
+        chart_blocks = self.chart_data_blocks(snapshot, data_dfs, average)
+        if chart_blocks is not None:
+            chart_data = workbook.create_sheet(CHART_DATA)
+            chart_data.ws.hide()
+            chart_data.write_blocks(list(chart_blocks.values()))
+
+        def chart_data_block_series(block, name):
+            first_row = CHART_DATA_FIRST_ROW - 1
+            return (name, CHART_DATA, block.start_col, block.start_col + 1, first_row, first_row + len(block.frame) - 1)
+
+        workbook.create_sheet(SPECIMENS_OVERLAYED)
+        for chart_index, ((title, x_column, y_column, x_title, y_title), anchor) in enumerate(zip(OVERLAY_CHARTS, OVERLAY_CHART_ANCHORS)):
+            series = []
+            for idx, (specimen, df) in enumerate(zip(specimens, data_dfs)):
+                if chart_blocks is not None:
+                    series.append(chart_data_block_series(chart_blocks[(chart_index, idx)], f"Specimen {specimen.name}"))
+                    continue
+                start_col = idx * (max_len + 1)
+                series.append((f"Specimen {specimen.name}", SELECTED_SPECIMEN, start_col + df.columns.get_loc(x_column),
+                               start_col + df.columns.get_loc(y_column), data_header_row + 1, data_header_row + len(df)))
+            workbook.add_scatter_chart(SPECIMENS_OVERLAYED, anchor, title, x_title, y_title, series)
+
+        if chart_blocks is not None:
+            series = chart_data_block_series(chart_blocks[AVERAGE_SERIES], "Average")
+        else:
+            series = ("Average", AVERAGE_OF_SELECTED, average.columns.get_loc('Strain'), average.columns.get_loc('Stress'),
+                      average_header_row + 1, average_header_row + len(average))
+        workbook.create_sheet(AVERAGE_CHART)
+        workbook.add_scatter_chart(AVERAGE_CHART, "A1", "Stress-Strain Curve - Average", "Strain", "Stress (MPa)", [series])
@@ -0,0 +1,255 @@
+# excel_stream.py
+"""
+Streaming backend of the Excel export.
+
+The workbook is written by xlsxwriter in constant_memory mode: every row goes to a temporary file as
+soon as the next row starts, so no cells pile up and memory stays flat however many specimens are
+exported. Rows have to be written top to bottom, so frames that sit side by side are written as
+blocks, a chunk of rows at a time from their numpy columns. Number formats are set per column, and a
+cell written without a format of its own takes the format of its column.
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from xlsxwriter import Workbook
+from xlsxwriter.utility import xl_range
+from xlsxwriter.worksheet import Worksheet
+
+TABLE_STYLE = "TableStyleLight11"
+HEADER_STYLE = 'header_font'
+NUMBER_STYLE = 'number_format'
+NUMBER_FORMAT = '#,##0.000'
+HEADER_FORMAT = {'font_name': 'Arial', 'font_size': 10, 'bold': True}
+NUMBER_COLUMN_WIDTH = 12  # fits '#,##0.000' up to 99,999
+MAX_COLUMN_WIDTH = 50
+TEXT_WIDTH_SAMPLE = 100  # rows read to size a text column
+CHUNK_CELLS = 32_768  # cells converted from numpy to Python values at a time, about 1 MB
+CHECKPOINT_ROWS = 10_000  # rows between calls of a sheet's checkpoint
+
+# A frame written from the zero-based column `start_col`, under an optional bold title, with or without its index
+Block = namedtuple('Block', ['start_col', 'frame', 'title', 'index'], defaults=[None, False])
+
+
+def block_columns(block):
+    """Header, values and whether it is numeric, of every column of a block, index first when written."""
+    frame = block.frame
+    columns = [(str(column), frame[column].to_numpy(), frame[column].dtype.kind in 'biuf') for column in frame.columns]
+    if block.index:
+        name = '' if frame.index.name is None else str(frame.index.name)
+        columns.insert(0, (name, frame.index.to_numpy(), frame.index.dtype.kind in 'biuf'))
+    return columns
+
+
+def column_chunk(values, numeric):
+    """A slice of a column as Python values, with missing values as None like `DataFrame.to_excel`."""
+    if values.dtype.kind in 'biu':
+        return values.tolist()
+    missing = np.isnan(values) if numeric else pd.isna(values)
+    chunk = values.tolist()
+    for position in np.flatnonzero(missing).tolist():
+        chunk[position] = None
+    return chunk
+
+
+def column_width(header, values, numeric):
+    """Width of a column from its header and type; text columns are sized from their first rows."""
+    width = len(header)
+    if numeric:
+        return max(width, NUMBER_COLUMN_WIDTH) + 2
+    sample = values[:TEXT_WIDTH_SAMPLE]
+    if len(sample):
+        width = max(width, max(len(str(value)) for value in sample))
+    return min(width, MAX_COLUMN_WIDTH) + 2
+
+
+class TableNameRegistry:
+    """
+    Unique table names of one workbook, allocated in constant time.
+
+    Table names must be unique across the whole workbook. Names are numbered per base name,
+    'Base', 'Base_1', 'Base_2', ..., skipping any name that is already taken.
+    """
+    def __init__(self, used_names=()):
+        self._used = set(used_names)
+        self._next = {}
+
+    def __contains__(self, name):
+        return name in self._used
+
+    def allocate(self, base_name):
+        count = self._next.get(base_name, 0)
+        name = base_name if count == 0 else f"{base_name}_{count}"
+        while name in self._used:
+            count += 1
+            name = f"{base_name}_{count}"
+        self._next[base_name] = count + 1
+        self._used.add(name)
+        return name
+
+
+class StreamingWorksheet(Worksheet):
+    """
+    Worksheet that takes tables over rows it has already written.
+
+    xlsxwriter refuses tables in constant_memory mode because `add_table` writes the header cells
+    and registers every cell of the range. Here the headers are written with the rows, so the table
+    is declared over its header row alone and then widened to its data rows.
+    """
+    def add_streamed_table(self, first_row, first_col, last_row, last_col, options):
+        self.constant_memory = False
+        try:
+            result = self.add_table(first_row, first_col, first_row, last_col, {**options, 'header_row': False})
+        finally:
+            self.constant_memory = True
+        if result == 0:
+            table = self.tables[-1]
+            table['header_row_count'] = 1
+            table['range'] = table['a_range'] = table['autofilter'] = xl_range(first_row, first_col, last_row, last_col)
+        return result
+
+    def discard(self):
+        """Close and delete the temporary row file of an unsaved sheet."""
+        if self.row_data_fh is not None and not self.row_data_fh_closed:
+            self.row_data_fh.close()
+            self.row_data_fh_closed = True
+        if self.row_data_filename is not None and os.path.exists(self.row_data_filename):
+            os.remove(self.row_data_filename)
+
+
+class StreamingSheet:
+    """
+    A constant_memory worksheet and the number of its next row.
+
+    Attributes:
+        ws (StreamingWorksheet): The sheet.
+        row (int): Zero-based number of the next row.
+        checkpoint (callable): Called with the row number every CHECKPOINT_ROWS rows, e.g. to cancel an export.
+    """
+    def __init__(self, ws, formats, checkpoint=None):
+        self.ws = ws
+        self.row = 0
+        self.formats = formats
+        self.checkpoint = checkpoint
+        self._next_checkpoint = CHECKPOINT_ROWS
+
+    def fit_columns(self, blocks, number_format=None):
+        """Size every block column from its header and type, and give the numeric ones `number_format`."""
+        widths, numeric_columns = {}, set()
+        for block in blocks:
+            for offset, (header, values, numeric) in enumerate(block_columns(block)):
+                column = block.start_col + offset
+                widths[column] = max(widths.get(column, 0), column_width(header, values, numeric))
+                if numeric:
+                    numeric_columns.add(column)
+        for column, width in widths.items():
+            self.ws.set_column(column, column, width, number_format if column in numeric_columns else None)
+
+    def skip(self, rows=1):
+        self.row += rows
+
+    def next_row(self):
+        self.row += 1
+        if self.checkpoint is not None and self.row >= self._next_checkpoint:
+            self._next_checkpoint += CHECKPOINT_ROWS
+            self.checkpoint(self.row)
+
+    def write_blocks(self, blocks):
+        """
+        Write frames side by side: their titles, if any, then their headers and rows.
+
+        The rows are converted from the numpy columns a chunk of at most CHUNK_CELLS cells at a
+        time, so the blocks never exist as Python values all at once. Data cells carry no format of
+        their own and show the format their column got from `fit_columns`.
+
+        Args:
+            blocks (list[Block]): Frames and their start columns.
+
+        Returns:
+            int: Zero-based row of the headers.
+        """
+        ws = self.ws
+        if any(block.title for block in blocks):
+            for block in blocks:
+                if block.title:
+                    ws.write_string(self.row, block.start_col, str(block.title), self.formats['title'])
+            self.next_row()
+
+        header_row = self.row
+        columns = []
+        for block in blocks:
+            for offset, (header, values, numeric) in enumerate(block_columns(block)):
+                ws.write_string(header_row, block.start_col + offset, header, self.formats['header'])
+                columns.append((block.start_col + offset, values, numeric))
+        self.next_row()
+
+        row_count = max((len(values) for _, values, _ in columns), default=0)
+        chunk_rows = max(CHUNK_CELLS // max(len(columns), 1), 1)
+        for chunk_start in range(0, row_count, chunk_rows):
+            chunk_stop = min(chunk_start + chunk_rows, row_count)
+            chunks = [(column, column_chunk(values[chunk_start:chunk_stop], numeric), ws.write_number if numeric else ws.write)
+                      for column, values, numeric in columns if chunk_start < len(values)]
+            for position in range(chunk_stop - chunk_start):
+                for column, chunk, write in chunks:
+                    if position < len(chunk) and chunk[position] is not None:
+                        write(self.row, column, chunk[position])
+                self.next_row()
+        return header_row
+
+
+class StreamingWorkbook:
+    """
+    constant_memory workbook with header, number and title formats, tables and charts.
+
+    Nothing is written to `file_path` until `save`; `discard` drops an unfinished workbook.
+
+    Args:
+        file_path: The workbook to write.
+        checkpoint (callable): Checkpoint of every sheet, see `StreamingSheet`.
+    """
+    def __init__(self, file_path, checkpoint=None):
+        # inf is written as #DIV/0! instead of failing the export; NaN cells are left empty before they get there
+        self.book = Workbook(file_path, {'constant_memory': True, 'nan_inf_to_errors': True})
+        self.checkpoint = checkpoint
+        self.formats = {'header': self.book.add_format(HEADER_FORMAT),
+                        'number': self.book.add_format({'num_format': NUMBER_FORMAT}),
+                        'title': self.book.add_format({'bold': True})}
+        self.sheets = {}
+        self.table_names = TableNameRegistry()
+
+    def create_sheet(self, title):
+        ws = self.book.add_worksheet(title, worksheet_class=StreamingWorksheet)
+        sheet = self.sheets[title] = StreamingSheet(ws, self.formats, self.checkpoint)
+        return sheet
+
+    def add_table(self, sheet_name, header_row, start_col, headers, row_count):
+        """Styled table over a written header row (zero-based) and the `row_count` rows below it."""
+        table_name = self.table_names.allocate(f"{sheet_name.replace(' ', '_')}_Table")
+        options = {'name': table_name, 'style': TABLE_STYLE, 'columns': [{'header': header} for header in headers]}
+        self.sheets[sheet_name].ws.add_streamed_table(header_row, start_col, header_row + row_count, start_col + len(headers) - 1, options)
+
+    def add_scatter_chart(self, sheet_name, anchor, title, x_title, y_title, series):
+        """
+        Scatter chart of lines with markers on `sheet_name`.
+
+        Args:
+            series: (name, data sheet name, x column, y column, first row, last row) of every series,
+                columns and rows zero-based.
+        """
+        chart = self.book.add_chart({'type': 'scatter', 'subtype': 'straight_with_markers'})
+        for name, data_sheet, x_col, y_col, first_row, last_row in series:
+            chart.add_series({'name': name,
+                              'categories': [data_sheet, first_row, x_col, last_row, x_col],
+                              'values': [data_sheet, first_row, y_col, last_row, y_col]})
+        chart.set_title({'name': title})
+        chart.set_x_axis({'name': x_title})
+        chart.set_y_axis({'name': y_title})
+        self.sheets[sheet_name].ws.insert_chart(anchor, chart)
+
+    def save(self):
+        self.book.close()
+
+    def discard(self):
+        for sheet in self.sheets.values():
+            sheet.ws.discard()
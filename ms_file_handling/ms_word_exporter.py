@@ -148,8 +148,18 @@ class WordExporter:
         self.summary_df = self.app.data_handler.summary_statistics()
         
 
-    def export_report(self, selected_indices, file_path):
-        self.fetch_data(selected_indices)
+    def export_report(self, selected_indices, file_path, properties_df=None, summary_df=None):
+        """
+        Write the report to `file_path` as a new document.
+
+        Pass the properties and summary taken on the Tk thread when the report is written in the
+        background; they are fetched from the data handler when None.
+        """
+        if properties_df is None:
+            self.fetch_data(selected_indices)
+        else:
+            self.properties_df, self.summary_df = properties_df, summary_df
+        self.doc = Document()
         self.add_heading(self.Title, 0)
         self.doc.add_paragraph(self.date)
         self.doc.add_paragraph(self.standard_num)
@@ -0,0 +1,108 @@
+# query_catalog.py
+"""
+Query the specimen catalog without the GUI.
+
+Specimens are added to the catalog when they are saved from the analyzer or processed with
+batch_ingest.py --catalog. A query selects them by lot, test date and value ranges of any catalog
+column, and prints or writes the matching rows. With --average, the archives of the matches are
+streamed one at a time into their average curve, so whole historical lots average in constant memory.
+
+Usage:
+    python query_catalog.py [--catalog PATH] [--lot LOT ...] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+                            [--range COLUMN LOW HIGH ...] [-o rows.csv] [--average average.csv [--points N | --step S]] [-v]
+
+    Either bound of a --range may be '-' to leave it open, e.g. --range density 0.3 -
+"""
+import argparse
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+from core.averaging import MAX_GRID_POINTS, stream_average_of_specimens
+from dataset.db_connection import DEFAULT_CATALOG_PATH, SpecimenCatalog
+
+OPEN_BOUND = '-'
+LISTED_COLUMNS = ['name', 'lot', 'tested_on', 'density', 'youngs_modulus', 'E50_kJ_m3', 'archive_path']
+
+
+def parse_bound(value):
+    return None if value == OPEN_BOUND else float(value)
+
+
+def query_filters(args):
+    """Keyword arguments of `SpecimenCatalog.query` from the parsed command line."""
+    filters = {'lot': args.lot, 'tested_from': args.tested_from, 'tested_to': args.tested_to}
+    for column, low, high in args.range or []:
+        filters[column] = (parse_bound(low), parse_bound(high))
+    return filters
+
+
+def write_table(table, output_path, description, index=True):
+    output_path = Path(output_path)
+    if output_path.suffix.lower() == '.xlsx':
+        table.to_excel(output_path, index=index)
+    else:
+        table.to_csv(output_path, index=index)
+    print(f"{description} written to {output_path}")
+
+
+def average_rows(catalog, rows, output_path, num_points=MAX_GRID_POINTS, step=None, verbose=False):
+    """Stream the archives of the queried rows into their average curve and write it."""
+    rows = rows.dropna(subset=['archive_path'])
+    if rows.empty:
+        print("None of the matching specimens has a saved archive to average")
+        return False
+    max_strain, max_displacement = catalog.grid_bounds(rows)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        average, names = stream_average_of_specimens(catalog.iter_specimens(rows), max_strain, max_displacement,
+                                                     num_points=num_points, step=step)
+    if average is None:
+        print("No archive could be read")
+        return False
+    print(f"Averaged {len(names)} of {len(rows)} specimen(s)")
+    write_table(average, output_path, "Average curve", index=False)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the specimen catalog.")
+    parser.add_argument('--catalog', default=str(DEFAULT_CATALOG_PATH), help=f"Catalog to query (default {DEFAULT_CATALOG_PATH})")
+    parser.add_argument('--lot', nargs='+', help="Lot or lots")
+    parser.add_argument('--from', dest='tested_from', help="First test date, YYYY-MM-DD")
+    parser.add_argument('--to', dest='tested_to', help="Last test date, YYYY-MM-DD")
+    parser.add_argument('--range', nargs=3, action='append', metavar=('COLUMN', 'LOW', 'HIGH'),
+                        help=f"Inclusive range of a catalog column, '{OPEN_BOUND}' for an open bound; repeat for several columns")
+    parser.add_argument('-o', '--output', help="Write the matching rows (.csv or .xlsx)")
+    parser.add_argument('--average', help="Write the average curve of the matching specimens (.csv or .xlsx)")
+    grid = parser.add_mutually_exclusive_group()
+    grid.add_argument('--points', type=int, default=MAX_GRID_POINTS, help=f"Points of the averaging grid (default {MAX_GRID_POINTS})")
+    grid.add_argument('--step', type=float, help="Strain spacing of the averaging grid instead of a point count")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the per-specimen loading output while averaging")
+    args = parser.parse_args(argv)
+
+    if not Path(args.catalog).exists():
+        print(f"No catalog at {args.catalog}")
+        return 1
+    with SpecimenCatalog(args.catalog) as catalog:
+        try:
+            rows = catalog.query(**query_filters(args))
+        except ValueError as e:
+            parser.error(str(e))
+        if rows.empty:
+            print("No specimens match")
+            return 1
+
+        print(rows[[column for column in LISTED_COLUMNS if column in rows.columns]].to_string())
+        print(f"{len(rows)} specimen(s)")
+        if args.output:
+            write_table(rows, args.output, "Catalog rows")
+        if args.average and not average_rows(catalog, rows, args.average, num_points=args.points, step=args.step,
+                                                 verbose=args.verbose):
+            return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
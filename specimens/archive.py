@@ -0,0 +1,304 @@
+import json
+import os
+import string
+import tempfile
+import zipfile
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from specimens.specimen import Specimen, SpecimenDataManager, SpecimenGraphManager
+
+ARCHIVE_VERSION = 1
+ARCHIVE_SUFFIX = '.npz'
+METADATA_KEY = '__metadata__'
+NULL_SUFFIX = '/__null__'
+INDEX_NAME = '__index__'
+SKIPPED_ATTRIBUTES = ('raw_data', 'specimen')
+MANAGER_ATTRIBUTES = ('data_manager', 'graph_manager')
+LEGACY_PROPERTIES_NAME = 'specimen_properties.json'
+LEGACY_DATA_SUFFIX = '_data.csv'
+
+
+class ArchiveEncoder:
+    """
+    Splits a specimen into JSON metadata and named arrays.
+
+    DataFrames are stored column by column and arrays as they are, so floats keep their exact binary
+    value. Object columns, such as the split raw text, are stored as strings with a null mask.
+
+    Args:
+        copy (bool): Copy every array instead of keeping views of the specimen's data.
+    """
+    def __init__(self, copy=False):
+        self.arrays = {}
+        self.copy = copy
+
+    def encode_dict(self, obj_dict, prefix):
+        encoded = {}
+        for attr, value in obj_dict.items():
+            if attr in SKIPPED_ATTRIBUTES:
+                continue
+            key = f"{prefix}{attr}"
+            if isinstance(value, (SpecimenDataManager, SpecimenGraphManager)):
+                value.load_lazy_attributes()
+                transient = getattr(value, 'TRANSIENT_ATTRIBUTES', ())
+                encoded[attr] = self.encode_dict({name: item for name, item in value.__dict__.items() if name not in transient}, f"{key}.")
+            elif isinstance(value, dict):
+                encoded[attr] = self.encode_dict(value, f"{key}.")
+            elif isinstance(value, pd.DataFrame):
+                encoded[attr] = self.encode_frame(value, key)
+            elif isinstance(value, (pd.Series, np.ndarray)):
+                self.add_array(key, np.asarray(value))
+                encoded[attr] = {'__array__': key}
+            elif isinstance(value, Path):
+                encoded[attr] = str(value)
+            elif isinstance(value, np.generic):
+                encoded[attr] = value.item()
+            elif isinstance(value, tuple):
+                encoded[attr] = [item.item() if isinstance(item, np.generic) else item for item in value]
+            else:
+                encoded[attr] = value
+        return encoded
+
+    def encode_frame(self, frame, key):
+        columns = [str(column) for column in frame.columns]
+        for column, name in zip(frame.columns, columns):
+            self.add_array(f"{key}/{name}", frame[column].to_numpy())
+        self.add_array(f"{key}/{INDEX_NAME}", frame.index.to_numpy())
+        return {'__frame__': key, 'columns': columns}
+
+    def add_array(self, key, array):
+        if array.dtype == object:
+            null = pd.isna(array)
+            self.arrays[key + NULL_SUFFIX] = null
+            array = np.where(null, '', array).astype(str)
+        elif self.copy:
+            array = array.copy()
+        self.arrays[key] = array
+
+
+def decode(value, entry):
+    """Replace the array and frame references of the metadata by the stored data."""
+    if isinstance(value, dict):
+        if '__array__' in value:
+            return read_array(entry, value['__array__'])
+        if '__frame__' in value:
+            key = value['__frame__']
+            data = {column: read_array(entry, f"{key}/{column}") for column in value['columns']}
+            return pd.DataFrame(data, index=pd.Index(read_array(entry, f"{key}/{INDEX_NAME}")))
+        return {attr: decode(item, entry) for attr, item in value.items()}
+    return value
+
+
+def read_array(entry, key):
+    array = entry[key]
+    if key + NULL_SUFFIX in entry.files:
+        array = array.astype(object)
+        array[entry[key + NULL_SUFFIX]] = None
+    return array
+
+
+def specimen_file_name(specimen_name):
+    """The specimen name with only characters that are safe in file names, spaces as underscores, at most 50 characters."""
+    valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
+    filename = ''.join(c for c in specimen_name if c in valid_chars)
+    specimen_filename  = filename.replace(' ', '_')  # replace spaces with underscore
+    if len(filename) > 50:  # check if filename is too long
+        specimen_filename = filename[:50]
+    return specimen_filename
+
+
+def archive_path_for(specimen_name, output_directory):
+    """Path of the archive of a specimen in `output_directory`."""
+    return os.path.join(output_directory, f'{specimen_file_name(specimen_name)}_analyzer_data{ARCHIVE_SUFFIX}')
+
+
+def encode_specimen_archive(specimen, copy=False):
+    """
+    The named arrays of the archive of a specimen, its metadata included.
+
+    Encoding loads the lazy attributes of the specimen. With `copy`, the arrays share no memory with
+    the specimen, so they can be written off the thread that owns it, see `write_archive_arrays`.
+    """
+    # The raw tables are built lazily, make sure they are part of the archive
+    specimen.data_manager.build_raw_data_tables()
+    encoder = ArchiveEncoder(copy=copy)
+    properties = {attr: value for attr, value in specimen.__dict__.items() if attr not in Specimen.TRANSIENT_ATTRIBUTES}
+    metadata = {'version': ARCHIVE_VERSION, 'specimen': encoder.encode_dict(properties, '')}
+    encoder.arrays[METADATA_KEY] = np.array(json.dumps(metadata))
+    return encoder.arrays
+
+
+def write_specimen_archive(specimen, file_path, compress=False):
+    """
+    Save a specimen as one versioned .npz file: its float columns as native arrays plus JSON metadata.
+
+    Args:
+        specimen (Specimen): The specimen to save.
+        file_path (str or Path): Archive to write.
+        compress (bool): Deflate the arrays; smaller files, slower saves and loads.
+    """
+    return write_archive_arrays(encode_specimen_archive(specimen), file_path, compress=compress)
+
+
+def write_archive_arrays(arrays, file_path, compress=False):
+    """
+    Write the arrays of `encode_specimen_archive` as an archive.
+
+    The file is written under a temporary name and then renamed, so a failed save never leaves a
+    partial archive behind.
+    """
+    file_path = Path(file_path)
+    save = np.savez_compressed if compress else np.savez
+    with tempfile.NamedTemporaryFile(dir=file_path.parent, suffix='.tmp', delete=False) as temp_file:
+        try:
+            save(temp_file, **arrays)
+        except BaseException:
+            temp_file.close()
+            os.remove(temp_file.name)
+            raise
+    os.replace(temp_file.name, file_path)
+    return file_path
+
+
+def read_specimen_metadata(entry):
+    metadata = json.loads(str(entry[METADATA_KEY]))
+    if metadata.get('version', 0) > ARCHIVE_VERSION:
+        raise ValueError(f"Archive version {metadata['version']} is newer than this analyzer supports ({ARCHIVE_VERSION})")
+    return metadata
+
+
+def is_reference(value):
+    return isinstance(value, dict) and ('__array__' in value or '__frame__' in value)
+
+
+def is_legacy_reference(value):
+    return isinstance(value, str) and value.endswith(LEGACY_DATA_SUFFIX)
+
+
+def read_reference(file_path, reference):
+    """Read one array or frame from the archive; only its members are decompressed."""
+    with np.load(file_path, allow_pickle=False) as entry:
+        return decode(reference, entry)
+
+
+def read_legacy_member(file_path, member, as_frame):
+    """Read one CSV of a zip saved by earlier versions, straight from the zip member."""
+    with zipfile.ZipFile(file_path) as zip_file, zip_file.open(member) as csv_file:
+        return pd.read_csv(csv_file) if as_frame else np.loadtxt(csv_file, delimiter=',')
+
+
+def read_properties(file_path):
+    """The specimen metadata of a binary archive or of a legacy zip, without reading any data member."""
+    if Path(file_path).suffix.lower() == ARCHIVE_SUFFIX:
+        with np.load(file_path, allow_pickle=False) as entry:
+            return read_specimen_metadata(entry)['specimen']
+    with zipfile.ZipFile(file_path) as zip_file, zip_file.open(LEGACY_PROPERTIES_NAME) as json_file:
+        return json.load(json_file)
+
+
+def read_archive_summary(file_path):
+    """
+    Name, dimensions and scalar KPIs of a saved specimen, read from the metadata only.
+
+    Cheap enough to list and filter thousands of archives before loading any of them.
+
+    Returns:
+        dict: The scalar properties of the specimen and of its graph and data managers, the
+        specimen's own values taking precedence.
+    """
+    properties = read_properties(file_path)
+    summary = {}
+    for manager in MANAGER_ATTRIBUTES:
+        summary.update({attr: value for attr, value in properties.get(manager, {}).items()
+                        if not is_reference(value) and not is_legacy_reference(value)})
+    summary.update({attr: value for attr, value in properties.items() if attr not in MANAGER_ATTRIBUTES})
+    summary['file'] = str(file_path)
+    return summary
+
+
+def open_specimen_archive(file_path):
+    """
+    Lazily load a specimen: the scalars are read now, every array and frame on first access.
+
+    Works for binary archives and for the zips of earlier versions; neither is extracted to disk.
+    """
+    legacy = Path(file_path).suffix.lower() != ARCHIVE_SUFFIX
+    properties = read_properties(file_path)
+    lazy = {}
+    for manager in MANAGER_ATTRIBUTES:
+        references = {attr: value for attr, value in properties[manager].items()
+                      if (is_legacy_reference(value) if legacy else is_reference(value))}
+        properties[manager] = {attr: value for attr, value in properties[manager].items() if attr not in references}
+        lazy[manager] = references
+
+    specimen = Specimen.from_dict(properties)
+    for attr, value in lazy['data_manager'].items():
+        loader = partial(read_legacy_member, file_path, value, True) if legacy else partial(read_reference, file_path, value)
+        specimen.data_manager.set_lazy(attr, loader)
+    for attr, value in lazy['graph_manager'].items():
+        loader = partial(read_legacy_member, file_path, value, False) if legacy else partial(read_reference, file_path, value)
+        specimen.graph_manager.set_lazy(attr, loader)
+    return specimen
+
+
+def load_specimen_archive(file_path, lazy=False):
+    """Rebuild a Specimen from an archive written by `write_specimen_archive`."""
+    if lazy:
+        return open_specimen_archive(file_path)
+    with np.load(file_path, allow_pickle=False) as entry:
+        properties = decode(read_specimen_metadata(entry)['specimen'], entry)
+    return Specimen.from_dict(properties)
+
+
+def read_specimen_archive(file_path, lazy=False):
+    """
+    Rebuild a Specimen from a file written by `write_specimen_archive`, without touching the GUI.
+
+    Args:
+        file_path (str or Path): The binary archive, or a zip of CSVs saved by earlier versions.
+        lazy (bool): Read the arrays and tables on first access instead of now.
+
+    Returns:
+        Specimen: The loaded specimen.
+    """
+    if lazy:
+        return open_specimen_archive(file_path)
+    if Path(file_path).suffix.lower() == ARCHIVE_SUFFIX:
+        return load_specimen_archive(file_path)
+
+    # Create a temporary directory
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Unzip the file
+        with zipfile.ZipFile(file_path, 'r') as zipf:
+            zipf.extractall(temp_dir)
+
+        # Load properties from the JSON file
+        with open(os.path.join(temp_dir, LEGACY_PROPERTIES_NAME), 'r') as fp:
+            properties_dict = json.load(fp)
+
+        # Reconstruct the Specimen object
+        return Specimen.from_dict(properties_dict, temp_dir=temp_dir)
+
+
+def iter_specimen_archives(file_paths, lazy=False):
+    """Yield the specimens of saved archives one at a time, so only one is in memory."""
+    for file_path in file_paths:
+        try:
+            yield read_specimen_archive(file_path, lazy=lazy)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Skipping {Path(file_path).name}: {e}")
+
+
+def archive_summaries(file_paths):
+    """Table of the name, dimensions and scalar KPIs of saved specimens, read without loading their data."""
+    summaries = []
+    for file_path in file_paths:
+        try:
+            summaries.append(read_archive_summary(file_path))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Skipping {Path(file_path).name}: {e}")
+    return pd.DataFrame(summaries)
@@ -0,0 +1,82 @@
+import numpy as np
+
+LTTB = 'lttb'
+MINMAX = 'minmax'
+MIN_BUDGET = 3
+
+
+def finite_points(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return np.flatnonzero(np.isfinite(x) & np.isfinite(y)), x, y
+
+
+def lttb_indices(x, y, budget):
+    """
+    Indices of at most `budget` points of a curve chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept. The points in between are split into `budget - 2` buckets,
+    and from each the point forming the largest triangle with the point kept from the previous
+    bucket and the mean of the next bucket is kept. Peaks, plateaus and unloading branches survive,
+    which plain striding would skip. Points with NaN coordinates are left out.
+    """
+    valid, x, y = finite_points(x, y)
+    count = len(valid)
+    if count <= budget:
+        return valid
+    x, y = x[valid], y[valid]
+    edges = np.linspace(1, count - 1, budget - 1).astype(np.intp)
+    selected = np.empty(budget, dtype=np.intp)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(budget - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (count - 1, count)
+        mean_x, mean_y = x[next_start:next_stop].mean(), y[next_start:next_stop].mean()
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[previous] - mean_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (mean_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return valid[selected]
+
+
+def minmax_indices(x, y, budget):
+    """
+    Indices of at most `budget` points of a curve: the lowest and highest y of equal-count buckets.
+
+    Keeps every extreme of y exactly, at the cost of a less even spread of points than LTTB.
+    The first and last points are kept. Points with NaN coordinates are left out.
+    """
+    valid, x, y = finite_points(x, y)
+    count = len(valid)
+    if count <= budget:
+        return valid
+    y = y[valid]
+    edges = np.linspace(0, count, (budget - 2) // 2 + 1).astype(np.intp)
+    picks = [0, count - 1]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop > start:
+            picks.extend((start + int(np.argmin(y[start:stop])), start + int(np.argmax(y[start:stop]))))
+    return valid[np.unique(picks)]
+
+
+DECIMATORS = {LTTB: lttb_indices, MINMAX: minmax_indices}
+
+
+def decimate(x, y, budget, method=LTTB):
+    """
+    Indices, in order, of a shape-preserving subset of at most `budget` points of the curve (x, y).
+
+    Args:
+        x, y (array-like): The curve.
+        budget (int): Largest number of points kept, at least 3; None keeps every finite point.
+        method (str): 'lttb' or 'minmax'.
+    """
+    if method not in DECIMATORS:
+        raise ValueError(f"Unknown decimation method {method!r}, use one of {sorted(DECIMATORS)}")
+    if budget is None:
+        return finite_points(x, y)[0]
+    if budget < MIN_BUDGET:
+        raise ValueError(f"The point budget must be at least {MIN_BUDGET}, got {budget}")
+    return DECIMATORS[method](x, y, int(budget))
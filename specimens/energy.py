@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class EnergyCurve:
+    """
+    Energy absorbed up to any compression, from one cumulative trapezoid integral of the curve.
+
+    The running integral of stress over strain is computed once, so the energy at a strain level
+    is a binary search and one interpolation instead of an integral over the prefix of the curve.
+    Levels are looked up on the running maximum of the strain, so the energy at a level is the
+    energy absorbed when the specimen first reached that compression, even if the strain doubles
+    back on unloading or noise. Energies are in stress x strain units, i.e. MJ/m^3 for MPa and
+    strain as a fraction.
+
+    Attributes:
+        strain (np.ndarray): Strain of the curve.
+        cumulative_energy (np.ndarray): Energy absorbed up to each point.
+    """
+    def __init__(self, stress, strain):
+        stress = np.asarray(stress, dtype=np.float64)
+        self.strain = np.asarray(strain, dtype=np.float64)
+        if stress.shape != self.strain.shape or stress.ndim != 1:
+            raise ValueError("stress and strain must be one-dimensional and of equal length")
+
+        self.cumulative_energy = np.zeros(len(stress))
+        if len(stress) > 1:
+            np.cumsum(0.5 * (stress[1:] + stress[:-1]) * np.diff(self.strain), out=self.cumulative_energy[1:])
+        self.max_strain = np.maximum.accumulate(self.strain) if len(stress) else self.strain
+
+    @property
+    def total_energy(self):
+        return self.cumulative_energy[-1] if len(self.cumulative_energy) else 0.0
+
+    def energy_at(self, levels):
+        """
+        Energy absorbed up to the given strain levels.
+
+        Args:
+            levels (float or array-like): Strain levels, as fractions like the strain.
+
+        Returns:
+            float or np.ndarray: Energy at each level. Levels below the start of the curve give 0 and
+            levels beyond its maximum strain give the total energy.
+        """
+        levels = np.asarray(levels, dtype=np.float64)
+        if len(self.strain) < 2:
+            return np.zeros_like(levels)[()]
+
+        # First point at or beyond each level, and the one before it
+        upper = np.clip(np.searchsorted(self.max_strain, levels, side='left'), 1, len(self.strain) - 1)
+        lower = upper - 1
+        span = self.max_strain[upper] - self.max_strain[lower]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.clip(np.where(span > 0, (levels - self.max_strain[lower]) / span, 1.0), 0.0, 1.0)
+        energy = self.cumulative_energy[lower] + fraction * (self.cumulative_energy[upper] - self.cumulative_energy[lower])
+
+        energy = np.where(levels <= self.max_strain[0], 0.0, energy)
+        energy = np.where(levels >= self.max_strain[-1], self.total_energy, energy)
+        return energy[()]
+
+    def specific_energy_at(self, levels, density):
+        """
+        Energy per mass absorbed up to the given strain levels.
+
+        Args:
+            levels (float or array-like): Strain levels.
+            density (float): Density in g/cc.
+
+        Returns:
+            float or np.ndarray: Specific energy in kJ/kg, for stress in MPa.
+        """
+        # MJ/m^3 * 1000 = kJ/m^3, and g/cc * 1000 = kg/m^3
+        return self.energy_at(levels) / density
+
+
+def energy_levels(max_strain, step=0.01):
+    """Strain levels every `step` from `step` up to `max_strain`, for energy-absorption charts."""
+    count = int(np.floor(max_strain / step + 1e-9))
+    return step * np.arange(1, count + 1)
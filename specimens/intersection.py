@@ -0,0 +1,80 @@
+import numpy as np
+
+
+def find_curve_crossings(x1, y1, x2, y2):
+    """
+    Find every point where curve 1 crosses curve 2, in one vectorized pass.
+
+    Curve 2 is evaluated on the x-grid of curve 1, the sign changes of the difference mark the
+    segments of curve 1 that cross it, and each crossing is located by linear interpolation on that
+    segment. The result is exact when curve 2 is straight between neighbouring x values of curve 1,
+    which holds for the offset and modulus lines this is used with. Curve 1 may double back in x.
+
+    Args:
+        x1, y1 (array-like): Polyline that is scanned, e.g. the stress-strain curve.
+        x2, y2 (array-like): Polyline to intersect with, e.g. an offset line.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: x and y of the crossings, ordered along curve 1.
+    """
+    x1 = np.asarray(x1, dtype=np.float64)
+    y1 = np.asarray(y1, dtype=np.float64)
+    x2 = np.asarray(x2, dtype=np.float64)
+    y2 = np.asarray(y2, dtype=np.float64)
+    if len(x1) < 2 or len(x2) < 2:
+        return np.empty(0), np.empty(0)
+
+    if np.any(np.diff(x2) < 0):
+        order = np.argsort(x2, kind='stable')
+        x2, y2 = x2[order], y2[order]
+
+    difference = y1 - extend_linearly(x1, x2, y2)
+    start, end = difference[:-1], difference[1:]
+
+    # A segment crosses when the difference changes sign, or starts exactly on curve 2
+    segments = np.flatnonzero((start == 0) | (start * end < 0))
+    fraction = start[segments] / (start[segments] - end[segments])
+    x_cross = x1[segments] + fraction * (x1[segments + 1] - x1[segments])
+    y_cross = y1[segments] + fraction * (y1[segments + 1] - y1[segments])
+
+    if difference[-1] == 0:
+        x_cross = np.append(x_cross, x1[-1])
+        y_cross = np.append(y_cross, y1[-1])
+
+    # Curve 2 was extended past its ends only so that segments straddling them are located exactly
+    inside = (x_cross >= x2[0]) & (x_cross <= x2[-1])
+    return x_cross[inside], y_cross[inside]
+
+
+def extend_linearly(x, xp, fp):
+    """`np.interp`, continuing the first and last segments of (xp, fp) instead of holding the end values."""
+    values = np.interp(x, xp, fp)
+    if xp[1] != xp[0]:
+        before = x < xp[0]
+        values[before] = fp[0] + (x[before] - xp[0]) * (fp[1] - fp[0]) / (xp[1] - xp[0])
+    if xp[-1] != xp[-2]:
+        after = x > xp[-1]
+        values[after] = fp[-1] + (x[after] - xp[-1]) * (fp[-1] - fp[-2]) / (xp[-1] - xp[-2])
+    return values
+
+
+def find_first_crossing(plot1, plot2, min_dist_from_origin=0.001, max_attempts=3, shift_step=0.001):
+    """
+    First crossing of two (x, y) curves that is not at the origin.
+
+    When there is no usable crossing, curve 2 is shifted up by `shift_step` and the search is
+    repeated, up to `max_attempts` times.
+
+    Returns:
+        tuple: (x, y) of the crossing, or (None, None).
+    """
+    x1, y1 = plot1
+    x2, y2 = plot2
+    y2 = np.asarray(y2, dtype=np.float64)
+
+    for attempt in range(max_attempts):
+        x_cross, y_cross = find_curve_crossings(x1, y1, x2, y2 + attempt * shift_step)
+        valid = np.flatnonzero(np.hypot(x_cross, y_cross) >= min_dist_from_origin)
+        if len(valid):
+            return float(x_cross[valid[0]]), float(y_cross[valid[0]])
+    return None, None
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class SortedIndex:
+    """
+    Nearest-value queries on one array by bisection.
+
+    The values are sorted once, O(n log n), after which every query is O(log n). Monotonic arrays,
+    such as the x values of a curve or the force of one hysteresis branch, are used as they are.
+    Ties go to the lowest index, like `idxmin` on the absolute difference.
+    """
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if np.all(values[1:] >= values[:-1]):
+            self._order = None
+            self._sorted = values
+        else:
+            # NaNs sort last and are left out
+            self._order = np.argsort(values, kind='stable')[:np.count_nonzero(~np.isnan(values))]
+            self._sorted = values[self._order]
+
+    def _position(self, value):
+        """Position in the sorted values of the closest value, the first of equal values."""
+        sorted_values = self._sorted
+        right = int(np.searchsorted(sorted_values, value, side='left'))
+        if right == len(sorted_values):
+            return int(np.searchsorted(sorted_values, sorted_values[-1], side='left'))
+        if right == 0:
+            return 0
+        left = int(np.searchsorted(sorted_values, sorted_values[right - 1], side='left'))
+        if value - sorted_values[left] < sorted_values[right] - value:
+            return left
+        if value - sorted_values[left] > sorted_values[right] - value:
+            return right
+        return left if self._index(left) < self._index(right) else right
+
+    def _index(self, position):
+        return position if self._order is None else int(self._order[position])
+
+    def nearest(self, value):
+        """Index of the value closest to `value`."""
+        return self._index(self._position(value))
+
+
+def nearest_point(x, y, point_x, point_y, start_index=0):
+    """
+    Closest point of the curve (x, y) to (point_x, point_y), among the points from `start_index` on.
+
+    A single vectorised scan; the key point lookups search a curve a couple of times at most, which is
+    cheaper than building any index over it. Ties go to the lowest index.
+
+    Returns:
+        tuple[int, float]: Index and Euclidean distance, or (-1, nan) when no point is left to search.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    start_index = max(int(start_index), 0)
+    if start_index >= len(x):
+        return -1, np.nan
+    distances = np.hypot(x[start_index:] - point_x, y[start_index:] - point_y)
+    if np.all(np.isnan(distances)):
+        return -1, np.nan
+    closest = int(np.nanargmin(distances))
+    return start_index + closest, float(distances[closest])
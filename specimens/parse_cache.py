@@ -0,0 +1,122 @@
+import hashlib
+import mmap
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = Path.home() / '.cymat_stress_strain' / 'parse_cache'
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024**3
+CACHE_SUFFIX = '.npz'
+INDEX_KEY = '__index__'
+COLUMNS_KEY = '__columns__'
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed .dat files.
+
+    Entries are keyed by the SHA-256 of the file content plus the parser version and hold the parsed
+    columns as uncompressed .npz arrays. Reads refresh the entry's modification time, and writes evict
+    the least recently used entries until the directory fits in `max_bytes`.
+
+    Attributes:
+        cache_dir (Path): Directory holding the cache entries.
+        max_bytes (int): Size bound of the cache directory.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key_for_text(text, parser_version):
+        digest = hashlib.sha256(text.encode('utf-8', errors='surrogateescape')).hexdigest()
+        return f"{digest}-v{parser_version}"
+
+    @staticmethod
+    def key_for_file(file_path, parser_version):
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                digest = hashlib.sha256(b'').hexdigest()  # an empty file cannot be memory-mapped
+            else:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    digest = hashlib.sha256(mapped).hexdigest()
+        return f"{digest}-v{parser_version}"
+
+    def path_for(self, key):
+        return self.cache_dir / f"{key}{CACHE_SUFFIX}"
+
+    def get(self, key):
+        """Return the cached frame for `key`, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                columns = [str(column) for column in entry[COLUMNS_KEY]]
+                frame = pd.DataFrame({column: entry[column] for column in columns},
+                                     index=pd.Index(entry[INDEX_KEY]))
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: ignoring unreadable parse cache entry {path.name}: {e}")
+            return None
+        return frame
+
+    def put(self, key, frame):
+        """Store `frame` under `key` and evict old entries. Failures only print a warning."""
+        arrays = {str(column): frame[column].to_numpy() for column in frame.columns}
+        arrays[COLUMNS_KEY] = np.array([str(column) for column in frame.columns])
+        arrays[INDEX_KEY] = frame.index.to_numpy()
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Write under a temporary name so other sessions never read a partial entry
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as temp_file:
+                np.savez(temp_file, **arrays)
+            os.replace(temp_file.name, self.path_for(key))
+        except OSError as e:
+            print(f"Warning: could not write parse cache entry: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in `max_bytes`."""
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(CACHE_SUFFIX)]
+            stats = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries]
+        except OSError:
+            return
+        total = sum(size for _, size, _ in stats)
+        for _, size, path in sorted(stats):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass  # removed by another session
+
+    def clear(self):
+        for path in self.cache_dir.glob(f"*{CACHE_SUFFIX}"):
+            path.unlink(missing_ok=True)
+
+
+_default_cache = None
+_cache_enabled = True
+
+
+def set_parse_cache_enabled(enabled):
+    """Switch the shared cache on or off for this process, e.g. from `AppVariables.use_parse_cache`."""
+    global _cache_enabled
+    _cache_enabled = bool(enabled)
+
+
+def default_parse_cache():
+    """Shared cache used by SpecimenDataManager, or None when it is switched off."""
+    global _default_cache
+    if not _cache_enabled:
+        return None
+    if _default_cache is None:
+        _default_cache = ParseCache()
+    return _default_cache
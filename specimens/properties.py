@@ -0,0 +1,36 @@
+# The scalar properties of a specimen, as shown in the summary tables and stored in the specimen catalog
+DIN_PROPERTIES = [
+        'Rplt', 'Rplt_E', 'ReH', 'Ev', 'Eff', 'ReH_Rplt_ratio', 'Aplt_E', 'AeH', 'Rp1', 'm'
+    ]
+GENERAL_PROPERTIES = ['name', 'length', 'width', 'thickness', 'weight', 'density', 'youngs_modulus', 'E20_kJ_m3', 'E50_kJ_m3', 'E80_kJ_m3', 'E20_kJ_kg', 'E50_kJ_kg','E80_kJ_kg']
+DATA_MANAGER_PROPERTIES = ['toughness','ductility','resilience']
+HYSTERESIS_DATA_MANAGER_PROPERTIES = ['modulus','compressive_proof_strength']
+
+
+def collect_specimen_properties(specimen, din_mode=False):
+    """Extracts the general, DIN, data manager and hysteresis properties of a processed specimen."""
+    specimen.calculate_general_KPI()
+    properties = {}
+
+    # Get general properties
+    for prop in GENERAL_PROPERTIES:
+        properties[prop] = getattr(specimen, prop)
+
+    # Get DIN analysis properties
+    if din_mode:
+        for prop in DIN_PROPERTIES:
+            try:
+                properties[prop] = getattr(specimen.din_analyzer, prop)
+            except AttributeError:
+                print(f'Error: din_analyzer not initialized for specimen: {specimen}')
+
+    # Get data manager properties
+    for prop in DATA_MANAGER_PROPERTIES:
+        properties[prop] = getattr(specimen.data_manager, prop)
+
+    # Get hysteresis data manager properties, the proof strength only exists once it has been calculated
+    if specimen.processed_hysteresis_data is not None and not specimen.processed_hysteresis_data.empty:
+        for prop in HYSTERESIS_DATA_MANAGER_PROPERTIES:
+            properties[prop] = getattr(specimen.data_manager, prop, None)
+
+    return properties
@@ -0,0 +1,222 @@
+import numpy as np
+
+# Windows this short are summed directly, where the prefix-sum differences would lose digits
+DIRECT_FIT_POINTS = 256
+
+# Automatic elastic window search
+ELASTIC_WINDOW_COUNT = 8  # window lengths tried, spaced geometrically
+MIN_ELASTIC_POINTS = 20
+MAX_ELASTIC_FRACTION = 0.25  # longest window, as a fraction of the loading curve
+MIN_ELASTIC_R_SQUARED = 0.99
+R_SQUARED_MARGIN = 0.01
+SLOPE_TOLERANCE = 0.05  # longer windows are preferred while their slope stays this close to the steepest
+
+
+class PrefixSumRegression:
+    """
+    Least-squares straight-line fits over any [start, end) window of one curve in constant time.
+
+    Cumulative sums of x, y, x², xy and y² are computed once per curve, so the sums of a window are
+    the difference of two entries and the slope, intercept and R² follow in closed form. The values
+    are centred on their means before summing, which keeps the differences accurate on long curves.
+    Points that are not finite are left out of every window.
+
+    Attributes:
+        x, y (np.ndarray): The curve the sums were built from.
+    """
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        if self.x.shape != self.y.shape or self.x.ndim != 1:
+            raise ValueError("x and y must be one-dimensional and of equal length")
+
+        valid = np.isfinite(self.x) & np.isfinite(self.y)
+        self.x_mean = self.x[valid].mean() if valid.any() else 0.0
+        self.y_mean = self.y[valid].mean() if valid.any() else 0.0
+        dx = np.where(valid, self.x - self.x_mean, 0.0)
+        dy = np.where(valid, self.y - self.y_mean, 0.0)
+
+        self._count = prefix_sum(valid.astype(np.float64))
+        self._sx = prefix_sum(dx)
+        self._sy = prefix_sum(dy)
+        self._sxx = prefix_sum(dx * dx)
+        self._sxy = prefix_sum(dx * dy)
+        self._syy = prefix_sum(dy * dy)
+
+    def __len__(self):
+        return len(self.x)
+
+    def uses(self, x, y):
+        """Whether the sums were built from these very arrays, so they can be reused."""
+        return shares_buffer(self.x, np.asarray(x)) and shares_buffer(self.y, np.asarray(y))
+
+    def fit(self, start, end):
+        """
+        Fit y = slope * x + intercept on the points start <= i < end.
+
+        Args:
+            start, end (int): Window bounds, like a slice. Negative values and None are not supported.
+
+        Returns:
+            tuple: (slope, intercept, r_squared)
+
+        Raises:
+            ValueError: If the window has fewer than two points or no spread in x.
+        """
+        start, end = max(int(start), 0), min(int(end), len(self))
+        if end - start <= DIRECT_FIT_POINTS:
+            window = PrefixSumRegression(self.x[start:end], self.y[start:end])
+            slope, intercept, r_squared = window.fit_windows(np.array([0]), np.array([len(window)]))
+        else:
+            slope, intercept, r_squared = self.fit_windows(np.array([start]), np.array([end]))
+        if not np.isfinite(slope[0]):
+            raise ValueError(f"Cannot fit a line to the points {start}:{end}")
+        return float(slope[0]), float(intercept[0]), float(r_squared[0])
+
+    def find_elastic_window(self, search_end=None, window_count=ELASTIC_WINDOW_COUNT,
+                            min_points=MIN_ELASTIC_POINTS, min_r_squared=MIN_ELASTIC_R_SQUARED):
+        """
+        Find the straight-line window that best represents the elastic loading of the curve.
+
+        Every window of every candidate length in [0, search_end) is fitted in one vectorized pass
+        per length, with the lengths spaced geometrically from `min_points` to MAX_ELASTIC_FRACTION of
+        the searched region. For each length the steepest window with R² >= `min_r_squared` is kept (or, when no
+        window gets there, within R_SQUARED_MARGIN of the best R² of any window), and the longest of
+        those whose slope is within SLOPE_TOLERANCE of the steepest one wins. The confidence
+        is the R² of that window, scaled down by the relative spread between its slope and the slopes of
+        its two halves, so a clean linear region scores close to 1 and a noisy or curved one less.
+
+        Args:
+            search_end (int): End of the loading curve to search. Defaults to `loading_region_end`.
+            window_count (int): Number of candidate window lengths.
+            min_points (int): Shortest window considered.
+            min_r_squared (float): R² a window needs to be accepted.
+
+        Returns:
+            ElasticWindow or None: The best window, or None if the curve is too short to fit.
+        """
+        if search_end is None:
+            search_end = loading_region_end(self.y, min_points)
+        search_end = min(int(search_end), len(self))
+        longest = max(int(MAX_ELASTIC_FRACTION * search_end), min(min_points, search_end))
+        sizes = np.unique(np.geomspace(min(min_points, longest), longest, window_count).round().astype(int))
+        sizes = sizes[sizes >= 2]
+        if len(sizes) == 0:
+            return None
+
+        fits = []
+        for size in sizes:
+            starts = np.arange(0, search_end - size + 1)
+            slope, intercept, r_squared = self.fit_windows(starts, starts + size)
+            rising = slope > 0
+            fits.append((size, starts, slope, intercept, np.where(rising, r_squared, np.nan)))
+        best_r_squared = max((np.nanmax(fit[4]) for fit in fits if np.isfinite(fit[4]).any()), default=np.nan)
+        if not np.isfinite(best_r_squared):
+            return None
+        # On noisy curves no window may reach min_r_squared, so compare against the best one instead
+        threshold = min(min_r_squared, best_r_squared - R_SQUARED_MARGIN)
+
+        best = []  # (size, start, slope, intercept, r_squared) of the steepest acceptable window per size
+        for size, starts, slope, intercept, r_squared in fits:
+            acceptable = np.flatnonzero(r_squared >= threshold)
+            if len(acceptable):
+                index = acceptable[np.argmax(slope[acceptable])]
+                best.append((size, starts[index], slope[index], intercept[index], r_squared[index]))
+
+        if not best:
+            return None
+        steepest = max(candidate[2] for candidate in best)
+        size, start, slope, intercept, r_squared = max(
+            (candidate for candidate in best if candidate[2] >= (1 - SLOPE_TOLERANCE) * steepest),
+            key=lambda candidate: candidate[0])
+
+        middle = start + size // 2
+        halves, _, _ = self.fit_windows(np.array([start, middle]), np.array([middle, start + size]))
+        slopes = np.append(halves, slope)
+        spread = slopes.std() / slope if np.isfinite(slopes).all() else 1.0
+        confidence = r_squared * min(max(1.0 - spread, 0.0), 1.0)
+        return ElasticWindow(start, start + size, slope, intercept, r_squared, confidence)
+
+    def fit_windows(self, starts, ends):
+        """
+        Vectorized `fit` over many windows at once.
+
+        Args:
+            starts, ends (np.ndarray): Window bounds of equal length, already clipped to the curve.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: slope, intercept and R² per window. Windows that
+            cannot be fitted hold NaN.
+        """
+        n = self._count[ends] - self._count[starts]
+        sx = self._sx[ends] - self._sx[starts]
+        sy = self._sy[ends] - self._sy[starts]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sxx = self._sxx[ends] - self._sxx[starts] - sx * sx / n
+            sxy = self._sxy[ends] - self._sxy[starts] - sx * sy / n
+            syy = self._syy[ends] - self._syy[starts] - sy * sy / n
+
+            fittable = (n >= 2) & (sxx > 0)
+            slope = np.where(fittable, sxy / sxx, np.nan)
+            # Back from the centred coordinates to the original ones
+            intercept = self.y_mean + sy / n - slope * (self.x_mean + sx / n)
+            r_squared = np.where(syy > 0, sxy * sxy / (sxx * syy), 1.0)
+        r_squared = np.where(fittable, np.clip(r_squared, 0.0, 1.0), np.nan)
+        return slope, np.where(fittable, intercept, np.nan), r_squared
+
+
+class ElasticWindow:
+    """
+    Result of `PrefixSumRegression.find_elastic_window`.
+
+    Attributes:
+        start, end (int): Window bounds, like a slice.
+        slope, intercept, r_squared (float): Straight-line fit of the window.
+        confidence (float): Between 0 and 1, see `find_elastic_window`.
+    """
+    def __init__(self, start, end, slope, intercept, r_squared, confidence):
+        self.start = int(start)
+        self.end = int(end)
+        self.slope = float(slope)
+        self.intercept = float(intercept)
+        self.r_squared = float(r_squared)
+        self.confidence = float(confidence)
+
+    def __repr__(self):
+        return (f"ElasticWindow({self.start}:{self.end}, slope={self.slope:.4g}, "
+                f"r_squared={self.r_squared:.5f}, confidence={self.confidence:.3f})")
+
+
+def loading_region_end(y, min_points=MIN_ELASTIC_POINTS):
+    """
+    End of the initial loading of a stress curve: the first point at or above its median stress.
+
+    On a foam curve the plateau takes up most of the test, so the median lies on the plateau and
+    everything before it is the toe and the elastic rise. Densification never comes before it.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    finite = y[np.isfinite(y)]
+    if len(finite) == 0:
+        return len(y)
+    above = np.flatnonzero(y >= np.median(finite))
+    end = above[0] + 1 if len(above) else len(y)
+    return min(max(end, 4 * min_points), len(y))
+
+
+def prefix_sum(values):
+    """Cumulative sum with a leading zero, so the sum of values[a:b] is result[b] - result[a]."""
+    sums = np.empty(len(values) + 1, dtype=np.float64)
+    sums[0] = 0.0
+    np.cumsum(values, out=sums[1:])
+    return sums
+
+
+def shares_buffer(array, other):
+    """Whether two arrays are views of the same memory with the same layout."""
+    return (array.shape == other.shape and array.strides == other.strides and array.dtype == other.dtype
+            and array.__array_interface__['data'][0] == other.__array_interface__['data'][0])
+
+
+def fit_line(x, y):
+    """Least-squares slope, intercept and R² of the whole curve."""
+    return PrefixSumRegression(x, y).fit(0, len(x))
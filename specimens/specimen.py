@@ -1,17 +1,27 @@
 import os
 from datetime import datetime
-from scipy.optimize import curve_fit
-from scipy.integrate import trapz
+from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from shapely.geometry import LineString, MultiPoint, Point
 
+from specimens.dat_parser import DatFileParser
+from specimens.energy import EnergyCurve, energy_levels
+from specimens.intersection import find_first_crossing
+from specimens.parse_cache import default_parse_cache
+from specimens.regression import PrefixSumRegression
 from standards.specimen_DIN import SpecimenDINAnalysis
 
+# np.trapz was renamed to np.trapezoid in numpy 2.0 and later removed
+trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
 class Specimen:
+    # Derived series that are rebuilt on demand and never saved
+    TRANSIENT_ATTRIBUTES = ('_shift_cache', 'din_analyzer')
+
     def __init__(self, name, data, length, width, thickness, weight):
+        self._shift_cache = {}
         self.name = name
         self.length = float(length)
         self.width = float(width)
@@ -47,26 +57,48 @@ class Specimen:
         self.data_manager.add_stress_and_strain()
         if  self.processed_hysteresis_data is not None:
             self.calculate_shift_from_hysteresis()
+        # The energy KPIs need the shifted strain, which comes out of the alignment
+        self.find_IYS_align()
         self.calculate_general_KPI()
 
     def calculate_general_KPI(self):
         self.calculate_energy()
     
     def calculate_energy(self):
-        def calculate_Ev(stress, strain, compression):
-            idx = (np.abs(strain - compression)).argmin()
-            return trapz(stress[:idx], strain[:idx])
-        
-        
-        self.E20_kJ_m3 = calculate_Ev(self.stress, self.shifted_strain, 0.2)*1000 # kJ/kg
-        self.E50_kJ_m3 = calculate_Ev(self.stress, self.shifted_strain,0.5)*1000 # kJ/kg
-        self.E80_kJ_m3 = calculate_Ev(self.stress, self.shifted_strain, 0.8)*1000 # kJ/kg
+        self.E20_kJ_m3, self.E50_kJ_m3, self.E80_kJ_m3 = self.energy_absorbed([0.2, 0.5, 0.8])
 
         density_kg_meters = self.density * 1000  # kg/m^3
         self.E20_kJ_kg = self.E20_kJ_m3 / density_kg_meters
         self.E50_kJ_kg = self.E50_kJ_m3 / density_kg_meters
         self.E80_kJ_kg = self.E80_kJ_m3 / density_kg_meters
-         
+
+    def energy_absorbed(self, compression):
+        """Energy absorbed up to one or more strain levels, in kJ/m^3."""
+        return self.energy_curve.energy_at(compression) * 1000
+
+    def specific_energy_absorbed(self, compression):
+        """Energy absorbed per mass up to one or more strain levels, in kJ/kg."""
+        return self.energy_curve.specific_energy_at(compression, self.density)
+
+    def energy_absorption(self, levels=None, step=0.01):
+        """
+        Energy absorption table for charts.
+
+        Args:
+            levels (array-like): Strain levels. Defaults to every `step` up to the maximum strain.
+            step (float): Spacing of the default levels.
+
+        Returns:
+            pd.DataFrame: Columns 'Strain', 'Energy (kJ/m^3)' and 'Energy (kJ/kg)'.
+        """
+        if levels is None:
+            levels = energy_levels(self.shifted_strain.max(), step)
+        levels = np.asarray(levels, dtype=np.float64)
+        return pd.DataFrame({
+            'Strain': levels,
+            'Energy (kJ/m^3)': self.energy_absorbed(levels),
+            'Energy (kJ/kg)': self.specific_energy_absorbed(levels),
+        })
 
     def find_IYS_align(self):
         self.graph_manager.Calculate_Strength_Alignment()
@@ -99,16 +131,46 @@ class Specimen:
     def displacement(self):
         return self.data_manager.formatted_data['Displacement'] * -1
 
+    @property
+    def manual_strain_shift(self):
+        return self._manual_strain_shift
+
+    @manual_strain_shift.setter
+    def manual_strain_shift(self, shift):
+        self._manual_strain_shift = shift
+        # The first significant increase does not depend on the manual shift
+        self.invalidate_shift_cache(keep_index=True)
+
+    def invalidate_shift_cache(self, keep_index=False):
+        """Drop the memoized shifted series. Call whenever the strain shift or the selected indices change."""
+        index = self._shift_cache.get('first_significant_increase_index')
+        self._shift_cache = {}
+        if keep_index and index is not None:
+            self._shift_cache['first_significant_increase_index'] = index
+
+    def _cached(self, key, calculate):
+        if key not in self._shift_cache:
+            self._shift_cache[key] = calculate()
+        return self._shift_cache[key]
+
+    @property
+    def first_significant_increase_index(self):
+        return self._cached('first_significant_increase_index', lambda: self.graph_manager.find_first_significant_increase(self.force, self.displacement))
+
     @property
     def shifted_strain(self):
-        return self.graph_manager.strain_shifted + self.manual_strain_shift
+        return self._cached('shifted_strain', lambda: self.graph_manager.strain_shifted + self.manual_strain_shift)
+
+    @property
+    def energy_curve(self):
+        return self._cached('energy_curve', lambda: EnergyCurve(self.stress, self.shifted_strain))
 
     @property
     def shifted_displacement(self):
-        force = self.force
-        displacement = self.displacement
-        first_increase_index = self.graph_manager.find_first_significant_increase(force, displacement)
-        return displacement - displacement[first_increase_index] +(self.manual_strain_shift * self.original_length)
+        def calculate_shifted_displacement():
+            displacement = self.displacement
+            return displacement - displacement[self.first_significant_increase_index] +(self.manual_strain_shift * self.original_length)
+        return self._cached('shifted_displacement', calculate_shifted_displacement)
 
     @property
     def IYS(self):
@@ -124,7 +186,7 @@ class Specimen:
 
     @property
     def data(self):
-        return self.data_manager.split_raw_data_df
+        return self.data_manager.build_raw_data_tables()
 
     @property
     def processed_data(self):
@@ -148,7 +210,7 @@ class Specimen:
         # Initialize specimen with base properties
         specimen = cls(data['name'], None, data['length'],
                        data['width'], data['thickness'], data['weight'])
-        specimen.manual_strain_shift = data.get('manual_strain_shift', 0)
+        specimen.manual_strain_shift = data.get('_manual_strain_shift', data.get('manual_strain_shift', 0))
 
         # Initialize Data and Graph managers
         specimen.data_manager = SpecimenDataManager.from_dict(
@@ -158,14 +220,53 @@ class Specimen:
 
         return specimen
 
-class SpecimenGraphManager:
+class LazyAttributes:
+    """
+    Attributes fetched by a loader on first access, e.g. the arrays of a saved archive.
+
+    A lazy attribute is missing from the instance dict until it is loaded, so `__getattr__` only runs
+    for it and normal attribute access costs nothing extra.
+    """
+    def set_lazy(self, attr, loader):
+        self.__dict__.pop(attr, None)
+        self.__dict__.setdefault('_lazy_loaders', {})[attr] = loader
+
+    def load_lazy_attributes(self):
+        """Load every attribute that has not been accessed yet, e.g. before saving."""
+        for attr in list(self.__dict__.get('_lazy_loaders', {})):
+            getattr(self, attr)
+
+    def __getattr__(self, attr):
+        loaders = self.__dict__.get('_lazy_loaders')
+        if loaders and attr in loaders:
+            value = loaders[attr]()
+            setattr(self, attr, value)
+            del loaders[attr]
+            return value
+        for klass in type(self).__mro__:
+            descriptor = klass.__dict__.get(attr)
+            if hasattr(descriptor, '__get__'):
+                # A property raised AttributeError, which sent Python here; run it again so the
+                # original error surfaces instead of a misleading "no attribute"
+                return descriptor.__get__(self, type(self))
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {attr!r}")
+
+
+class SpecimenGraphManager(LazyAttributes):
+    # Rebuilt on demand and never saved
+    TRANSIENT_ATTRIBUTES = ('_regression', '_lazy_loaders')
+
     def __init__(self, specimen):
+        self._regression = None
         self.specimen = specimen
         self.first_increase_index = None
         self.next_decrease_index = None
         self.IYS = None
         self.YS = None
         self.youngs_modulus = None
+        self.youngs_modulus_r_squared = None
+        self.auto_elastic_window = False  # pick the elastic region by regression instead of the threshold search
+        self.elastic_window_confidence = None
         self.strain_offset = None
         self.offset_line = None
         self.compressive_proof_strength = None, None
@@ -303,80 +404,41 @@ class SpecimenGraphManager:
     #find intercept for YS
     @staticmethod
     def find_interaction_point( plot1, plot2, min_dist_from_origin=0.001, max_attempts=3):
-        # Get the x and y data from each tuple
-        x1, y1 = plot1
-        x2, y2 = plot2
-
-        # Create LineString objects
-        line1 = LineString(zip(x1, y1))
-        line2 = LineString(zip(x2, y2))
-
-        # Shift line2 to find a valid intersection
-        shift_step = 0.001
-        attempts = 0
-
-        while attempts < max_attempts:
-            intersection = line1.intersection(line2)
-            if intersection.is_empty:
-                # Shift line2 and try again
-                line2 = LineString([(x, y + shift_step) for x, y in line2.coords])
-                attempts += 1
-            else:
-                # Check if the intersection point is not too close to the origin
-                origin = Point(0, 0)
-                valid_intersection = None
-
-                if isinstance(intersection, MultiPoint):
-                    points = intersection.geoms
-                else:
-                    points = [intersection]
-
-                for point in points:
-                    if point.distance(origin) >= min_dist_from_origin:
-                        valid_intersection = point
-                        break
-
-                if valid_intersection is not None:
-                    print(valid_intersection.geom_type)
-                    # shapely migration from 1.8 to 2.0
-                    try:
-                        if valid_intersection.geom_type == 'MultiPoint':
-                            x_int = [point.x for point in valid_intersection]
-                            y_int = [point.y for point in valid_intersection]
-                        elif valid_intersection.geom_type == 'MultiLineString':  # new clause
-                            x_int, y_int = [], []
-                            for line in valid_intersection.geoms:
-                                x_line, y_line = line.xy
-                                x_int.extend(x_line)
-                                y_int.extend(y_line)
-                        elif valid_intersection.geom_type == 'GeometryCollection':  # new clause
-                            x_int, y_int = [], []
-                            for geom in valid_intersection.geoms:
-                                if geom.geom_type == 'Point':
-                                    x_int.append(geom.x)
-                                    y_int.append(geom.y)
-                                elif geom.geom_type == 'LineString':
-                                    x_line, y_line = geom.xy
-                                    x_int.extend(x_line)
-                                    y_int.extend(y_line)
-                        else:
-                            x_int, y_int = valid_intersection.xy
-                    except NotImplementedError:
-                        x_int, y_int = valid_intersection.coords[0]
-                    return (x_int[0], y_int[0])
-                else:
-                    # Shift line2 and try again
-                    line2 = LineString([(x, y + shift_step)
-                                       for x, y in line2.coords])
-                    attempts += 1
-
-        return None, None
+        """
+        First crossing of plot1 and plot2 at least `min_dist_from_origin` away from the origin.
+
+        If there is no such crossing, plot2 is shifted up by 0.001 and the search repeated, up to
+        `max_attempts` times. Returns (x, y), or (None, None) when no crossing was found.
+        """
+        return find_first_crossing(plot1, plot2, min_dist_from_origin=min_dist_from_origin, max_attempts=max_attempts)
 
     # plotting calculations
+    def find_elastic_window(self, stress, strain):
+        """
+        Set the elastic region to the best straight-line window of the loading curve.
+
+        Used instead of `find_first_significant_increase` and `find_next_significant_decrease` when
+        `auto_elastic_window` is set, so no threshold tuning or clicks are needed.
+
+        Returns:
+            ElasticWindow or None: The window, or None if the curve is too short, in which case the
+            threshold search is used.
+        """
+        window = self.linear_regression(stress, strain).find_elastic_window()
+        if window is None:
+            print(f"No elastic window found for {self.specimen.name}, using the threshold search")
+            return None
+        self.first_increase_index = window.start
+        self.next_decrease_index = min(window.end, len(strain) - 1)
+        self.elastic_window_confidence = window.confidence
+        print(f"Elastic window of {self.specimen.name}: {window}")
+        return window
+
     def calculate_shifted_strain(self, stress, strain):
         if self.first_increase_index is None:
             self.first_increase_index = self.find_first_significant_increase(stress, strain)
         self.strain_shifted = strain - strain[self.first_increase_index]
+        self.specimen.invalidate_shift_cache()
 
     def calculate_next_decrease_index(self, stress):
         if self.next_decrease_index is None:
@@ -386,10 +448,15 @@ class SpecimenGraphManager:
     def calculate_youngs_modulus(self, stress, strain):
         start, end = self.first_increase_index, self.next_decrease_index
         if start is not None and end is not None:
-            def linear_func(x, a, b):
-                return a * x + b
-            popt, _ = curve_fit(linear_func, strain[start:end], stress[start:end])
-            self.youngs_modulus = popt[0]  # slope of the line
+            slope, _, r_squared = self.linear_regression(stress, strain).fit(start, end)
+            self.youngs_modulus = slope
+            self.youngs_modulus_r_squared = r_squared
+
+    def linear_regression(self, stress, strain):
+        """Prefix-sum regression of stress on strain, reused while the same arrays are passed in."""
+        if self._regression is None or not self._regression.uses(strain, stress):
+            self._regression = PrefixSumRegression(strain, stress)
+        return self._regression
 
     def calculate_strength(self, stress, strain, offset=0.002):
         start, end = self.first_increase_index, self.next_decrease_index
@@ -415,6 +482,8 @@ class SpecimenGraphManager:
             self.stress = np.array(self.specimen.stress.values)  # MPa
             self.strain = np.array(self.specimen.strain.values)  # %
 
+            if self.auto_elastic_window and self.first_increase_index is None and self.next_decrease_index is None:
+                self.find_elastic_window(self.stress, self.strain)
             self.calculate_shifted_strain(self.stress, self.strain)
             self.calculate_next_decrease_index(self.stress)
             self.calculate_youngs_modulus(self.stress, self.strain)
@@ -422,6 +491,7 @@ class SpecimenGraphManager:
         else:
             self.youngs_modulus = self.specimen.data_manager.modulus 
             self.strain_shifted = self.specimen.processed_data['shiftd strain']
+            self.specimen.invalidate_shift_cache()
             self.strain_hyst_shifted = self.specimen.processed_hysteresis_data['shiftd strain']
 
     def plot_curves(self, ax=None, OFFSET=0.002, debugging=False):   
@@ -561,7 +631,9 @@ class SpecimenGraphManager:
         return manager
 
 
-class SpecimenDataManager:
+class SpecimenDataManager(LazyAttributes):
+    TRANSIENT_ATTRIBUTES = ('_lazy_loaders', 'parse_verbose')
+
     def __init__(self, specimen, raw_data, area, original_length):
         self.specimen = specimen
         self.hysteresis_data = None
@@ -579,6 +651,11 @@ class SpecimenDataManager:
         self._toughness = None
         self._resilience = None
         self._ductility  = None
+        # Throughput of the .dat parser over the files of this specimen, None until they are parsed
+        self.parse_rows = 0
+        self.parse_time = 0.0
+        self.parse_cache_hit = False
+        self.parse_verbose = False
 
         # Determine the type of data and assign appropriately
         if raw_data:
@@ -600,35 +677,56 @@ class SpecimenDataManager:
     def clean_raw_data(self):
         self.formatted_data = self.clean_specific_data(self.raw_data)
 
-        self.raw_data_df = pd.DataFrame({'Raw Data': self.raw_data})
-        delimiter = '\t|\\n'
-        self.split_raw_data_df = self.raw_data_df['Raw Data'].str.split(delimiter, expand=True)
-        self.split_raw_data_df.columns = ['Column 1', 'Column 2', 'Column 3', 'Column 4',
-                                          'Column 5', 'Column 6', 'Column 7', 'Column 8', 'Column 9', 'Column 10']
-        
+    def build_raw_data_tables(self):
+        # Built on first use, so a cached parse never has to touch the text
+        if self.split_raw_data_df is None and isinstance(self.raw_data, list):
+            self.raw_data_df = pd.DataFrame({'Raw Data': self.raw_data})
+            delimiter = '\t|\\n'
+            self.split_raw_data_df = self.raw_data_df['Raw Data'].str.split(delimiter, expand=True)
+            self.split_raw_data_df.columns = ['Column 1', 'Column 2', 'Column 3', 'Column 4',
+                                              'Column 5', 'Column 6', 'Column 7', 'Column 8', 'Column 9', 'Column 10']
+        # Memory-mapped imports keep no copy of the text, so they have no raw tables
+        return self.split_raw_data_df
 
     def clean_hysteresis_data(self):
         self.formatted_hysteresis_data = self.clean_specific_data(self.hysteresis_data)
 
-    def clean_specific_data(self, data):
-        time_row = self.find_time_row(data)
-        headers, units = self.extract_headers_and_units(data, time_row)
-        data_rows = self.extract_data_rows(data, time_row, headers)
-        return self.format_data(data_rows, headers)
-
-    @staticmethod
-    def find_time_row(data):
-        return next((index for index, line in enumerate(data) if line.startswith('Data Acquisition')), None)
-
-    @staticmethod
-    def extract_headers_and_units(data, time_row):
-        headers_row = data[time_row + 1].split()
-        units_row = data[time_row + 2].split()
+    @property
+    def parse_rows_per_second(self):
+        if not self.parse_rows:
+            return None
+        return self.parse_rows / self.parse_time if self.parse_time > 0 else float('inf')
 
-        headers = [header for header in headers_row if header in ['Displacement', 'Force', 'Time']]
-        units = [unit for unit, header in zip(units_row, headers_row) if header in headers]
+    def parse_summary(self):
+        """Rows and rows/s of the .dat parse, for the import message and the batch status; None before a parse."""
+        rows_per_second = self.parse_rows_per_second
+        if rows_per_second is None:
+            return None
+        source = "loaded from the parse cache" if self.parse_cache_hit else "parsed"
+        return f"{self.parse_rows:,} rows {source} at {rows_per_second:,.0f} rows/s"
 
-        return headers, units
+    def clean_specific_data(self, data):
+        parser = DatFileParser(verbose=self.parse_verbose, cache=default_parse_cache())
+        try:
+            formatted_data = parser.parse_file(data) if isinstance(data, Path) else parser.parse_lines(data)
+            # Summed over the hysteresis and general files; a cache hit means every file came from the cache
+            self.parse_cache_hit = parser.cache_hit and (self.parse_cache_hit or not self.parse_rows)
+            self.parse_rows += parser.rows_parsed
+            self.parse_time += parser.parse_time
+            return formatted_data
+        except ValueError:
+            # Fall back to the line-by-line reader for blocks the C engine cannot read as numbers
+            if isinstance(data, Path):
+                # A memory-mapped import kept no lines, read them now
+                with open(data, 'r') as file:
+                    data = file.readlines()
+            time_row = self.find_time_row(data)
+            headers, units = self.extract_headers_and_units(data, time_row)
+            data_rows = self.extract_data_rows(data, time_row, headers)
+            return self.format_data(data_rows, headers)
+
+    find_time_row = staticmethod(DatFileParser.find_time_row)
+    extract_headers_and_units = staticmethod(DatFileParser.extract_headers_and_units)
 
     @staticmethod
     def extract_data_rows(data, time_row, headers):
@@ -741,7 +839,7 @@ class SpecimenDataManager:
     
 
     def calculate_toughness(self):
-        return np.trapz(self.specimen.stress, self.specimen.shifted_strain)
+        return trapezoid(self.specimen.stress, self.specimen.shifted_strain)
 
     def calculate_ductility(self):
         return max(self.specimen.shifted_strain)
@@ -764,6 +862,8 @@ class SpecimenDataManager:
                     temp_dir, csv_file) if temp_dir else csv_file
                 df = pd.read_csv(file_path)
                 setattr(manager, attr, df)
+            elif isinstance(value, (pd.DataFrame, np.ndarray)):
+                setattr(manager, attr, value)  # binary archives hold the data itself
            
 
         return manager
@@ -1,6 +1,7 @@
 # stress_strain_app.py
+import multiprocessing
 import tkinter as tk
-from tkinter import ttk
+from tkinter import messagebox, ttk
 
 import ttkbootstrap as tb
 
@@ -8,8 +9,11 @@ from core.button_actions import ButtonActions
 from core.data_handler import DataHandler
 from core.plot_manager import PlotManager
 from core.widget_manager import WidgetManager
+from dataset.db_connection import DEFAULT_CATALOG_PATH
 import pandas as pd
 
+CLOSE_POLL_INTERVAL_MS = 200  # how often a closing window checks whether the exports are done
+
 # To Do
 # add cymat icon 
 
@@ -33,6 +37,48 @@ class StressStrainApp:
         self.button_actions.set_widget_manager(self.widget_manager)
         self.button_actions.set_plot_manager(self.plot_manager)
 
+        self._close_after = None  # pending check of a close that waits for the exports
+        self.master.protocol("WM_DELETE_WINDOW", self.close)
+
+    def close(self):
+        """
+        Close the window, asking first while exports are running.
+
+        The user can wait for the exports, cancel them or keep the window open. Specimen saves are
+        never cancelled here. The window stays open until the remaining jobs are done, as a cancelled
+        export only stops at its next checkpoint and its worker would otherwise outlive the window.
+        """
+        export_queue = self.data_handler.export_queue
+        if not export_queue.active:
+            self._destroy()
+            return
+        names = "\n".join(job.name for job in export_queue.pending)
+        answer = messagebox.askyesnocancel(
+            "Exports Running",
+            f"These exports are still running:\n\n{names}\n\n"
+            "Yes: wait for them, then close.\n"
+            "No: cancel them and close; specimen saves still finish.\n"
+            "Cancel: keep the window open.")
+        if answer is None:
+            if self._close_after is not None:
+                self.master.after_cancel(self._close_after)
+                self._close_after = None
+            return
+        if answer is False:
+            export_queue.cancel_all(closing=True)
+        if self._close_after is None:
+            self._close_when_idle()
+
+    def _close_when_idle(self):
+        if self.data_handler.export_queue.active:
+            self._close_after = self.master.after(CLOSE_POLL_INTERVAL_MS, self._close_when_idle)
+        else:
+            self._destroy()
+
+    def _destroy(self):
+        self.data_handler.export_queue.shutdown(cancel=False)
+        self.master.destroy()
+
 
 # app_config,py
 class AppConfiguration:
@@ -67,6 +113,26 @@ class AppVariables:
         self.prelim_mode = tk.BooleanVar(value=self.preliminary_sample)
         self.DIN_Mode = True
         self.ISO_Mode = False
+        # Common grid of the averaged curves: a point count (None = longest specimen, capped) or a fixed strain step
+        self.average_grid_points = None
+        self.average_strain_step = None
+        # (filter name, parameter) applied to the hysteresis average, chosen by a smoothing sweep; None = unsmoothed
+        self.hysteresis_smoothing = None
+        # Bootstrap confidence band of the average curve, set with the Bootstrap Confidence Bands button: number of resamples (None = no band) and seed
+        self.bootstrap_resamples = None
+        self.bootstrap_seed = None
+        # Reuse parsed .dat files from the on-disk parse cache; False parses every import from the text
+        self.use_parse_cache = True
+        # Deflate saved specimen archives: smaller files, slower saves and loads
+        self.compress_archives = False
+        # Specimen catalog that saved archives are added to, under this lot; None = no catalog
+        self.catalog_path = DEFAULT_CATALOG_PATH
+        self.catalog_lot = ''
+        # Write the Excel export row by row through a constant_memory xlsxwriter workbook; False builds the whole workbook in memory
+        self.stream_excel_export = True
+        # Points per series of the Excel charts, drawn from decimated copies of the curves ('lttb' or 'minmax'); None = every point
+        self.chart_point_budget = 2000
+        self.chart_decimation = 'lttb'
 
     def add_specimen(self, tab_id, specimen):
         self.specimens.append(specimen)
@@ -85,6 +151,8 @@ class AppVariables:
 
 # Run Application
 if __name__ == "__main__":
+    # Worker processes of a frozen (pyinstaller) build re-run the exe; this hands them to their task instead of opening the app again
+    multiprocessing.freeze_support()
     root = tb.Window( themename= 'darkly')
     app = StressStrainApp(root)
     root.mainloop()